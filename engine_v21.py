@@ -0,0 +1,718 @@
+'''
+Vectorized network engines for the Thermodynamic Neural Network.
+The engines hold the edge state of the network nodes in flat half-edge arrays (one entry per node and connection,
+grouped by node) and update whole classes of non-adjacent nodes at once.  Nodes of one color class share no synapse,
+so a color-batched sweep is a sequential sweep of the network in color order.  Random draws come from the keyed
+streams in rng_v21.py and do not depend on the sweep order.  Edge arrays are stored in the precision of the parameter
+file ('float64' / 'float32'); node arrays and sums over edges are float64.
+'''
+import numpy as np
+import rng_v21 as rn
+import synapse_v21 as sd
+
+
+def sample_states(neg_state_energy, pos_state_energy, threshold, node_states, seed):
+    '''
+    Samples the states of a batch of nodes from their boltzmann distributions (vectorized form of Node.sample_state).
+    The allowed states of each node are laid out in a padded row in the order of Node.sample_state.
+    Returns the states, their energies and the distributions (energy, probability, emin, Zp, total_states, valid).
+    '''
+    neg_states_max = np.maximum(1, np.trunc(-neg_state_energy / threshold).astype(np.int64))
+    pos_states_max = np.maximum(1, np.trunc(pos_state_energy / threshold).astype(np.int64))
+    total_states = np.maximum(3, np.trunc((pos_state_energy - neg_state_energy + 1) / threshold).astype(np.int64))
+    neg_first = neg_states_max > pos_states_max
+    neg_states_min = np.maximum(0, neg_states_max - node_states)
+    pos_states_min = np.where(neg_first, np.minimum(neg_states_min, pos_states_max), np.maximum(0, pos_states_max - node_states))
+    neg_states_min = np.where(neg_first, neg_states_min, np.minimum(pos_states_min, neg_states_max))
+    neg_count = neg_states_max - neg_states_min
+    zero = (pos_states_min == 0) | (neg_states_min == 0)
+    pos_count = pos_states_max - pos_states_min
+    size = neg_count + zero + pos_count
+
+#   padded state rows - negative states, zero, positive states
+    column = np.arange(size.max())[None, :]
+    in_neg = column < neg_count[:, None]
+    in_zero = (column == neg_count[:, None]) & zero[:, None]
+    m = column - (neg_count + zero)[:, None]
+    in_pos = (m >= 0) & (m < pos_count[:, None])
+    valid = in_neg | in_zero | in_pos
+    state_array = np.where(in_neg, (column - neg_states_max[:, None]) / neg_states_max[:, None], 0.0)
+    state_array = np.where(in_pos, (pos_states_min[:, None] + 1 + m) / pos_states_max[:, None], state_array)
+
+#   compute state energies and probability distributions
+    energy = (-neg_state_energy[:, None] * (state_array < 0.0) - pos_state_energy[:, None] * (state_array > 0.0)) * state_array
+    emin = np.min(np.where(valid, energy, np.inf), axis=1)
+    probability = np.where(valid, np.exp(emin[:, None] - np.where(valid, energy, emin[:, None])), 0.0)
+    Zp = np.sum(probability, axis=1)
+    probability /= Zp[:, None]
+
+#   sample a state from each distribution
+    j = np.minimum(np.sum(np.cumsum(probability, axis=1) < seed[:, None], axis=1), size - 1)
+    rows = np.arange(len(j))
+    return state_array[rows, j], energy[rows, j], (energy, probability, emin, Zp, total_states, valid)
+
+
+def distribution_statistics(distribution):
+    '''
+    Free energy and normalized entropy of sampled distributions (vectorized form of Node.evaluate_distribution).
+    '''
+    (energy, probability, emin, Zp, total_states, valid) = distribution
+    free_energy = emin - np.log(Zp)
+    entropy = np.sum(np.where(valid, probability * (energy - free_energy[:, None]), 0.0), axis=1) / np.log(total_states)
+    return free_energy, entropy
+
+
+def color_classes(node_list, neighbor_list):
+    '''
+    Partitions nodes into classes of non-adjacent nodes.  A bipartite graph is split into its two sides, other graphs
+    are colored greedily in node order.  Returns a list of node lists.
+    '''
+    color = {}
+    bipartite = True
+    for i in node_list:
+        if i in color: continue
+        color[i] = 0
+        queue = [i]
+        while queue and bipartite:
+            p = queue.pop()
+            for q in neighbor_list[p]:
+                if q not in color:
+                    color[q] = 1 - color[p]
+                    queue.append(q)
+                elif color[q] == color[p]:
+                    bipartite = False
+    if not bipartite:
+        color = {}
+        for i in node_list:
+            used = set([color[q] for q in neighbor_list[i] if q in color])
+            color[i] = min([c for c in range(len(used)+1) if c not in used])
+    return [[i for i in node_list if color[i] == c] for c in range(max(color.values())+1)]
+
+
+class FrozenEngine(object):
+    '''
+    Inference engine for eras with weight_update = False.  Weights do not change and no node makes an irreversible
+    update, so the edge compartments are fixed for the era.  Each step only propagates charges and samples states,
+    without the tentative copies, branch tests and synapse callbacks of Node.update_state.
+    Bias nodes keep their own update and receive the network node states at the end of each step.
+    '''
+    def __init__(self, net):
+        '''
+        Builds the half-edge structure and the color classes of the network nodes.
+        :param net: Network object
+        '''
+        self.net = net
+        self.dtype = np.dtype(net.parm.precision)
+        self.node_list = net.node_list_dict['network']
+        self.nodes = len(self.node_list)
+        position = dict([(i, n) for (n, i) in enumerate(self.node_list)])
+
+#       half-edges grouped by node in node order - synapse, neighbor node and reverse half-edge
+        self.half_node = []
+        self.half_synapse = []
+        self.half_neighbor = []
+        half_index = {}
+        for (n, i) in enumerate(self.node_list):
+            for k in self.net.node[i].synapse_list:
+                half_index[(i, k)] = len(self.half_synapse)
+                self.half_node.append(n)
+                self.half_synapse.append(k)
+                self.half_neighbor.append(self.net.synapse[k].node_pair[i])
+        self.half_edges = len(self.half_synapse)
+        self.half_node = np.array(self.half_node, dtype=np.int64)
+        self.reverse = np.array([half_index.get((j, k), -1) for (j, k) in zip(self.half_neighbor, self.half_synapse)], dtype=np.int64)
+        self.bias_edge_list = [(h, self.node_list[self.half_node[h]], self.half_neighbor[h], self.half_synapse[h]) for h in range(self.half_edges) if self.reverse[h] < 0]
+
+#       node parameters
+        self.set_parameters()
+        self.node_states = np.array([self.net.node[i].node_states for i in self.node_list], dtype=np.int64)
+        self.display_polarity = np.array([self.net.display_polarity[i] for i in self.node_list])
+
+#       color classes - nodes, half-edges (with the node index within the class) and pushes to neighbor half-edges
+        neighbor_list = dict([(i, []) for i in self.node_list])
+        for (n, j) in zip(self.half_node, self.half_neighbor):
+            if j in position and j != self.node_list[n]: neighbor_list[self.node_list[n]].append(j)
+        self.color_list = []
+        for class_list in color_classes(self.node_list, neighbor_list):
+            nodes = np.array([position[i] for i in class_list], dtype=np.int64)
+            local = -np.ones(self.nodes, dtype=np.int64)
+            local[nodes] = np.arange(len(nodes))
+            half = np.nonzero(local[self.half_node] >= 0)[0]
+            push = half[self.reverse[half] >= 0]
+            self.color_list.append({'nodes': nodes, 'half': half, 'segment': local[self.half_node[half]], 'push': push, 'push_to': self.reverse[push]})
+
+#       endpoints of the order parameter synapses
+        self.order_endpoints = self.net.synapse_store.node[self.net.order_param_synapse_array]
+
+
+    def set_parameters(self):
+        '''
+        Gathers the node energy factors and thresholds from the node objects (called again when annealing changes them).
+        '''
+        self.energy_factor_4x = np.array([self.net.node[i].energy_factor_4x for i in self.node_list])
+        self.threshold = np.array([self.net.node[i].threshold for i in self.node_list])
+
+
+    def begin(self):
+        '''
+        Gathers the node states, edge context and edge compartments of the network nodes at the start of a frozen era.
+        '''
+        self.voltage = np.zeros(self.half_edges, dtype=self.dtype)
+        self.weight = np.zeros(self.half_edges, dtype=self.dtype)
+        self.compartment = np.zeros((8, self.half_edges), dtype=self.dtype)
+        h = 0
+        for i in self.node_list:
+            node = self.net.node[i]
+            (voltage, weight) = node.get_context()
+            n = len(voltage)
+            self.voltage[h:h+n] = voltage
+            self.weight[h:h+n] = weight
+            self.compartment[:, h:h+n] = node.get_compartments()[:8]
+            h += n
+        self.synapse_weight = self.net.synapse_store.weight[self.half_synapse].astype(self.dtype)
+        for block in self.color_list: block['compartment'] = self.compartment[:, block['half']]
+
+        self.state = np.array([self.net.node[i].state for i in self.node_list], dtype=float)
+        self.energy = np.array([self.net.node[i].energy for i in self.node_list], dtype=float)
+        self.energy_last = np.array([self.net.node[i].energy_last for i in self.node_list], dtype=float)
+        self.state_change = np.array([self.net.node[i].state_change for i in self.node_list], dtype=float)
+        self.fluctuation = np.array([self.net.node[i].fluctuation for i in self.node_list], dtype=bool)
+        self.free_energy = np.array([self.net.node[i].free_energy for i in self.node_list], dtype=float)
+        self.entropy = np.array([self.net.node[i].entropy for i in self.node_list], dtype=float)
+        self.distribution_list = []
+
+#       statistics that stay fixed during the era
+        self.fixed_sums = {}
+        for key in ['dissipation', 'transport', 'quality_denom', 'quality_numer']:
+            self.fixed_sums[key] = sum([getattr(self.net.node[i], key) for i in self.node_list])
+        self.fixed_sums['synapse2'] = np.sum(self.net.synapse_store.weight[self.net.plastic_synapse_array]**2, dtype=float)
+
+
+    def step(self, weight_update):
+        '''
+        Updates the network nodes for one time step, color class by color class (weight_update is False in a frozen era).
+        '''
+#       read the context pushed by the bias nodes
+        for (h, i, j, k) in self.bias_edge_list: (self.voltage[h], self.weight[h]) = self.net.node[i].edge_context(k)
+
+        seed = self.net.rng.uniform_array(rn.NODE, self.node_list)
+        self.distribution_list = []
+        for block in self.color_list:
+            nodes = block['nodes']
+            half = block['half']
+            segment = block['segment']
+            (pcpw, pcnw, ncpw, ncnw, pwpc, nwpc, pwnc, nwnc) = block['compartment']
+
+#           reversibly update edge charges
+            weight = self.weight[half]
+            charge = self.voltage[half] * weight
+            pcpw_input = (charge > 0.0) & (weight > 0.0)
+            pcnw_input = (charge > 0.0) & (weight < 0.0)
+            ncpw_input = (charge < 0.0) & (weight > 0.0)
+            ncnw_input = (charge < 0.0) & (weight < 0.0)
+            pcpw = np.where(pcpw_input, np.minimum(pcpw + charge, weight), pcpw)
+            pcnw = np.where(pcnw_input, np.minimum(pcnw + charge, -weight), pcnw)
+            ncpw = np.where(ncpw_input, np.maximum(ncpw + charge, -weight), ncpw)
+            ncnw = np.where(ncnw_input, np.maximum(ncnw + charge, weight), ncnw)
+            pwpc = np.where(pcpw_input, weight, pwpc)
+            nwpc = np.where(pcnw_input, weight, nwpc)
+            pwnc = np.where(ncpw_input, weight, pwnc)
+            nwnc = np.where(ncnw_input, weight, nwnc)
+
+#           compute compartment charges and weights
+            size = len(nodes)
+            pcpw_sum = np.bincount(segment, np.where(pcpw > 0.0, pcpw, 0.0), size)
+            pwpc_sum = np.bincount(segment, np.where(pcpw > 0.0, pwpc, 0.0), size)
+            pcnw_sum = np.bincount(segment, np.where(pcnw > 0.0, pcnw, 0.0), size)
+            nwpc_sum = np.bincount(segment, np.where(pcnw > 0.0, nwpc, 0.0), size)
+            ncpw_sum = np.bincount(segment, np.where(ncpw < 0.0, ncpw, 0.0), size)
+            pwnc_sum = np.bincount(segment, np.where(ncpw < 0.0, pwnc, 0.0), size)
+            ncnw_sum = np.bincount(segment, np.where(ncnw < 0.0, ncnw, 0.0), size)
+            nwnc_sum = np.bincount(segment, np.where(ncnw < 0.0, nwnc, 0.0), size)
+
+#           sample node states
+            neg_state_energy = self.energy_factor_4x[nodes] * (pcpw_sum * nwnc_sum + ncnw_sum * pwpc_sum)
+            pos_state_energy = self.energy_factor_4x[nodes] * (pcnw_sum * pwnc_sum + ncpw_sum * nwpc_sum)
+            (state, energy, distribution) = sample_states(neg_state_energy, pos_state_energy, self.threshold[nodes], self.node_states[nodes], seed[nodes])
+            self.distribution_list.append((nodes, distribution))
+
+#           evaluate state changes
+            self.state_change[nodes] = (state - self.state[nodes]) / 2.0
+            self.state[nodes] = state
+            self.fluctuation[nodes] = np.abs(energy - self.energy_last[nodes]) > self.threshold[nodes]
+            self.energy[nodes] = energy
+            self.energy_last[nodes] = energy
+
+#           push node states to the neighbor half-edges
+            self.voltage[block['push_to']] = self.state[self.half_node[block['push']]]
+            self.weight[block['push_to']] = self.synapse_weight[block['push']]
+
+#       push network node states to the bias nodes
+        for (h, i, j, k) in self.bias_edge_list: self.net.node[j].receive_context(k, self.state[self.half_node[h]], self.synapse_weight[h])
+
+
+    def evaluate_distribution(self):
+        '''
+        Computes the free energy and entropy of the distributions sampled in the last step.
+        '''
+        for (nodes, distribution) in self.distribution_list: (self.free_energy[nodes], self.entropy[nodes]) = distribution_statistics(distribution)
+        self.distribution_list = []
+
+
+    def network_sums(self, active):
+        '''
+        Sums the network statistics in the set active (as Network.network_sums).
+        '''
+        if self.distribution_list and ('free_energy' in active or 'entropy' in active): self.evaluate_distribution()
+        sums = {}
+        if 'energy' in active: sums['energy'] = np.sum(self.energy)
+        if 'free_energy' in active: sums['free_energy'] = np.sum(self.free_energy)
+        if 'entropy' in active: sums['entropy'] = np.sum(self.entropy)
+        if 'dissipation' in active: sums['dissipation'] = self.fixed_sums['dissipation']
+        if 'transport' in active: sums['transport'] = self.fixed_sums['transport']
+        if 'quality' in active:
+            sums['quality_denom'] = self.fixed_sums['quality_denom']
+            sums['quality_numer'] = self.fixed_sums['quality_numer']
+        if 'state_change' in active: sums['state_change'] = np.sum(np.abs(self.state_change))
+        if 'fluctuations' in active: sums['fluctuations'] = int(np.sum(self.fluctuation))
+        if 'color' in active: sums['color'] = np.sum(self.display_polarity * self.state)
+        if 'solved' in active: sums['solved'] = int(np.sum(self.net.bias_group.solve))
+        if 'synapse2' in active: sums['synapse2'] = self.fixed_sums['synapse2']
+        if 'order' in active:
+            state = np.array([self.net.node[i].state for i in self.net.all_node_list], dtype=float)
+            state[self.node_list] = self.state
+            sums['order'] = -np.sum(state[self.order_endpoints[:, 0]] * state[self.order_endpoints[:, 1]])
+        return sums
+
+
+    def sync(self):
+        '''
+        Writes the node states and statistics back to the network node objects.
+        '''
+        if self.distribution_list: self.evaluate_distribution()
+        for (n, i) in enumerate(self.node_list):
+            node = self.net.node[i]
+            node.distribution = None
+            node.state = node.state_last = self.state[n]
+            node.state_change = self.state_change[n]
+            node.energy = node.energy_last = self.energy[n]
+            node.fluctuation = bool(self.fluctuation[n])
+            node.free_energy = self.free_energy[n]
+            node.entropy = self.entropy[n]
+
+
+    def end(self):
+        '''
+        Writes the node states, edge context and synapse outputs back to the network objects at the end of a frozen era.
+        '''
+        self.sync()
+        for h in range(self.half_edges):
+            if self.reverse[h] >= 0: self.net.node[self.node_list[self.half_node[h]]].receive_context(self.half_synapse[h], float(self.voltage[h]), float(self.weight[h]))
+        for (n, i) in enumerate(self.node_list):
+            for k in self.net.node[i].synapse_list:
+                synapse = self.net.synapse[k]
+                synapse.output_state[i] = self.state[n]
+                synapse.order = -synapse.output_state[synapse.node_list[0]] * synapse.output_state[synapse.node_list[1]]
+
+
+def lattice_conflict(net):
+    '''
+    Returns the reason a network cannot run on the lattice engine, or '' if it can.
+    '''
+    if net.parm.network != 'neighbor': return 'network type is not neighbor'
+    if net.delay is not None: return 'synapse delays are not supported'
+    shape = (net.parm.edge,) * net.parm.dimension
+    for i in net.node_list_dict['network']:
+        offset_list = []
+        for k in net.node[i].synapse_list:
+            j = net.synapse[k].node_pair[i]
+            offset = tuple(np.mod(np.subtract(np.unravel_index(j, shape), np.unravel_index(i, shape)), net.parm.edge).tolist())
+            if j != i: offset_list.append(offset)
+            if j in net.node_list_dict['network'] and net.synapse[k].weight_type not in ['real1', 'real2', 'fixed']: return 'synapse type %s is not supported' %net.synapse[k].weight_type
+        if len(set(offset_list)) != len(offset_list): return 'node %i has parallel synapses' %i
+    return ''
+
+
+class LatticeEngine(object):
+    '''
+    Engine for 'neighbor' networks on a periodic lattice.  Edge state is stored in dense arrays of shape
+    (direction,) + lattice, where a direction is a neighbor offset (recurrent synapses of a node get one direction each),
+    so node states and weights move between neighbors by array shifts (np.roll) instead of index lists.  Node updates,
+    including the irreversible edge updates and the Real1 / Real2 weight updates, are applied one color class at a time.
+    Edges to bias nodes are updated through their synapse objects.
+    '''
+    def __init__(self, net):
+        '''
+        Builds the direction arrays of the synapses and the color class masks of the lattice.
+        :param net: Network object
+        '''
+        self.net = net
+        self.dtype = np.dtype(net.parm.precision)
+        self.shape = (net.parm.edge,) * net.parm.dimension
+        self.axes = tuple(range(net.parm.dimension))
+        self.all_nodes = net.parm.all_nodes
+        self.node_list = net.node_list_dict['network']
+        self.network = np.zeros(self.all_nodes, dtype=bool)
+        self.network[self.node_list] = True
+
+#       directions - neighbor offsets, with a separate direction for each recurrent synapse of a node
+        slot = {}
+        for i in self.node_list:
+            count = {}
+            for k in net.node[i].synapse_list:
+                j = net.synapse[k].node_pair[i]
+                offset = tuple(np.mod(np.subtract(np.unravel_index(j, self.shape), np.unravel_index(i, self.shape)), net.parm.edge).tolist())
+                slot[(i, k)] = (offset, count.get(offset, 0))
+                count[offset] = count.get(offset, 0) + 1
+        self.direction_list = sorted(set(slot.values()))
+        self.directions = len(self.direction_list)
+        direction = dict([(d, n) for (n, d) in enumerate(self.direction_list)])
+        self.offset = [offset for (offset, m) in self.direction_list]
+        self.reverse = [direction.get((tuple(np.mod(np.negative(offset), net.parm.edge).tolist()), m), -1) for (offset, m) in self.direction_list]
+
+#       half-edges of the network nodes
+        self.node_direction = dict([(i, np.array([direction[slot[(i, k)]] for k in net.node[i].synapse_list], dtype=np.int64)) for i in self.node_list])
+        half_node = [i for i in self.node_list for k in net.node[i].synapse_list]
+        self.half_synapse = half_synapse = [k for i in self.node_list for k in net.node[i].synapse_list]
+        self.half_index = (np.concatenate([self.node_direction[i] for i in self.node_list]), np.array(half_node, dtype=np.int64))
+        synapse_list = [net.synapse[k] for k in half_synapse]
+        order_set = set(net.order_param_synapse_list)
+        plastic_set = set(net.plastic_synapse_list)
+        self.exists = self.direction_array(True, bool)
+        self.endpoint = self.direction_array([s.endpoint[i] for (s, i) in zip(synapse_list, half_node)], np.int64)
+        canonical = self.direction_array([i == s.node_list[0] for (s, i) in zip(synapse_list, half_node)], bool)
+        self.order_edge = canonical & self.direction_array([k in order_set for k in half_synapse], bool)
+        self.plastic_edge = canonical & self.direction_array([k in plastic_set for k in half_synapse], bool)
+        self.bias_edge = self.direction_array([not self.network[s.node_pair[i]] for (s, i) in zip(synapse_list, half_node)], bool)
+        self.bias_edge_list = [(d, i, k) for (d, i, k) in zip(self.half_index[0].tolist(), half_node, half_synapse) if not self.network[net.synapse[k].node_pair[i]]]
+
+#       synapse parameters (Real1 and Real2 synapses learn, Fixed synapses keep their weight)
+        self.learn = self.direction_array([s.weight_type in ['real1', 'real2'] for s in synapse_list], bool)
+        self.real2_edge = self.direction_array([s.weight_type == 'real2' for s in synapse_list], bool)
+        self.half_position = self.direction_array(np.arange(len(half_synapse)), np.int64)
+        self.real1 = sd.Real1Batch(synapse_list, net.rng)
+        self.real2 = sd.Real2Batch(synapse_list, net.rng) if self.real2_edge.any() else None
+
+#       node parameters
+        self.network_image = self.network.reshape(self.shape)
+        self.set_parameters()
+        self.node_states = self.node_array([net.node[i].node_states for i in self.node_list], 1).astype(np.int64)
+        self.display_polarity = np.array(net.display_polarity, dtype=float).reshape(self.shape)
+
+#       color class masks of the network nodes
+        neighbor_list = dict([(i, [net.synapse[k].node_pair[i] for k in net.node[i].synapse_list if self.network[net.synapse[k].node_pair[i]] and net.synapse[k].node_pair[i] != i]) for i in self.node_list])
+        self.color_list = []
+        for class_list in color_classes(self.node_list, neighbor_list):
+            mask = np.zeros(self.all_nodes, dtype=bool)
+            mask[class_list] = True
+            self.color_list.append(mask.reshape(self.shape))
+
+
+    def direction_array(self, values, dtype, fill=0):
+        '''
+        Returns an array of shape (direction,) + lattice holding values at the half-edges of the network nodes.
+        '''
+        array = np.full((self.directions, self.all_nodes), fill, dtype=dtype)
+        array[self.half_index] = values
+        return array.reshape((self.directions,) + self.shape)
+
+
+    def node_array(self, values, fill=0.0):
+        '''
+        Returns a lattice array holding values at the network nodes.
+        '''
+        array = np.full(self.all_nodes, fill)
+        array[self.node_list] = values
+        return array.reshape(self.shape)
+
+
+    def shift(self, array, offset):
+        '''
+        Moves a lattice array by an offset on the torus (the value at node x moves to node x + offset).
+        '''
+        return np.roll(array, offset, axis=self.axes)
+
+
+    def set_parameters(self):
+        '''
+        Gathers the node energy factors and thresholds and the synapse weight update parameters (called again when
+        annealing changes them).
+        '''
+        self.node_energy_factor = self.node_array([self.net.node[i].energy_factor for i in self.node_list], 1.0)
+        self.energy_factor_4x = 4.0 * self.node_energy_factor
+        self.threshold = self.node_array([self.net.node[i].threshold for i in self.node_list], 1.0)
+        self.real1.set_parameters(self.net.synapse_store)
+        if self.real2 is not None: self.real2.set_parameters(self.net.synapse_store)
+
+
+    def begin(self):
+        '''
+        Gathers the node states, edge context, edge compartments and synapse weights at the start of an era.
+        '''
+        net = self.net
+        voltage = np.zeros((self.directions, self.all_nodes), dtype=self.dtype)
+        weight = np.zeros((self.directions, self.all_nodes), dtype=self.dtype)
+        compartment = np.zeros((12, self.directions, self.all_nodes), dtype=self.dtype)
+        for i in self.node_list:
+            (node_voltage, node_weight) = net.node[i].get_context()
+            voltage[self.node_direction[i], i] = node_voltage
+            weight[self.node_direction[i], i] = node_weight
+            compartment[:, self.node_direction[i], i] = net.node[i].get_compartments()
+        self.voltage = voltage.reshape((self.directions,) + self.shape)
+        self.weight = weight.reshape((self.directions,) + self.shape)
+        self.compartment = compartment.reshape((12, self.directions) + self.shape)
+        self.synapse_weight = self.direction_array(net.synapse_store.weight[self.half_synapse], self.dtype)
+
+        self.state = np.array([net.node[i].state for i in net.all_node_list], dtype=float).reshape(self.shape)
+        self.energy = self.node_array([net.node[i].energy for i in self.node_list])
+        self.energy_last = self.node_array([net.node[i].energy_last for i in self.node_list])
+        self.state_change = self.node_array([net.node[i].state_change for i in self.node_list])
+        self.fluctuation = self.node_array([net.node[i].fluctuation for i in self.node_list]).astype(bool)
+        self.free_energy = self.node_array([net.node[i].free_energy for i in self.node_list])
+        self.entropy = self.node_array([net.node[i].entropy for i in self.node_list])
+        self.dissipation = self.node_array([net.node[i].dissipation for i in self.node_list])
+        self.transport = self.node_array([net.node[i].transport for i in self.node_list])
+        self.quality_denom = self.node_array([net.node[i].quality_denom for i in self.node_list])
+        self.quality_numer = self.node_array([net.node[i].quality_numer for i in self.node_list])
+        self.distribution_list = []
+
+
+    def step(self, weight_update):
+        '''
+        Updates the network nodes for one time step, color class by color class.
+        '''
+        net = self.net
+        state = self.state.reshape(-1)
+        state[net.bias_group.node_id] = net.bias_group.state
+
+#       read the context pushed by the bias nodes and the weights of their synapses
+        voltage = self.voltage.reshape(self.directions, -1)
+        weight = self.weight.reshape(self.directions, -1)
+        synapse_weight = self.synapse_weight.reshape(self.directions, -1)
+        for (d, i, k) in self.bias_edge_list:
+            (voltage[d, i], weight[d, i]) = net.node[i].edge_context(k)
+            synapse_weight[d, i] = net.synapse[k].weight
+
+        seed = net.rng.uniform_row(rn.NODE).reshape(self.shape)
+        self.distribution_list = []
+        for mask in self.color_list: self.update_class(mask, seed, weight_update)
+
+
+    def update_class(self, mask, seed, weight_update):
+        '''
+        Updates the nodes of one color class (as Node.update_state).
+        '''
+        (PCPW, PCNW, NCPW, NCNW, PWPC, NWPC, PWNC, NWNC, PVPW, PVNW, NVPW, NVNW) = range(12)
+        compartment = self.compartment
+        voltage = self.voltage
+        weight = self.weight
+
+#       reversibly update edge charges
+        charge = voltage * weight
+        pcpw_input = (charge > 0.0) & (weight > 0.0)
+        pcnw_input = (charge > 0.0) & (weight < 0.0)
+        ncpw_input = (charge < 0.0) & (weight > 0.0)
+        ncnw_input = (charge < 0.0) & (weight < 0.0)
+        tentative = [np.where(pcpw_input, np.minimum(compartment[PCPW] + charge, weight), compartment[PCPW]),
+                     np.where(pcnw_input, np.minimum(compartment[PCNW] + charge, -weight), compartment[PCNW]),
+                     np.where(ncpw_input, np.maximum(compartment[NCPW] + charge, -weight), compartment[NCPW]),
+                     np.where(ncnw_input, np.maximum(compartment[NCNW] + charge, weight), compartment[NCNW]),
+                     np.where(pcpw_input, weight, compartment[PWPC]),
+                     np.where(pcnw_input, weight, compartment[NWPC]),
+                     np.where(ncpw_input, weight, compartment[PWNC]),
+                     np.where(ncnw_input, weight, compartment[NWNC])]
+
+#       compute compartment charges and weights (summed in float64)
+        pcpw_list = tentative[PCPW] > 0.0
+        pcnw_list = tentative[PCNW] > 0.0
+        ncpw_list = tentative[NCPW] < 0.0
+        ncnw_list = tentative[NCNW] < 0.0
+        pcpw_sum = np.sum(np.where(pcpw_list, tentative[PCPW], 0.0), axis=0, dtype=float)
+        pcnw_sum = np.sum(np.where(pcnw_list, tentative[PCNW], 0.0), axis=0, dtype=float)
+        ncpw_sum = np.sum(np.where(ncpw_list, tentative[NCPW], 0.0), axis=0, dtype=float)
+        ncnw_sum = np.sum(np.where(ncnw_list, tentative[NCNW], 0.0), axis=0, dtype=float)
+        pwpc_sum = np.sum(np.where(pcpw_list, tentative[PWPC], 0.0), axis=0, dtype=float)
+        nwpc_sum = np.sum(np.where(pcnw_list, tentative[NWPC], 0.0), axis=0, dtype=float)
+        pwnc_sum = np.sum(np.where(ncpw_list, tentative[PWNC], 0.0), axis=0, dtype=float)
+        nwnc_sum = np.sum(np.where(ncnw_list, tentative[NWNC], 0.0), axis=0, dtype=float)
+
+#       sample node states
+        neg_state_energy = self.energy_factor_4x * (pcpw_sum * nwnc_sum + ncnw_sum * pwpc_sum)
+        pos_state_energy = self.energy_factor_4x * (pcnw_sum * pwnc_sum + ncpw_sum * nwpc_sum)
+        (state, energy, distribution) = sample_states(neg_state_energy[mask], pos_state_energy[mask], self.threshold[mask], self.node_states[mask], seed[mask])
+        self.distribution_list.append((mask, distribution))
+        self.state_change[mask] = (state - self.state[mask]) / 2.0
+        self.state[mask] = state
+        self.fluctuation[mask] = np.abs(energy - self.energy_last[mask]) > self.threshold[mask]
+        self.energy[mask] = energy
+        self.energy_last[mask] = energy
+
+#       Equilibrate => irreversible updates of the edges of nodes with a thermally insignificant fluctuation in energy
+        event_list = []
+        equilibrate = mask & ~self.fluctuation & (self.state != 0.0)
+        if weight_update and equilibrate.any():
+            s = self.state
+            neg = equilibrate & (s < 0.0)
+            pos = equilibrate & (s > 0.0)
+            for r in range(8): compartment[r] = np.where(equilibrate, tentative[r], compartment[r])
+            compartment[PVPW] = np.where(equilibrate & pcpw_input, np.minimum(compartment[PVPW] + voltage, 1.0), compartment[PVPW])
+            compartment[NVNW] = np.where(equilibrate & pcnw_input, np.maximum(compartment[NVNW] + voltage, -1.0), compartment[NVNW])
+            compartment[NVPW] = np.where(equilibrate & ncpw_input, np.maximum(compartment[NVPW] + voltage, -1.0), compartment[NVPW])
+            compartment[PVNW] = np.where(equilibrate & ncnw_input, np.minimum(compartment[PVNW] + voltage, 1.0), compartment[PVNW])
+
+#           compute compartment voltages - list a holds the edges updated first (pcpw / pcnw), list b the edges updated second (ncnw / ncpw)
+            a_list = np.where(neg, pcpw_list, pcnw_list)
+            b_list = np.where(neg, ncnw_list, ncpw_list)
+            a_voltage = np.where(neg, compartment[PVPW], compartment[NVNW])
+            b_voltage = np.where(neg, compartment[PVNW], compartment[NVPW])
+            a_voltage_sum = np.sum(np.where(a_list, a_voltage, 0.0), axis=0, dtype=float)
+            b_voltage_sum = np.sum(np.where(b_list, b_voltage, 0.0), axis=0, dtype=float)
+            a_count = np.sum(a_list, axis=0)
+            b_count = np.sum(b_list, axis=0)
+            state_abs = np.abs(s)
+            state_2 = s**2
+            with np.errstate(divide='ignore', invalid='ignore'):
+                denom1 = np.where(neg, a_voltage_sum + b_count * state_abs, -a_voltage_sum + b_count * state_abs)
+                denom2 = np.where(neg, b_voltage_sum + a_count * state_abs, -b_voltage_sum + a_count * state_abs)
+                update = equilibrate & (denom1 > 0.0) & (denom2 > 0.0)
+                w2_avg = (np.sum(np.where(a_list, weight**2, 0.0), axis=0, dtype=float) + np.sum(np.where(b_list, weight**2, 0.0), axis=0, dtype=float)) / (a_count + b_count)
+                error1 = np.where(neg, -(pcpw_sum - nwnc_sum * s) / denom1 / 2.0, -(pcnw_sum - pwnc_sum * s) / denom1 / 2.0)
+                error2 = np.where(neg, -(ncnw_sum - pwpc_sum * s) / denom2 / 2.0, -(ncpw_sum - nwpc_sum * s) / denom2 / 2.0)
+                a_error = np.where(neg, (error1 * a_voltage**2 + error2 * state_2) / (a_voltage**2 + state_2), (-error1 * a_voltage**2 - error2 * state_2) / (a_voltage**2 + state_2))
+                b_error = np.where(neg, (error2 * b_voltage**2 + error1 * state_2) / (b_voltage**2 + state_2), (-error2 * b_voltage**2 - error1 * state_2) / (b_voltage**2 + state_2))
+
+#           update edge weights and reset the charges of the updated edges (an edge in both lists is updated twice)
+            a_update = a_list & update
+            b_update = b_list & update
+            self.update_weights(a_update, a_error, w2_avg, self.endpoint)
+            self.update_weights(b_update, b_error, w2_avg, self.endpoint + 2 * a_update)
+            for r in [PCPW, PWPC, PVPW]: compartment[r] = np.where(a_update & neg, 0.0, compartment[r])
+            for r in [PCNW, NWPC, NVNW]: compartment[r] = np.where(a_update & pos, 0.0, compartment[r])
+            for r in [NCNW, NWNC, PVNW]: compartment[r] = np.where(b_update & neg, 0.0, compartment[r])
+            for r in [NCPW, PWNC, NVPW]: compartment[r] = np.where(b_update & pos, 0.0, compartment[r])
+            event_list = [(a_update, a_error, w2_avg), (b_update, b_error, w2_avg)]
+
+#           compute node statistics of the irreversible update
+            (a_sum, a_w_sum, b_sum, b_w_sum) = [np.where(neg, x, y) for (x, y) in [(pcpw_sum, pcnw_sum), (nwnc_sum, pwnc_sum), (ncnw_sum, ncpw_sum), (pwpc_sum, nwpc_sum)]]
+            self.dissipation[equilibrate] = (self.node_energy_factor * ((a_sum - a_w_sum * s)**2 + (b_sum - b_w_sum * s)**2))[equilibrate]
+            self.transport[equilibrate] = (self.node_energy_factor * ((a_sum + a_w_sum * s)**2 + (b_sum + b_w_sum * s)**2) / 4)[equilibrate]
+            self.quality_denom[equilibrate] = (np.abs(a_sum - a_w_sum * s) + np.abs(b_sum - b_w_sum * s))[equilibrate]
+            self.quality_numer[equilibrate] = (np.abs(a_sum + a_w_sum * s) + np.abs(b_sum + b_w_sum * s))[equilibrate]
+
+#       update the edges to bias nodes through their synapse objects
+        state = self.state.reshape(-1)
+        synapse_weight = self.synapse_weight.reshape(self.directions, -1)
+        mask_flat = mask.reshape(-1)
+        for (d, i, k) in self.bias_edge_list:
+            if not mask_flat[i]: continue
+            updated = False
+            for (event, error, w2_avg) in event_list:
+                if event.reshape(self.directions, -1)[d, i]:
+                    self.net.synapse[k].update_state(i, state[i], error.reshape(self.directions, -1)[d, i], w2_avg.reshape(-1)[i])
+                    updated = True
+            if not updated: self.net.synapse[k].push_state(i, state[i])
+            synapse_weight[d, i] = self.net.synapse[k].weight
+
+#       push node states and weights to the neighbor half-edges
+        for d in range(self.directions):
+            if self.reverse[d] < 0: continue
+            target = self.shift(mask & self.exists[d] & ~self.bias_edge[d], self.offset[d])
+            pushed_weight = self.shift(self.synapse_weight[d], self.offset[d])
+            self.voltage[self.reverse[d]] = np.where(target, self.shift(self.state, self.offset[d]), self.voltage[self.reverse[d]])
+            self.weight[self.reverse[d]] = np.where(target, pushed_weight, self.weight[self.reverse[d]])
+            self.synapse_weight[self.reverse[d]] = np.where(target, pushed_weight, self.synapse_weight[self.reverse[d]])
+
+
+    def update_weights(self, event, weight_error, w2_avg, draw):
+        '''
+        Real1 / Real2 weight update of the synapses of the half-edges in event, made in one call per synapse type to the
+        batches of the network synapses (draw holds the synapse stream row of each half-edge).
+        '''
+        learn = event & self.learn & ~self.bias_edge
+        if not learn.any(): return
+        w2_avg = np.broadcast_to(w2_avg, learn.shape)
+        for (batch, select) in [(self.real1, learn & ~self.real2_edge), (self.real2, learn & self.real2_edge)]:
+            if select.any(): self.synapse_weight[select] = batch.update_weights(self.half_position[select], self.synapse_weight[select], weight_error[select], w2_avg[select], draw[select])
+
+
+    def evaluate_distribution(self):
+        '''
+        Computes the free energy and entropy of the distributions sampled in the last step.
+        '''
+        for (mask, distribution) in self.distribution_list: (self.free_energy[mask], self.entropy[mask]) = distribution_statistics(distribution)
+        self.distribution_list = []
+
+
+    def network_sums(self, active):
+        '''
+        Sums the network statistics in the set active (as Network.network_sums).
+        '''
+        if self.distribution_list and ('free_energy' in active or 'entropy' in active): self.evaluate_distribution()
+        network = self.network_image
+        sums = {}
+        if 'energy' in active: sums['energy'] = np.sum(self.energy[network])
+        if 'free_energy' in active: sums['free_energy'] = np.sum(self.free_energy[network])
+        if 'entropy' in active: sums['entropy'] = np.sum(self.entropy[network])
+        if 'dissipation' in active: sums['dissipation'] = np.sum(self.dissipation[network])
+        if 'transport' in active: sums['transport'] = np.sum(self.transport[network])
+        if 'quality' in active:
+            sums['quality_denom'] = np.sum(self.quality_denom[network])
+            sums['quality_numer'] = np.sum(self.quality_numer[network])
+        if 'state_change' in active: sums['state_change'] = np.sum(np.abs(self.state_change[network]))
+        if 'fluctuations' in active: sums['fluctuations'] = int(np.sum(self.fluctuation[network]))
+        if 'color' in active: sums['color'] = np.sum((self.display_polarity * self.state)[network])
+        if 'solved' in active: sums['solved'] = int(np.sum(self.net.bias_group.solve))
+        if 'synapse2' in active: sums['synapse2'] = np.sum(np.where(self.plastic_edge, self.synapse_weight**2, 0.0), dtype=float)
+        if 'order' in active: sums['order'] = -sum([np.sum(np.where(self.order_edge[d], self.state * self.shift(self.state, tuple(-x for x in self.offset[d])), 0.0)) for d in range(self.directions)])
+        return sums
+
+
+    def state_image(self):
+        '''
+        Returns the lattice array of node states (the engine's own storage, not a copy).
+        '''
+        return self.state
+
+
+    def sync(self):
+        '''
+        Writes the node states and statistics back to the network node objects.
+        '''
+        if self.distribution_list: self.evaluate_distribution()
+        for i in self.node_list:
+            x = np.unravel_index(i, self.shape)
+            node = self.net.node[i]
+            node.distribution = None
+            node.flow = None
+            node.state = node.state_last = float(self.state[x])
+            node.state_change = float(self.state_change[x])
+            node.energy = node.energy_last = float(self.energy[x])
+            node.fluctuation = bool(self.fluctuation[x])
+            node.free_energy = float(self.free_energy[x])
+            node.entropy = float(self.entropy[x])
+            node.dissipation = float(self.dissipation[x])
+            node.transport = float(self.transport[x])
+            node.quality_denom = float(self.quality_denom[x])
+            node.quality_numer = float(self.quality_numer[x])
+
+
+    def end(self):
+        '''
+        Writes the node states, edge compartments, edge context and synapse weights back to the network objects.
+        '''
+        self.sync()
+        state = self.state.reshape(-1)
+        voltage = self.voltage.reshape(self.directions, -1)
+        weight = self.weight.reshape(self.directions, -1)
+        compartment = self.compartment.reshape(12, self.directions, -1)
+        synapse_weight = self.synapse_weight.reshape(self.directions, -1)
+        for i in self.node_list:
+            node = self.net.node[i]
+            node.set_compartments(compartment[:, self.node_direction[i], i])
+            for (k, d) in zip(node.synapse_list, self.node_direction[i].tolist()):
+                synapse = self.net.synapse[k]
+                if self.network[synapse.node_pair[i]]:
+                    node.receive_context(k, float(voltage[d, i]), float(weight[d, i]))
+                    synapse.weight = float(synapse_weight[d, i])
+                synapse.output_state[i] = float(state[i])
+                synapse.order = -synapse.output_state[synapse.node_list[0]] * synapse.output_state[synapse.node_list[1]]
@@ -0,0 +1,365 @@
+'''
+Metrics registry for the Thermodynamic Neural Network.
+Output sinks (plot file, state file, terminal) subscribe to the statistics they consume with a cadence in steps.  The
+network evaluates a statistic on a step only if a subscription to it is due on that step.  Epoch summaries (which also
+decide the early stopping of eras) are kept by
+online estimators, node, synapse and bias histories in preallocated ring arrays and the network histories in column
+arrays that spill to memory-mapped files.
+'''
+import numpy as np
+import math
+import time as tm
+import shutil
+
+
+# fields of the node and synapse history rows
+node_history_fields = [('node_id', np.int64), ('node_type', 'U8'), ('connections', np.int64), ('state', float), ('energy', float), ('entropy', float)]
+synapse_history_fields = [('synapse_id', np.int64), ('weight_type', 'U5'), ('output_0', float), ('output_1', float), ('weight', float), ('prefactor', float), ('weight_error', float)]
+
+# node attributes gathered for the network statistics summed over the network nodes
+node_statistic_dict = {'energy': ['energy'], 'free_energy': ['free_energy'], 'entropy': ['entropy'], 'dissipation': ['dissipation'], 'transport': ['transport'],
+                       'quality': ['quality_denom', 'quality_numer'], 'state_change': ['state_change'], 'fluctuations': ['fluctuation'], 'color': ['state']}
+
+# columns of the network long (per step) and short (per epoch) histories
+history_statistic_list = ['energy', 'synapse2', 'state_change', 'fluctuations', 'solved', 'entropy', 'dissipation', 'transport', 'quality', 'order', 'color']
+
+# network statistics in plot file order
+statistic_list = ['energy', 'free_energy', 'synapse2', 'state_change', 'fluctuations', 'solved', 'entropy', 'dissipation', 'transport', 'quality', 'order', 'color']
+
+
+class MetricsRegistry(object):
+    '''
+    Subscriptions of output sinks to network statistics.
+    '''
+    def __init__(self):
+        self.subscription_list = []
+
+
+    def subscribe(self, sink, statistics, cadence=1):
+        '''
+        Subscribes a sink to a list of statistics evaluated every cadence steps (cadence 0 never evaluates them).
+        '''
+        if cadence > 0: self.subscription_list.append((sink, list(statistics), int(cadence)))
+
+
+    def unsubscribe(self, sink):
+        self.subscription_list = [subscription for subscription in self.subscription_list if subscription[0] != sink]
+
+
+    def due(self, sink, time):
+        '''
+        Returns True if any subscription of the sink is due at time.
+        '''
+        return any([time % cadence == 0 for (name, statistics, cadence) in self.subscription_list if name == sink])
+
+
+    def active(self, time):
+        '''
+        Returns the set of statistics subscribed to by some sink due at time.
+        '''
+        active = set()
+        for (sink, statistics, cadence) in self.subscription_list:
+            if time % cadence == 0: active.update(statistics)
+        return active
+
+
+class OnlineStatistic(object):
+    '''
+    Running count, weighted mean and variance (Welford's algorithm, weighted as by West), minimum and maximum of a
+    statistic, updated one value at a time without storing the values.  The means of batches of batch consecutive values
+    are accumulated the same way for the confidence interval of the mean.
+    '''
+    def __init__(self, batch=1):
+        '''
+        :param batch: number of consecutive values per batch mean, 0 keeps no batch means
+        '''
+        self.count = 0
+        self.weight = 0.0
+        self.weight2 = 0.0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.minimum = float('inf')
+        self.maximum = float('-inf')
+        self.batch = batch
+        self.batch_count = 0
+        self.batch_sum = 0.0
+        self.batch_weight = 0.0
+        self.batch_means = OnlineStatistic(0) if batch > 0 else None
+
+
+    def add(self, value, weight=1.0):
+        '''
+        Adds a value with a weight (e.g. the denominator of a ratio, so the mean of the ratios is the ratio of the totals).
+        Values of weight 0 are counted but do not change the statistics or the effective sample size.
+        '''
+        self.count += 1
+        if weight > 0.0:
+            self.weight += weight
+            self.weight2 += weight * weight
+            delta = value - self.mean
+            self.mean += delta * weight / self.weight
+            self.m2 += weight * delta * (value - self.mean)
+            if value < self.minimum: self.minimum = value
+            if value > self.maximum: self.maximum = value
+            self.batch_sum += weight * value
+            self.batch_weight += weight
+        if self.batch_means is None: return
+        self.batch_count += 1
+        if self.batch_count == self.batch:
+            if self.batch_weight > 0.0: self.batch_means.add(self.batch_sum / self.batch_weight, self.batch_weight)
+            (self.batch_count, self.batch_sum, self.batch_weight) = (0, 0.0, 0.0)
+
+
+    def effective_count(self):
+        '''
+        Effective sample size (sum of weights)^2 / sum of squared weights - the number of values of weight 1
+        '''
+        if self.weight == 0.0: return 0.0
+        return self.weight * self.weight / self.weight2
+
+
+    def stdev(self):
+        '''
+        Weighted standard deviation with the bias correction for the effective sample size (n / (n - 1) for weights 1)
+        '''
+        n = self.effective_count()
+        if n <= 1.0 + 1e-12: return 0.0
+        return math.sqrt(self.m2 / self.weight * n / (n - 1.0))
+
+
+    def interval(self, z=1.96):
+        '''
+        Half width of the normal confidence interval of the mean (z = 1.96 for 95%) from the batch means.  Successive
+        steps of a run are correlated, so the interval is taken over means of batches of consecutive values, which are
+        close to independent once a batch is longer than the correlation time of the statistic; nan with fewer than two
+        complete batches.
+        '''
+        if self.batch_means is None or self.batch_means.count < 2: return float('nan')
+        return z * self.batch_means.stdev() / math.sqrt(self.batch_means.effective_count())
+
+
+class EraStop(object):
+    '''
+    Stopping criteria of an era evaluated on its epoch summaries - a solved percentage sustained for a number of epochs,
+    a relative plateau of selected statistics sustained for a number of epochs, or a wall-clock budget.
+    '''
+    def __init__(self, era):
+        '''
+        :param era: era dictionary of the parameters file (keys 'stop_solved', 'stop_plateau', 'stop_seconds')
+        '''
+        self.stop_solved = era['stop_solved']
+        self.stop_plateau = era['stop_plateau']
+        self.stop_seconds = era['stop_seconds']
+        self.start = tm.time()
+        self.solved_epochs = 0
+        self.plateau_epochs = 0
+        self.last = None
+
+
+    def update(self, avg):
+        '''
+        Returns the reason for stopping the era after an epoch with the summary avg, or None to continue.
+        Statistics that were not evaluated in the epoch (nan) never satisfy a criterion.
+        '''
+        if self.stop_solved is not None:
+            (percent, epochs) = self.stop_solved
+            self.solved_epochs = self.solved_epochs + 1 if avg['solved'] >= percent else 0
+            if self.solved_epochs >= epochs: return '%g%% solved for %i epochs' %(percent, epochs)
+        if self.stop_plateau is not None:
+            (statistics, tolerance, epochs) = self.stop_plateau
+            current = [avg[key] for key in statistics]
+            flat = self.last is not None and all([abs(x - y) <= tolerance * abs(y) for (x, y) in zip(current, self.last)])
+            self.plateau_epochs = self.plateau_epochs + 1 if flat else 0
+            self.last = current
+            if self.plateau_epochs >= epochs: return '%s changed less than %g for %i epochs' %('/'.join(statistics), tolerance, epochs)
+        if self.stop_seconds is not None and tm.time() - self.start >= self.stop_seconds: return 'wall-clock budget of %g s' %self.stop_seconds
+        return None
+
+
+    def snapshot(self):
+        '''
+        Returns the epoch counts, elapsed seconds and last plateau statistics of the era (for a checkpoint).
+        '''
+        return {'count': np.array([self.solved_epochs, self.plateau_epochs], dtype=np.int64), 'elapsed': np.array(tm.time() - self.start),
+                'last': np.array(self.last if self.last is not None else [], dtype=float)}
+
+
+    def restore(self, snapshot):
+        '''
+        Writes back criteria returned by snapshot (the wall-clock budget continues from the elapsed seconds).
+        '''
+        (self.solved_epochs, self.plateau_epochs) = snapshot['count'].tolist()
+        self.start = tm.time() - float(snapshot['elapsed'])
+        self.last = snapshot['last'].tolist() if len(snapshot['last']) else None
+
+
+class History(object):
+    '''
+    Ring array holding the last records rows of a history in a preallocated (structured) array.  Appending overwrites the
+    oldest row; index t returns the t-th oldest row retained.
+    '''
+    def __init__(self, dtype, records):
+        '''
+        :param dtype: dtype of a row (a list of fields for structured rows)
+        :param records: number of rows retained
+        '''
+        self.data = np.zeros(records, dtype=dtype)
+        self.records = records
+        self.head = 0
+        self.count = 0
+
+
+    def append(self, row):
+        self.data[self.head] = row
+        self.head = (self.head + 1) % self.records
+        if self.count < self.records: self.count += 1
+
+
+    def __len__(self):
+        return self.count
+
+
+    def __getitem__(self, t):
+        if not 0 <= t < self.count: raise IndexError('history index out of range')
+        return self.data[(self.head - self.count + t) % self.records].item()
+
+
+    def rows(self):
+        '''
+        Returns the retained rows, oldest first.
+        '''
+        if self.count == 0: return self.data[:0]
+        return self.data[(self.head - self.count + np.arange(self.count)) % self.records]
+
+
+def stack_histories(history_list):
+    '''
+    Returns the ring arrays, heads and counts of histories of one dtype and length stacked in arrays (for a checkpoint).
+    '''
+    return {'data': np.array([history.data for history in history_list]), 'head': np.array([history.head for history in history_list], dtype=np.int64),
+            'count': np.array([history.count for history in history_list], dtype=np.int64)}
+
+
+def restore_histories(history_list, stack):
+    '''
+    Writes back histories stacked by stack_histories.
+    '''
+    for (history, data, head, count) in zip(history_list, stack['data'], stack['head'].tolist(), stack['count'].tolist()):
+        history.data[:] = data
+        (history.head, history.count) = (head, count)
+
+
+class ColumnHistory(object):
+    '''
+    Network history held in a preallocated (row, column) float array that doubles in size as it fills.  Once it would
+    grow past spill_rows rows the array moves to a memory-mapped file, which is extended on disk as the history grows,
+    so the memory held by a long run stays bounded.
+    '''
+    def __init__(self, column_list, spill_rows, spill_filename, capacity=1024):
+        '''
+        :param column_list: names of the columns
+        :param spill_rows: largest number of rows held in memory
+        :param spill_filename: file backing the history once it spills
+        :param capacity: initial number of rows
+        '''
+        self.column_list = list(column_list)
+        self.spill_rows = spill_rows
+        self.spill_filename = spill_filename
+        self.data = np.zeros((max(1, min(capacity, spill_rows)), len(self.column_list)))
+        self.count = 0
+        self.spilled = False
+
+
+    def append(self, row):
+        if self.count == len(self.data): self.grow()
+        self.data[self.count] = row
+        self.count += 1
+
+
+    def grow(self):
+        '''
+        Doubles the number of rows, in memory or in the memory-mapped file.
+        '''
+        rows = 2 * len(self.data)
+        if not self.spilled and rows <= self.spill_rows:
+            data = np.zeros((rows, len(self.column_list)))
+            data[:self.count] = self.data[:self.count]
+            self.data = data
+            return
+        if self.spilled: self.data.flush()
+        data = self.data[:self.count] if not self.spilled else None
+        self.data = None
+        with open(self.spill_filename, 'ab') as spill_file: spill_file.truncate(rows * len(self.column_list) * 8)
+        self.data = np.memmap(self.spill_filename, dtype=np.float64, mode='r+', shape=(rows, len(self.column_list)))
+        if data is not None: self.data[:self.count] = data
+        self.spilled = True
+
+
+    def __len__(self):
+        return self.count
+
+
+    def snapshot(self):
+        '''
+        Returns the rows held so far, or no rows for a spilled history (its rows stay in the memory-mapped file), with
+        the number of rows allocated, the spilled flag and the row count (for a checkpoint).
+        '''
+        if self.spilled: self.data.flush()
+        return {'data': self.data[:0 if self.spilled else self.count].copy(), 'size': np.array([len(self.data), int(self.spilled), self.count], dtype=np.int64)}
+
+
+    def restore(self, snapshot):
+        '''
+        Writes back a history returned by snapshot, reopening the memory-mapped file of a spilled history.
+        '''
+        (rows, spilled, self.count) = snapshot['size'].tolist()
+        self.spilled = bool(spilled)
+        if self.spilled: self.data = np.memmap(self.spill_filename, dtype=np.float64, mode='r+', shape=(rows, len(self.column_list)))
+        else:
+            self.data = np.zeros((rows, len(self.column_list)))
+            self.data[:self.count] = snapshot['data']
+
+
+    def __getstate__(self):
+        '''
+        Pickles the rows held so far, or only the row count of a spilled history (its rows stay in the memory-mapped
+        file).
+        '''
+        state = self.__dict__.copy()
+        if self.spilled:
+            self.data.flush()
+            state['data'] = len(self.data)
+        else: state['data'] = self.data[:max(1, self.count)].copy()
+        return state
+
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self.spilled: self.data = np.memmap(self.spill_filename, dtype=np.float64, mode='r+', shape=(state['data'], len(self.column_list)))
+
+
+    def move(self, spill_filename):
+        '''
+        Backs the history with spill_filename from now on, copying the memory-mapped file of a spilled history (used by
+        the branches of a checkpoint, which would otherwise write to one file).
+        '''
+        if self.spilled:
+            self.data.flush()
+            shutil.copyfile(self.spill_filename, spill_filename)
+            self.data = np.memmap(spill_filename, dtype=np.float64, mode='r+', shape=self.data.shape)
+        self.spill_filename = spill_filename
+
+
+    def array(self):
+        '''
+        Returns the (row, column) array of the history (a view, not a copy).
+        '''
+        return self.data[:self.count]
+
+
+    def column(self, name):
+        return self.data[:self.count, self.column_list.index(name)]
+
+
+    def close(self):
+        if self.spilled: self.data.flush()
@@ -5,25 +5,40 @@ to govern connectivity.  Adaptation rules of nodes and synapses are thermodynami
 import numpy as np
 import copy as cp
 import sys
-import math
 import time as tm
+import operator
 import os
 import shutil
+import itertools
+import pickle
+import multiprocessing as mp
 import params_v21 as pd
 import nodes_v21 as nd
 import synapse_v21 as sd
 import render_v21 as rd
+import rng_v21 as rn
+import metrics_v21 as mt
+import engine_v21 as eg
+import replica_v21 as rp
 
 
 class Network(object):
     '''
     Network class for nodes arranged on a regular grid connected periodically so there are no boundaries.
     '''
-
-    def __init__(self):
-
-#       import the network definition
-        self.parm = pd.Parameters()
+    output_file_list = ['state', 'plot', 'epoch', 'edge']
+    node_state_list = ['state', 'state_last', 'state_change', 'energy', 'energy_last', 'fluctuation', 'free_energy', 'entropy', 'dissipation', 'transport',
+                       'quality_denom', 'quality_numer', 'threshold', 'energy_factor']
+
+    def __init__(self, precision=None, run_suffix='', seed=None, coarse=1):
+
+#       import the network definition (precision and seed override the parameter file, e.g. for a float64 reference run; coarse scales the lattice down for a warm start)
+        self.parm = pd.Parameters(run_suffix, coarse)
+        if precision is not None: self.parm.precision = precision
+        if seed is not None: self.parm.seed = seed
+        self.replica = None
+        self.replica_factor = 1.0
+        self.run_position = None
         
 #       open and initialize file to store network state data
         self.data_dir = self.parm.folder_name + '\\data'
@@ -44,6 +59,14 @@ class Network(object):
         self.plot_file.write('Date %s12\n' %tm.strftime('%m/%d/%Y'))
         self.plot_file.write('Time %s12\n' %tm.strftime('%H:%M:%S'))
 
+#       open and initialize file to store the epoch summaries of the network statistics
+        self.epoch_filename = self.data_dir + '\\epoch_data.txt'
+        self.epoch_file = open(self.epoch_filename, 'w')
+        print('file "' + self.epoch_filename + '" created to store epoch summaries')
+        self.epoch_file.write('Thermodynamic Neural Network Epoch File\n')
+        self.epoch_file.write('Date %s\n' %tm.strftime('%m/%d/%Y'))
+        self.epoch_file.write('Time %s\n' %tm.strftime('%H:%M:%S'))
+
 #       open and initialize file to store edge state data at end of simulation
         self.edge_filename = self.data_dir + '\\edge_data.txt'
         self.edge_file = open(self.edge_filename, 'w')
@@ -55,6 +78,22 @@ class Network(object):
 #       store a copy of the simulation parameters file
         shutil.copyfile('params_v21.py', self.data_dir + '\\params_v21.py')
 
+#       initialize the random streams and store the seed
+        self.rng = rn.RandomStreams(self.parm.seed)
+        self.rng.add_stream(rn.NODE, self.parm.all_nodes)
+        self.rng.add_stream(rn.BIAS, self.parm.all_nodes)
+        self.seed_filename = self.data_dir + '\\seed.txt'
+        seed_file = open(self.seed_filename, 'w')
+        seed_file.write('%i\n' %self.rng.seed)
+        seed_file.close()
+        print('random stream seed %i stored in file "%s"' %(self.rng.seed, self.seed_filename))
+
+#       subscribe the output sinks to the network statistics they consume (the state file writes per-node values, so it is due every step without network statistics)
+        self.metrics = mt.MetricsRegistry()
+        for key in mt.statistic_list: self.metrics.subscribe('plot', [key], self.parm.metric_cadence[key])
+        if any([self.parm.show_video, self.parm.save_state_video, self.parm.save_change_video, self.parm.save_images, not self.parm.delete_state_file]):
+            self.metrics.subscribe('state', [], 1)
+
         print('\n*********************************************  Building Network  ****************************************************\n')
         
 #       Populate the positional information of nodes on the grid dimensions in the array node_position_array
@@ -122,15 +161,15 @@ class Network(object):
 #                       Randomly select a placement position for the node.
                         if self.parm.bipartite or self.parm.network == 'neighbor':
                             if complement:
-                                if self.parm.node_dict[key][m]['part'] == 'any': i = np.random.choice(viable_even_node_list + viable_odd_node_list)
-                                if self.parm.node_dict[key][m]['part'] == 'even': i = np.random.choice(viable_even_node_list)
-                                if self.parm.node_dict[key][m]['part'] == 'odd': i = np.random.choice(viable_odd_node_list)
+                                if self.parm.node_dict[key][m]['part'] == 'any': i = self.rng.build.choice(viable_even_node_list + viable_odd_node_list)
+                                if self.parm.node_dict[key][m]['part'] == 'even': i = self.rng.build.choice(viable_even_node_list)
+                                if self.parm.node_dict[key][m]['part'] == 'odd': i = self.rng.build.choice(viable_odd_node_list)
                             else:
-                                if self.parm.node_dict[key][m]['part'] == 'any': i = np.random.choice(viable_even_node_list + viable_odd_node_list)
-                                if self.parm.node_dict[key][m]['part'] == 'even': i = np.random.choice(viable_odd_node_list)
-                                if self.parm.node_dict[key][m]['part'] == 'odd': i = np.random.choice(viable_even_node_list)
+                                if self.parm.node_dict[key][m]['part'] == 'any': i = self.rng.build.choice(viable_even_node_list + viable_odd_node_list)
+                                if self.parm.node_dict[key][m]['part'] == 'even': i = self.rng.build.choice(viable_odd_node_list)
+                                if self.parm.node_dict[key][m]['part'] == 'odd': i = self.rng.build.choice(viable_even_node_list)
                         else:
-                            i = np.random.choice(viable_even_node_list + viable_odd_node_list)
+                            i = self.rng.build.choice(viable_even_node_list + viable_odd_node_list)
 
 
 #                       Test node position for separation from prohibited neighbor nodes that are already placed
@@ -179,7 +218,7 @@ class Network(object):
                     node_recur[i] = self.parm.node_dict[key][m]['recur']
                     
 #                   Build the node object
-                    self.node[i] = nd.MakeNode.Factory(i, key, node_states, node_polarity, node_period, self.parm.print_records, node_energy_factor, node_threshold)
+                    self.node[i] = nd.MakeNode.Factory(i, key, node_states, node_polarity, node_period, self.parm.print_records, node_energy_factor, node_threshold, self.rng)
                     if nodes_placed % 1000 == 0: print('%i nodes placed' %nodes_placed)
 
 #                   Set up logic node separation tracking for synapse placement in non-neighbor networks
@@ -193,6 +232,15 @@ class Network(object):
             for key2 in self.parm.node_class_list_dict[key1]:
                 self.node_list_dict[key1] += self.node_list_dict[key2]
 
+#       Attach the network nodes to the active set of the 'active' scheduler
+        self.network_position = dict([(i, n) for (n, i) in enumerate(self.node_list_dict['network'])])
+        self.network_node_array = np.array(self.node_list_dict['network'], dtype=int)
+        self.active_set = set(self.node_list_dict['network'])
+        self.updated_set = set()
+        if self.parm.scheduler == 'active':
+            for i in self.node_list_dict['network']: self.node[i].schedule = self.active_set
+            self.rng.add_stream(rn.SCHEDULE, self.parm.all_nodes)
+
 #       Correct display polarity for logic nodes
         for i in self.node_list_dict['logic']: self.display_polarity[i] = 1
 
@@ -253,7 +301,7 @@ class Network(object):
             i_search = True
             while i_search:
                 cum_connect = np.cumsum(node_connect)
-                seed = np.random.random() * cum_connect[-1]
+                seed = self.rng.build.random() * cum_connect[-1]
                 i = self.parm.all_nodes//2
                 imin = 0
                 imax = self.parm.all_nodes
@@ -270,7 +318,7 @@ class Network(object):
                 j_search = True
                 while j_search:
                     cum_probability = np.cumsum(saturation_mask * connection_mask[i] * probability_array[i])
-                    seed = np.random.random() * cum_probability[-1]
+                    seed = self.rng.build.random() * cum_probability[-1]
                     j = self.parm.all_nodes//2
                     jmin = 0
                     jmax = self.parm.all_nodes
@@ -421,10 +469,20 @@ class Network(object):
         self.plastic_synapses = self.order_param_synapses + self.recurrent_synapses
         self.all_synapses = k
         self.all_synapse_list = list(range(self.all_synapses))
+        self.plastic_synapse_array = np.array(self.plastic_synapse_list, dtype=np.int64)
+        self.order_param_synapse_array = np.array(self.order_param_synapse_list, dtype=np.int64)
+        self.weight_sum_node = np.array([n for (n, i) in enumerate(self.node_list_dict['network']) for k in self.node_to_synapse_list[i]], dtype=np.int64)
+        self.weight_sum_synapse = np.array([k for i in self.node_list_dict['network'] for k in self.node_to_synapse_list[i]], dtype=np.int64)
 
         print('\n*************  %s network %i connections completed   *************\n' %(self.parm.network, self.all_synapses))
 
-#       Build the network        
+#       Declare the synapse random streams
+        for stream in [rn.SYNAPSE_NORMAL, rn.SYNAPSE_UNIFORM, rn.WEIGHT_NORMAL, rn.WEIGHT_UNIFORM]: self.rng.add_stream(stream, self.all_synapses)
+
+#       Build the network (synapse weights, order parameters and parameters are held in the arrays of a synapse store)
+        self.synapse_store = sd.SynapseStore(self.all_synapses, self.parm.precision)
+        self.plastic_synapse_mask = self.synapse_store.mask(self.plastic_synapse_array)
+        self.order_param_synapse_mask = self.synapse_store.mask(self.order_param_synapse_array)
         self.synapse = {}
         self.energy_factor = {}
         for k in self.all_synapse_list:
@@ -437,15 +495,37 @@ class Network(object):
             size_mass = self.parm.synapse_dict[self.node_class[i]][self.node_class[j]]['size_mass']
             change_mass = self.parm.synapse_dict[self.node_class[i]][self.node_class[j]]['change_mass']
             self.energy_factor[k] = self.parm.synapse_dict[self.node_class[i]][self.node_class[j]]['synapse_ef']
+            synapse_depth[k] = self.parm.synapse_dict[self.node_class[i]][self.node_class[j]]['depth']
             if weight_type == 'fail':
                 print('\n**********   network connection error (synapse weight type == fail) - execution terminated    ****************\n')
                 self.kill_simulation()
-            self.synapse[k] = sd.MakeSynapse.Factory(k, weight_type, self.energy_factor[k], synapse_depth[k], weight_bound, weight_target, weight_noise, size_mass, change_mass, self.parm.print_records)
+            self.synapse[k] = sd.MakeSynapse.Factory(k, weight_type, self.energy_factor[k], synapse_depth[k], weight_bound, weight_target, weight_noise, size_mass, change_mass, self.parm.print_records, self.rng, self.synapse_store)
 
 #           Connect nodes and synapses
-            self.synapse[k].add_nodes(i, self.node[i].receive_context, j, self.node[j].receive_context)
-            self.node[i].add_synapse(k, weight_target, self.synapse[k].update_state, self.synapse[k].push_state)
-            if i != j: self.node[j].add_synapse(k, weight_target, self.synapse[k].update_state, self.synapse[k].push_state)
+            if i == j:
+                self.synapse[k].add_self_node(i, self.node[i].receive_context)
+                self.node[i].add_synapse(k, weight_target, self.synapse[k].update_self_state, self.synapse[k].push_self_state)
+            else:
+                self.synapse[k].add_nodes(i, self.node[i].receive_context, j, self.node[j].receive_context)
+                self.node[i].add_synapse(k, weight_target, self.synapse[k].update_state, self.synapse[k].push_state)
+                self.node[j].add_synapse(k, weight_target, self.synapse[k].update_state, self.synapse[k].push_state)
+
+#       Hold the transmission delays of synapses with time_depth > 0 in a shared ring array
+        self.delay = None
+        if any([synapse_depth[k] > 0 for k in self.all_synapse_list]):
+            self.delay = sd.DelayStore([synapse_depth[k] for k in self.all_synapse_list])
+            for k in self.all_synapse_list:
+                if synapse_depth[k] > 0: self.synapse[k].set_delay(self.delay)
+
+#       Group the bias nodes for array-backed updates
+        self.bias_group = nd.BiasGroup([self.node[i] for i in self.node_list_dict['logic']], self.rng, self.parm.print_records)
+
+#       Verify that the network can run on the lattice engine
+        if self.parm.lattice_engine:
+            conflict = eg.lattice_conflict(self)
+            if conflict:
+                print('\n**********   lattice engine error (%s) - execution terminated    ****************\n' %conflict)
+                self.kill_simulation()
 
         print('\n**************  %s network build completed   *******************\n' %self.parm.network)
                                    
@@ -454,160 +534,181 @@ class Network(object):
 
 #       print headers 
         print('Epoch\t\tNode Energy\t\tSynapse^2\t\t% Changed\t\t% Fluctuation\t\t% Solved\t\tEntropy\t\tDissipation\t\tTransport\t\tQuality\t\tOrder\t\tColor')
-        self.state_file.write('\nNetwork Simulation Results\n')
-        self.plot_file.write('\nTime, Avg Node Energy, Avg Node Free Energy, Avg Synapse^2, % Changed, % Fluctuation, % Solved, Total Entropy, Avg Dissipation, Avg Transport, Quality, Order Param, Avg Color')
-
-#       initialize network        
-        self.network_long_history = []
-        self.network_short_history = []
-        for i in self.node_list_dict['logic']: self.node[i].update_state(0, 0, False, 'noise')
-        for i in self.node_list_dict['network']: self.node[i].update_state(False)
-        input_weight_array = np.array([self.synapse[k].weight * math.sqrt(2.0 * self.energy_factor[k]) for k in self.plastic_synapse_list])
-        input_weight_sum_array = np.array([sum([(self.synapse[k].weight * math.sqrt(2.0 * self.energy_factor[k])) for k in self.node_to_synapse_list[i]]) for i in self.node_list_dict['network']])
-        input_weight_abs_array = np.array([sum([(abs(self.synapse[k].weight) * math.sqrt(2.0 * self.energy_factor[k])) for k in self.node_to_synapse_list[i]]) for i in self.node_list_dict['network']])
+        if self.run_position is None:
+            self.state_file.write('\nNetwork Simulation Results\n')
+            self.plot_file.write('\nTime, Avg Node Energy, Avg Node Free Energy, Avg Synapse^2, % Changed, % Fluctuation, % Solved, Total Entropy, Avg Dissipation, Avg Transport, Quality, Order Param, Avg Color')
+            self.epoch_file.write('\nEpoch, Statistic, Steps, Mean, Stdev, Min, Max, Interval95')
+
+#           initialize network        
+            self.engine = None
+            self.frozen_engine = None
+            self.lattice_engine = None
+            self.dormant_synapse_set = set()
+            self.network_long_history = mt.ColumnHistory(mt.history_statistic_list, self.parm.history_spill_rows, self.data_dir + '\\long_history.dat')
+            self.stop_list = []
+            self.network_short_history = mt.ColumnHistory(mt.history_statistic_list, self.parm.history_spill_rows, self.data_dir + '\\short_history.dat')
+            self.network_node_objects = [self.node[i] for i in self.node_list_dict['network']]
+            self.network_polarity = np.array([self.display_polarity[i] for i in self.node_list_dict['network']], dtype=float)
+            self.anneal_base = {'threshold': np.array([node.threshold for node in self.network_node_objects]), 'node_ef': np.array([node.energy_factor for node in self.network_node_objects]),
+                                'synapse_ef': self.synapse_store.energy_factor.copy()}
+            self.anneal_factor = dict([(key, 1.0) for key in self.parm.anneal_key_list])
+            self.anneal_list = []
+            self.bias_group.update_state(0, 0, False, 'noise')
+            for i in self.node_list_dict['network']: self.node[i].update_state(False)
+            input_weight = self.weight_distributions()
+            (resume_era, first_epoch, time, epoch) = (None, 0, 0, 0)
+
+#       continue the run of a checkpoint from the epoch after the checkpoint
+        else:
+            (resume_era, first_epoch, time, epoch, era_stop, input_weight) = [self.run_position[key] for key in ['era', 'first_epoch', 'time', 'epoch', 'era_stop', 'input_weight']]
+            self.run_position = None
+        (input_weight_array, input_weight_sum_array, input_weight_abs_array) = input_weight
+        self.checkpoint_time = tm.time()
 
 #       update network in a series of epochs
-        time = 0
-        epoch = 0
         for era in self.parm.era:
+            if resume_era is not None and era != resume_era: continue
             weight_update = self.parm.era[era]['weight_update']     # boolean for weight updates
             logic_mode = self.parm.era[era]['logic_mode']           # string indicating operational mode for logic nodes
-            for h in range(self.parm.era[era]['epochs']):
+            if resume_era is None:
+                first_epoch = 0
+                era_stop = mt.EraStop(self.parm.era[era])
+            resume_era = None
+            self.bias_group.set_era(era)
+            if self.parm.lattice_engine and self.parm.era[era]['epochs'] > 0:
+                if self.lattice_engine is None: self.lattice_engine = eg.LatticeEngine(self)
+                self.engine = self.lattice_engine
+                self.engine.begin()
+            elif self.parm.frozen_engine and not weight_update and self.parm.era[era]['epochs'] > 0 and self.delay is None:
+                if self.frozen_engine is None: self.frozen_engine = eg.FrozenEngine(self)
+                self.engine = self.frozen_engine
+                self.engine.begin()
+            for h in range(first_epoch, self.parm.era[era]['epochs']):
                 epoch +=1   
 
-#               set initial variables that change over a single epoch
-                total_node_energy = 0.0
-                total_node_free_energy = 0.0
-                total_node_entropy = 0.0
-                total_node_dissipation = 0.0
-                total_node_transport = 0.0
-                total_node_quality_denom = 0.0
-                total_node_quality_numer = 0.0
-                total_node_solutions = 0
-                total_flipped_nodes = 0
-                total_synapse_energy = 0.0
-                total_synapse_order = 0.0
-                total_fluctuations = 0
-                total_node_color = 0.0
+#               set the annealed node and synapse parameters of the epoch
+                factor = dict([(key, self.schedule_factor(self.parm.era[era]['anneal'][key], h, self.parm.era[era]['epochs'])) for key in self.parm.anneal_key_list])
+                factor['node_ef'] *= self.replica_factor
+                if factor != self.anneal_factor: self.set_anneal(factor, epoch, time)
+
+#               set the online estimators of the epoch statistics (batches of about the square root of the evaluations of an epoch for the batch means)
+                summary = dict([(key, mt.OnlineStatistic(max(1, int(np.sqrt(self.parm.time // max(1, self.parm.metric_cadence[key])))))) for key in mt.statistic_list])
 
 #               update the network for the current epoch
                 for t in range(self.parm.time):
                     time += 1
+                    self.rng.set_step(time)
+                    if self.delay is not None: self.delay.advance()
                     
-#                   update the network node states 
-                    for i in self.node_list_dict['logic']: self.node[i].update_state(time, era, weight_update, logic_mode)
-                    for i in self.node_list_dict['network']: self.node[i].update_state(weight_update)
-                    for i in self.node_list_dict['logic']: self.node[i].evaluate_state()
-                    self.state_file.write('\ntime, %7i, state update\n' %(time))
-                    self.state_file.write('node id, energy, state, entropy, solution, dissipation\n')
-                    for i in self.all_node_list:
-##                        line = str(i) + ', ' + str(self.node[i].energy) + ', ' + str(self.display_polarity[i] * self.node[i].state) + ', ' + str(self.node[i].state_change) + ', '
-                        line = str(i) + ', ' + str(self.node[i].energy) + ', ' + str(self.display_polarity[i] * self.node[i].state) + ', ' + str(2*int(not self.node[i].fluctuation)-1) + ', '
-                        line += str(self.node[i].entropy) + ', ' + str(self.node[i].solve) + ', ' + str(self.node[i].dissipation) + ', ' + str(self.node[i].transport) + ', ' + str(logic_mode) + '\n'
-                        self.state_file.write(line)
+#                   update the network node states (all synapses update on a dormant synapse revisit step)
+                    revisit = self.parm.dormant_threshold > 0.0 and self.engine is None and time % self.parm.dormant_cadence == 0
+                    if revisit: self.set_dormant_synapses(set())
+                    self.bias_group.update_state(time, era, weight_update, logic_mode)
+                    if self.engine is not None: self.engine.step(weight_update)
+                    elif self.parm.scheduler == 'active': self.update_active_nodes(weight_update)
+                    else:
+                        for i in self.node_list_dict['network']: self.node[i].update_state(weight_update)
+                    self.bias_group.evaluate_state()
+                    if revisit: self.set_dormant_synapses(set(self.plastic_synapse_array[np.abs(self.synapse_store.weight[self.plastic_synapse_array]) < self.parm.dormant_threshold].tolist()))
+                    active = self.metrics.active(time)
+                    if self.metrics.due('state', time):
+                        if self.engine is not None: self.engine.sync()
+                        self.state_file.write('\ntime, %7i, state update\n' %(time))
+                        self.state_file.write('node id, energy, state, entropy, solution, dissipation\n')
+                        for i in self.all_node_list:
+##                            line = str(i) + ', ' + str(self.node[i].energy) + ', ' + str(self.display_polarity[i] * self.node[i].state) + ', ' + str(self.node[i].state_change) + ', '
+                            line = str(i) + ', ' + str(self.node[i].energy) + ', ' + str(self.display_polarity[i] * self.node[i].state) + ', ' + str(2*int(not self.node[i].fluctuation)-1) + ', '
+                            line += str(self.node[i].entropy) + ', ' + str(self.node[i].solve) + ', ' + str(self.node[i].dissipation) + ', ' + str(self.node[i].transport) + ', ' + str(logic_mode) + '\n'
+                            self.state_file.write(line)
+                        if self.parm.show_video and self.engine is self.lattice_engine: rd.show_lattice(self.parm.folder_name, self.engine.state_image(), self.engine.display_polarity, self.engine.network_image)
 
 #                   update network status variables
-                    sum_node_energy = sum([self.node[i].energy for i in self.node_list_dict['network']])
-                    sum_node_free_energy = sum([self.node[i].free_energy for i in self.node_list_dict['network']])
-                    sum_node_entropy = sum([self.node[i].entropy for i in self.node_list_dict['network']])
-                    sum_node_dissipation = sum([self.node[i].dissipation for i in self.node_list_dict['network']])
-                    sum_node_transport = sum([self.node[i].transport for i in self.node_list_dict['network']])
-                    sum_node_quality_denom = sum([self.node[i].quality_denom for i in self.node_list_dict['network']])
-                    sum_node_quality_numer = sum([self.node[i].quality_numer for i in self.node_list_dict['network']])
-                    sum_flipped_nodes = sum([abs(self.node[i].state_change) for i in self.node_list_dict['network']])
-                    sum_fluctuations = sum([int(self.node[i].fluctuation) for i in self.node_list_dict['network']])
-                    sum_node_color = sum([self.display_polarity[i] * self.node[i].state for i in self.node_list_dict['network']])
-                    sum_node_solutions = sum([1 for i in self.node_list_dict['logic'] if self.node[i].solve])
-                    sum_synapse_energy = sum([self.synapse[k].weight**2 for k in self.plastic_synapse_list])
-                    sum_synapse_order = sum([self.synapse[k].order for k in self.order_param_synapse_list])
-
-                    total_node_energy += sum_node_energy
-                    total_node_free_energy += sum_node_free_energy
-                    total_node_entropy += sum_node_entropy
-                    total_node_dissipation += sum_node_dissipation
-                    total_node_transport += sum_node_transport
-                    total_node_quality_denom += sum_node_quality_denom
-                    total_node_quality_numer += sum_node_quality_numer
-                    total_node_solutions += sum_node_solutions                
-                    total_flipped_nodes += sum_flipped_nodes
-                    total_fluctuations += sum_fluctuations
-                    total_node_color += sum_node_color
-                    total_synapse_energy += sum_synapse_energy
-                    total_synapse_order += sum_synapse_order
-
-#                   Store results of the time step
-                    avg_node_energy = sum_node_energy / self.parm.network_nodes
-                    avg_node_free_energy = sum_node_free_energy / self.parm.network_nodes
-                    avg_node_dissipation = sum_node_dissipation / self.parm.network_nodes
-                    avg_node_transport = sum_node_transport / self.parm.network_nodes
-                    if sum_node_quality_denom == 0.0: avg_node_quality = 0.0
-                    else: avg_node_quality = sum_node_quality_numer / sum_node_quality_denom
-                    percent_node_solutions = 100.0 * sum_node_solutions / max(1, self.parm.logic_nodes)
-                    percent_flipped_nodes = 100.0 * sum_flipped_nodes / self.parm.network_nodes
-                    percent_fluctuations = 100.0 * sum_fluctuations / self.parm.network_nodes
-                    avg_node_color = sum_node_color / self.parm.network_nodes
-                    avg_synapse_energy = sum_synapse_energy / self.plastic_synapses
-                    avg_synapse_order = sum_synapse_order / self.order_param_synapses
-                    self.network_long_history.append((avg_node_energy, avg_synapse_energy, percent_flipped_nodes, percent_fluctuations, percent_node_solutions, sum_node_entropy, avg_node_dissipation, avg_node_transport, avg_node_quality, avg_synapse_order, avg_node_color))
-                    self.plot_file.write('\n' + str(time) + ', ' + str(avg_node_energy) + ', ' + str(avg_node_free_energy) + ', ' + str(avg_synapse_energy) + ', ' + str(percent_flipped_nodes) + ', ' + str(percent_fluctuations) + ', ' + str(percent_node_solutions) + ', ' + str(sum_node_entropy) + ', ' + str(avg_node_dissipation) + ', ' + str(avg_node_transport)+ ', ' + str(avg_node_quality) + ', ' + str(avg_synapse_order) + ', ' + str(avg_node_color))                    
-
-#               Store and print the results of the epoch
-                avg_total_node_energy = total_node_energy / self.parm.network_nodes / self.parm.time
-                avg_total_node_free_energy = total_node_free_energy / self.parm.network_nodes / self.parm.time
-                avg_total_node_entropy = total_node_entropy / self.parm.time
-                avg_total_node_dissipation = total_node_dissipation / self.parm.network_nodes / self.parm.time
-                avg_total_node_transport = total_node_transport / self.parm.network_nodes / self.parm.time
-                if total_node_quality_denom == 0.0: avg_total_node_quality = 0.0
-                else: avg_total_node_quality = total_node_quality_numer / total_node_quality_denom
-                percent_total_node_solutions = 100.0 * total_node_solutions / max(1, self.parm.logic_nodes) / self.parm.time
-                percent_total_flipped_nodes = 100.0 * total_flipped_nodes / self.parm.network_nodes / self.parm.time
-                percent_total_fluctuations = 100.0 * total_fluctuations / self.parm.network_nodes / self.parm.time
-                avg_total_node_color = total_node_color / self.parm.network_nodes / self.parm.time
-                avg_total_synapse_energy = total_synapse_energy / self.plastic_synapses / self.parm.time
-                avg_total_synapse_order = total_synapse_order / self.order_param_synapses / self.parm.time
-                self.network_short_history.append((avg_total_node_energy, avg_total_synapse_energy, percent_total_flipped_nodes, percent_total_fluctuations, percent_total_node_solutions, avg_total_node_entropy, avg_total_node_dissipation, avg_total_node_transport, avg_total_node_quality, avg_total_synapse_order, avg_total_node_color))               
-                print('%5i\t\t%6.3f\t\t\t%6.4f\t\t\t%4.2f\t\t\t%4.2f\t\t\t%4.2f\t\t\t%4.0f\t\t%6.2f\t\t\t%6.2f\t\t\t%6.2f\t\t%6.2f\t\t%4.3f' %(epoch, avg_total_node_energy, avg_total_synapse_energy, percent_total_flipped_nodes, percent_total_fluctuations, percent_total_node_solutions, avg_total_node_entropy, avg_total_node_dissipation, avg_total_node_transport, avg_total_node_quality, avg_total_synapse_order, avg_total_node_color))
+                    sums = self.network_sums(active)
+
+#                   Store results of the time step (statistics not evaluated on this step are stored as nan)
+                    avg = {}
+                    for key in mt.statistic_list:
+                        if key not in active: avg[key] = float('nan')
+                        elif key == 'quality': avg[key] = self.network_quality(sums['quality_numer'], sums['quality_denom'])
+                        else: avg[key] = self.network_average(key, sums[key])
+                    for key in active:
+                        if key == 'quality': summary[key].add(avg[key], sums['quality_denom'])          # the quality mean is the ratio of the totals over the epoch
+                        else: summary[key].add(avg[key])
+                    self.network_long_history.append([avg[key] for key in mt.history_statistic_list])
+                    if self.metrics.due('plot', time) and self.parm.plot_cadence > 0 and time % self.parm.plot_cadence == 0:
+                        self.plot_file.write('\n' + str(time) + ''.join([', ' + str(avg[key]) for key in mt.statistic_list]))
+
+#               Store and print the results of the epoch (averaged over the steps on which each statistic was evaluated)
+                avg = {}
+                for key in mt.statistic_list:
+                    if summary[key].count == 0: avg[key] = float('nan')
+                    else: avg[key] = summary[key].mean
+                    self.epoch_file.write('\n%i, %s, %i, %s, %s, %s, %s, %s' %(epoch, key, summary[key].count, avg[key], summary[key].stdev(), summary[key].minimum, summary[key].maximum, summary[key].interval()))
+                self.network_short_history.append([avg[key] for key in mt.history_statistic_list])
+                print('%5i\t\t%6.3f\t\t\t%6.4f\t\t\t%4.2f\t\t\t%4.2f\t\t\t%4.2f\t\t\t%4.0f\t\t%6.2f\t\t\t%6.2f\t\t\t%6.2f\t\t%6.2f\t\t%4.3f' %(epoch, avg['energy'], avg['synapse2'], avg['state_change'], avg['fluctuations'], avg['solved'], avg['entropy'], avg['dissipation'], avg['transport'], avg['quality'], avg['order'], avg['color']))
+
+#               attempt a replica exchange on the total node energy (the new node_ef scale applies from the next epoch)
+                if self.replica is not None and epoch % self.parm.exchange_cadence == 0:
+                    energy = self.network_sums({'energy'})['energy']
+                    self.replica_factor = self.replica.exchange(epoch, time, energy, self.replica_factor)
+                    self.epoch_file.write('\n%i, exchange, %i, %s, node_ef scale %g' %(epoch, time, energy, self.replica_factor))
+
+#               stop the era early once its stopping criteria are met by the epoch summaries
+                reason = era_stop.update(avg)
+                if reason is not None:
+                    self.stop_list.append((era, epoch, time, reason))
+                    self.epoch_file.write('\n%i, era stop, %i, %s' %(epoch, time, reason))
+                    print('era %i stopped at epoch %i (step %i) - %s' %(era, epoch, time, reason))
+                    break
+
+#               write a checkpoint once checkpoint_seconds have passed since the last one
+                if self.parm.checkpoint_seconds > 0 and tm.time() - self.checkpoint_time >= self.parm.checkpoint_seconds:
+                    self.save_checkpoint({'era': era, 'first_epoch': h + 1, 'time': time, 'epoch': epoch, 'era_stop': era_stop, 'input_weight': input_weight})
+
+#           return the network state to the node and synapse objects at the end of an engine era
+            if self.engine is not None:
+                self.engine.end()
+                self.engine = None
+                if self.dormant_synapse_set: self.set_dormant_synapses(set())
 
 #       Save edge states at end of run
         self.edge_file.write('\nEdge Weight Distribution')
         self.edge_file.write('\nWeight Bin, Output Numbers, Input Numbers')
-        output_weight_array = np.array([self.synapse[k].weight * math.sqrt(2.0 * self.energy_factor[k]) for k in self.plastic_synapse_list])
+        (output_weight_array, output_weight_sum_array, output_weight_abs_array) = self.weight_distributions()
         resolution = 4
-        hist_max = int(round(resolution * np.max(np.abs(output_weight_array))))
+        hist_max = int(round(resolution * max(np.max(np.abs(input_weight_array)), np.max(np.abs(output_weight_array)))))
         hist_index = np.arange(2*hist_max+1)
         hist_bin = hist_index - hist_max
         input_hist_value = np.zeros(2*hist_max+1, dtype = int)
         output_hist_value = np.zeros(2*hist_max+1, dtype = int)
-        for weight in output_weight_array: output_hist_value[int(round(resolution * weight)) + hist_max] += 1
-        for weight in input_weight_array: input_hist_value[int(round(resolution * weight)) + hist_max] += 1
+        output_hist_value += np.bincount(np.rint(resolution * output_weight_array).astype(int) + hist_max, minlength=2*hist_max+1)
+        input_hist_value += np.bincount(np.rint(resolution * input_weight_array).astype(int) + hist_max, minlength=2*hist_max+1)
         for m in list(hist_index): self.edge_file.write('\n' + str(float(hist_bin[m]/resolution)) + ', ' + str(output_hist_value[m]) + ', ' + str(input_hist_value[m]))
         self.edge_file.write('\nEND')
 
         self.edge_file.write('\n\nSum of Node Weights Distribution')
         self.edge_file.write('\nWeight Sum Bin, Output Numbers, Input Numbers')
-        output_weight_sum_array = np.array([sum([(self.synapse[k].weight * math.sqrt(2.0 * self.energy_factor[k])) for k in self.node_to_synapse_list[i]]) for i in self.node_list_dict['network']])
         resolution = 4
         hist_max = int(round(resolution * max(np.max(np.abs(input_weight_sum_array)), np.max(np.abs(output_weight_sum_array)))))
         hist_index = np.arange(2*hist_max+1)
         hist_bin = hist_index - hist_max
         input_hist_value = np.zeros(2*hist_max+1, dtype = int)
         output_hist_value = np.zeros(2*hist_max+1, dtype = int)
-        for weight in output_weight_sum_array: output_hist_value[int(round(resolution * weight)) + hist_max] += 1
-        for weight in input_weight_sum_array: input_hist_value[int(round(resolution * weight)) + hist_max] += 1
+        output_hist_value += np.bincount(np.rint(resolution * output_weight_sum_array).astype(int) + hist_max, minlength=2*hist_max+1)
+        input_hist_value += np.bincount(np.rint(resolution * input_weight_sum_array).astype(int) + hist_max, minlength=2*hist_max+1)
         for m in list(hist_index): self.edge_file.write('\n' + str(float(hist_bin[m]/resolution)) + ', ' + str(output_hist_value[m]) + ', ' + str(input_hist_value[m]))
         self.edge_file.write('\nEND')
 
         self.edge_file.write('\n\nSum of Absolute Value of Node Weights Distribution')
         self.edge_file.write('\nWeight Abs Bin, Output Numbers, Input Numbers')
-        output_weight_abs_array = np.array([sum([(abs(self.synapse[k].weight) * math.sqrt(2.0 * self.energy_factor[k])) for k in self.node_to_synapse_list[i]]) for i in self.node_list_dict['network']])
         resolution = 4
-        hist_max = int(round(resolution * np.max(np.abs(output_weight_abs_array))))
+        hist_max = int(round(resolution * max(np.max(input_weight_abs_array), np.max(output_weight_abs_array))))
         hist_index = np.arange(hist_max+1)
         hist_bin = hist_index
         input_hist_value = np.zeros(hist_max+1, dtype = int)
         output_hist_value = np.zeros(hist_max+1, dtype = int)
-        for weight in output_weight_abs_array: output_hist_value[int(round(resolution * weight))] += 1
-        for weight in input_weight_abs_array: input_hist_value[int(round(resolution * weight))] += 1
+        output_hist_value += np.bincount(np.rint(resolution * output_weight_abs_array).astype(int), minlength=hist_max+1)
+        input_hist_value += np.bincount(np.rint(resolution * input_weight_abs_array).astype(int), minlength=hist_max+1)
         for m in list(hist_index): self.edge_file.write('\n' + str(float(hist_bin[m]/resolution)) + ', ' + str(output_hist_value[m]) + ', ' + str(input_hist_value[m]))
         self.edge_file.write('\nEND')
 
@@ -616,8 +717,386 @@ class Network(object):
         self.state_file.close()
         self.plot_file.write('\nEND')
         self.plot_file.close()
+        self.epoch_file.write('\nEND')
+        self.epoch_file.close()
         self.edge_file.write('\nEND')
         self.edge_file.close()
+        self.network_long_history.close()
+        self.network_short_history.close()
+        if self.replica is not None: self.replica.close()
+
+
+    def update_active_nodes(self, weight_update):
+        '''
+        Updates the network nodes in the active set (nodes that received new edge context or made an irreversible update
+        since their last update) plus a random background refresh of the quiescent nodes, in network node order.
+        Nodes activated during the step are updated on the next step.
+        '''
+        refresh = self.rng.uniform_array(rn.SCHEDULE, self.network_node_array) < self.parm.refresh_rate
+        due_set = self.active_set | set(self.network_node_array[refresh].tolist())
+        self.active_set.clear()
+
+#       nodes resting this step keep their state without a state change or fluctuation
+        for i in self.updated_set - due_set:
+            self.node[i].state_change = 0.0
+            self.node[i].fluctuation = False
+        for i in sorted(due_set, key=self.network_position.get): self.node[i].update_state(weight_update)
+        self.updated_set = due_set
+
+
+    def set_dormant_synapses(self, dormant_set):
+        '''
+        Makes the synapses in dormant_set dormant (skipped by the network node updates) and wakes all others.
+        '''
+        self.dormant_synapse_set = dormant_set
+        for i in self.node_list_dict['network']: self.node[i].set_dormant(dormant_set)
+
+
+    def __getstate__(self):
+        '''
+        Pickles the network without its open output files, replica link and engines (rebuilt from the network objects).
+        '''
+        state = self.__dict__.copy()
+        for name in self.output_file_list: state[name + '_file'] = None
+        for name in ['replica', 'engine', 'frozen_engine', 'lattice_engine']: state[name] = None
+        return state
+
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.connect_callbacks()
+
+
+    def connect_callbacks(self):
+        '''
+        Reconnects the synapses to the context callbacks of their nodes and the nodes to the state callbacks of their
+        synapses (not pickled with the node and synapse objects).
+        '''
+        for k in self.all_synapse_list:
+            synapse = self.synapse[k]
+            (i, j) = synapse.node_list
+            synapse.send_context = {i: self.node[j].receive_context, j: self.node[i].receive_context}
+            if hasattr(synapse, 'send'): synapse.send = self.node[i].receive_context
+        for i in self.all_node_list:
+            node = self.node[i]
+            update_list = [self.synapse[k].update_self_state if self.synapse[k].node_pair[i] == i else self.synapse[k].update_state for k in node.synapse_list]
+            push_list = [self.synapse[k].push_self_state if self.synapse[k].node_pair[i] == i else self.synapse[k].push_state for k in node.synapse_list]
+            node.update_synapse_state = dict(zip(node.synapse_list, update_list))
+            node.push_synapse_state = dict(zip(node.synapse_list, push_list))
+
+
+    def save_checkpoint(self, position):
+        '''
+        Writes the state of the run at the end of an epoch to data\\checkpoint.npz as arrays (checkpoint_state) with the
+        position of the run (era, next epoch of the era, step, epoch, era stopping criteria and input weight
+        distributions).  The network structure that does not change during a run is pickled once, to
+        data\\checkpoint_network.pkl, at the first checkpoint.  The arrays are written to a temporary file and renamed over
+        the previous checkpoint, so a crash while writing leaves the previous checkpoint intact.
+        '''
+        write_time = -tm.time()
+        checkpoint_filename = self.data_dir + '\\checkpoint.npz'
+        network_filename = os.path.splitext(checkpoint_filename)[0] + '_network.pkl'
+        if not os.path.exists(network_filename):
+            with open(network_filename, 'wb') as network_file: pickle.dump(self, network_file, protocol=pickle.HIGHEST_PROTOCOL)
+
+#       return the edge state held by an engine to the network objects (the active set is kept as the engine left it)
+        active_set = set(self.active_set)
+        if self.engine is not None: self.engine.end()
+        state = self.checkpoint_state(position)
+        if self.engine is not None: self.engine.begin()
+        self.active_set.clear()
+        self.active_set.update(active_set)
+
+        with open(checkpoint_filename + '.tmp', 'wb') as checkpoint_file:
+            np.savez(checkpoint_file, **state)
+            checkpoint_file.flush()
+            os.fsync(checkpoint_file.fileno())
+        os.replace(checkpoint_filename + '.tmp', checkpoint_filename)
+        self.checkpoint_time = tm.time()
+        write_time += self.checkpoint_time
+        print('checkpoint of epoch %i (step %i) written to file "%s" in %.2f s' %(position['epoch'], position['time'], checkpoint_filename, write_time))
+
+
+    def checkpoint_state(self, position):
+        '''
+        Returns the state of the run as a dictionary of arrays - the random stream key and step, the synapse store, delays
+        and synapse outputs, the node states and statistics, the edge context and compartments of the network nodes
+        (concatenated in node and synapse_list order), the bias group, the scheduler and dormant synapse sets, the
+        annealing factors, era stops, network histories, node and synapse histories (if print_records > 0), the position
+        of the run and the lengths of the output files.
+        '''
+        state = {}
+        def add(prefix, snapshot): state.update([(prefix + '_' + key, value) for (key, value) in snapshot.items()])
+        for name in self.output_file_list: getattr(self, name + '_file').flush()
+        state['file_position'] = np.array([getattr(self, name + '_file').tell() for name in self.output_file_list], dtype=np.int64)
+        state['position'] = np.array([position[key] for key in ['era', 'first_epoch', 'time', 'epoch']], dtype=np.int64)
+        add('era_stop', position['era_stop'].snapshot())
+        (state['input_weight'], state['input_weight_sum'], state['input_weight_abs']) = position['input_weight']
+        state['rng_key'] = self.rng.key
+        state['rng_step'] = np.array(self.rng.step)
+
+#       synapses
+        add('store', self.synapse_store.snapshot())
+        if self.delay is not None: add('delay', self.delay.snapshot())
+        state['output_state'] = np.array([[self.synapse[k].output_state[i] for i in self.synapse[k].node_list] for k in self.all_synapse_list], dtype=float).reshape(-1, 2)
+
+#       nodes
+        state['node_state'] = np.array([[getattr(node, key) for key in self.node_state_list] for node in self.network_node_objects], dtype=float)
+        state['node_edge_state'] = np.hstack([node.get_edge_state() for node in self.network_node_objects])
+        add('bias', self.bias_group.snapshot())
+        for name in ['active_set', 'updated_set', 'dormant_synapse_set']: state[name] = np.array(sorted(getattr(self, name)), dtype=np.int64)
+
+#       annealing, era stops and histories
+        state['anneal_factor'] = np.array([self.anneal_factor[key] for key in self.parm.anneal_key_list])
+        state['anneal_list'] = np.array([[epoch, time] + [factor[key] for key in self.parm.anneal_key_list] for (epoch, time, factor) in self.anneal_list]).reshape(-1, 2 + len(self.parm.anneal_key_list))
+        state['stop_list'] = np.array([stop[:3] for stop in self.stop_list], dtype=np.int64).reshape(-1, 3)
+        state['stop_reason'] = np.array([stop[3] for stop in self.stop_list], dtype=str)
+        add('long_history', self.network_long_history.snapshot())
+        add('short_history', self.network_short_history.snapshot())
+        if self.parm.print_records:
+            add('node_history', mt.stack_histories([self.node[i].history for i in self.all_node_list]))
+            add('solution_history', mt.stack_histories([self.node[i].solution_history for i in self.node_list_dict['logic']]))
+            add('synapse_history', mt.stack_histories([self.synapse[k].history for k in self.all_synapse_list]))
+        return state
+
+
+    def restore_state(self, state):
+        '''
+        Writes back the state of a run returned by checkpoint_state and sets the position of the run for run_network.
+        '''
+        def get(prefix): return dict([(key[len(prefix) + 1:], state[key]) for key in state if key.startswith(prefix + '_')])
+        self.file_position = dict(zip(self.output_file_list, state['file_position'].tolist()))
+        self.run_position = dict(zip(['era', 'first_epoch', 'time', 'epoch'], state['position'].tolist()))
+        self.run_position['era_stop'] = mt.EraStop(self.parm.era[self.run_position['era']])
+        self.run_position['era_stop'].restore(get('era_stop'))
+        self.run_position['input_weight'] = (state['input_weight'], state['input_weight_sum'], state['input_weight_abs'])
+        self.rng.key = state['rng_key']
+        self.rng.set_step(int(state['rng_step']))
+
+#       synapses
+        self.synapse_store.restore(get('store'))
+        if self.delay is not None: self.delay.restore(get('delay'))
+        for (k, output_state, energy_factor, prefactor, stdev) in zip(self.all_synapse_list, state['output_state'].tolist(), self.synapse_store.energy_factor.tolist(),
+                                                                    self.synapse_store.prefactor.tolist(), self.synapse_store.stdev.tolist()):
+            synapse = self.synapse[k]
+            synapse.output_state.update(zip(synapse.node_list, output_state))
+            (synapse.energy_factor, synapse.prefactor, synapse.stdev) = (energy_factor, prefactor, stdev)
+
+#       nodes
+        h = 0
+        for (node, node_state) in zip(self.network_node_objects, state['node_state'].tolist()):
+            (node.distribution, node.flow) = (None, None)
+            for (key, value) in zip(self.node_state_list, node_state): setattr(node, key, value)
+            node.fluctuation = bool(node.fluctuation)
+            node.energy_factor_4x = 4.0 * node.energy_factor
+            node.set_edge_state(state['node_edge_state'][:, h:h + node.connections])
+            h += node.connections
+        self.bias_group.restore(get('bias'))
+        self.active_set.clear()
+        self.active_set.update(state['active_set'].tolist())
+        self.updated_set = set(state['updated_set'].tolist())
+        self.set_dormant_synapses(set(state['dormant_synapse_set'].tolist()))
+
+#       annealing, era stops and histories
+        self.anneal_factor = dict(zip(self.parm.anneal_key_list, state['anneal_factor'].tolist()))
+        self.anneal_list = [(int(row[0]), int(row[1]), dict(zip(self.parm.anneal_key_list, row[2:]))) for row in state['anneal_list'].tolist()]
+        self.stop_list = [tuple(stop) + (reason,) for (stop, reason) in zip(state['stop_list'].tolist(), state['stop_reason'].tolist())]
+        self.network_long_history.restore(get('long_history'))
+        self.network_short_history.restore(get('short_history'))
+        if self.parm.print_records:
+            mt.restore_histories([self.node[i].history for i in self.all_node_list], get('node_history'))
+            mt.restore_histories([self.node[i].solution_history for i in self.node_list_dict['logic']], get('solution_history'))
+            mt.restore_histories([self.synapse[k].history for k in self.all_synapse_list], get('synapse_history'))
+
+
+    def set_replica(self, replica, conn):
+        '''
+        Makes the network replica replica of a replica exchange run (replica_ladder in params.py) - the node energy factors
+        are scaled by its step of the ladder, its random streams are re-keyed and it exchanges scales through conn.
+        '''
+        self.replica = rp.ReplicaLink(replica, conn)
+        self.replica_factor = self.parm.replica_ladder[replica]
+        self.rng.set_replica(replica)
+
+
+    def set_branch(self, branch, schedule, folder_name):
+        '''
+        Makes the network branch branch of a fork from a checkpoint (branch_list in params.py) - the eras take the changes
+        of its schedule, its random streams are re-keyed and it writes its results to folder_name, starting from copies of
+        the output files and spilled histories at the checkpoint.
+        '''
+        for era in schedule: self.parm.era[era].update(schedule[era])
+        self.parm.epochs = sum([self.parm.era[era]['epochs'] for era in self.parm.era])
+        self.rng.set_branch(branch)
+        self.parm.folder_name = folder_name
+        self.data_dir = folder_name + '\\data'
+        os.mkdir(folder_name)
+        os.mkdir(self.data_dir)
+        for name in self.output_file_list:
+            filename = self.data_dir + '\\' + getattr(self, name + '_filename').split('\\')[-1]
+            with open(getattr(self, name + '_filename'), 'rb') as source_file: text = source_file.read(self.file_position[name])
+            with open(filename, 'wb') as output_file: output_file.write(text)
+            setattr(self, name + '_filename', filename)
+            setattr(self, name + '_file', open(filename, 'a'))
+        self.network_long_history.move(self.data_dir + '\\long_history.dat')
+        self.network_short_history.move(self.data_dir + '\\short_history.dat')
+        print('branch %i forked at epoch %i (step %i) - results in folder %s' %(branch, self.run_position['epoch'], self.run_position['time'], folder_name))
+
+
+    def warm_start(self, coarse):
+        '''
+        Sets the initial condition of a 'neighbor' network from a trained coarse network (warm_start_factor in params.py).
+        Each plastic synapse takes the weight of the coarse synapses with the same offset between their endpoints, at the
+        coarse node containing its first endpoint ('nearest') or interpolated over the coarse nodes around it
+        ('interpolate').  Each network node takes the state of its coarse node, pushed through its synapses as the edge
+        context of the first update.  Edges without a coarse counterpart (e.g. at coarse bias nodes) keep their weights.
+        '''
+        factor = self.parm.warm_start_factor
+        shape = (self.parm.edge,) * self.parm.dimension
+        coarse_shape = (coarse.parm.edge,) * coarse.parm.dimension
+        position = np.array(np.unravel_index(np.arange(self.parm.all_nodes), shape)).T
+        coarse_position = np.array(np.unravel_index(np.arange(coarse.parm.all_nodes), coarse_shape)).T
+
+#       offsets between the endpoints of the fine and coarse plastic synapses (wrapped on the torus) indexed in one list
+        fine_node = self.synapse_store.node[self.plastic_synapse_array]
+        fine_offset = (position[fine_node[:, 1]] - position[fine_node[:, 0]] + self.parm.edge // 2) % self.parm.edge - self.parm.edge // 2
+        coarse_node = coarse.synapse_store.node[coarse.plastic_synapse_array]
+        coarse_offset = (coarse_position[coarse_node[:, 1]] - coarse_position[coarse_node[:, 0]] + coarse.parm.edge // 2) % coarse.parm.edge - coarse.parm.edge // 2
+        (offset_list, offset_index) = np.unique(np.concatenate([fine_offset, coarse_offset, -coarse_offset]), axis=0, return_inverse=True)
+        offset_index = offset_index.reshape(-1)
+        (fine_index, coarse_index, reverse_index) = np.split(offset_index, [len(fine_offset), len(fine_offset) + len(coarse_offset)])
+
+#       table of the coarse synapses by (coarse node, offset) from both endpoints
+        table = np.full((coarse.parm.all_nodes, len(offset_list)), -1, dtype=np.int64)
+        table[coarse_node[:, 0], coarse_index] = coarse.plastic_synapse_array
+        table[coarse_node[:, 1], reverse_index] = coarse.plastic_synapse_array
+
+#       coarse nodes and weights of the coarse synapses averaged into each fine synapse
+        if self.parm.warm_start_upsample == 'nearest': corner_list = [(position[fine_node[:, 0]] // factor, np.ones(len(fine_node)))]
+        else:
+            u = (position[fine_node[:, 0]] + 0.5) / factor - 0.5
+            lower = np.floor(u).astype(np.int64)
+            fraction = u - lower
+            corner_list = [((lower + bits) % coarse.parm.edge, np.prod(np.where(bits, fraction, 1.0 - fraction), axis=1)) for bits in itertools.product([0, 1], repeat=self.parm.dimension)]
+        value = np.zeros(len(fine_node))
+        total = np.zeros(len(fine_node))
+        for (corner, share) in corner_list:
+            k = table[np.ravel_multi_index(corner.T, coarse_shape), fine_index]
+            share = share * (k >= 0)
+            value += share * coarse.synapse_store.weight[k]
+            total += share
+        found = total > 0.0
+        self.synapse_store.weight[self.plastic_synapse_array[found]] = value[found] / total[found]
+
+#       node states of the coarse nodes (in display polarity) pushed through the synapses of the network nodes
+        coarse_network = np.zeros(coarse.parm.all_nodes, dtype=bool)
+        coarse_network[coarse.node_list_dict['network']] = True
+        states = 0
+        for i in self.node_list_dict['network']:
+            c = int(np.ravel_multi_index(position[i] // factor, coarse_shape))
+            if not coarse_network[c]: continue
+            state = float(coarse.node[c].state * coarse.display_polarity[c] * self.display_polarity[i])
+            self.node[i].state = self.node[i].state_last = state
+            for k in self.node[i].synapse_list:
+                if self.synapse[k].node_pair[i] == i: self.synapse[k].push_self_state(i, state)
+                else: self.synapse[k].push_state(i, state)
+            states += 1
+        print('warm start - %i of %i plastic synapse weights and %i of %i node states set from the coarse network' %(np.sum(found), len(found), states, len(self.node_list_dict['network'])))
+
+
+    def schedule_factor(self, schedule, h, epochs):
+        '''
+        Returns the scale factor of an annealing schedule (params.py) in epoch h of an era of epochs epochs.
+        '''
+        if schedule is None: return 1.0
+        if isinstance(schedule, (int, float)): return float(schedule)
+        (schedule_type, start, end) = schedule
+        fraction = h / (epochs - 1) if epochs > 1 else 0.0
+        if schedule_type == 'linear': return start + (end - start) * fraction
+        return start * (end / start)**fraction
+
+
+    def set_anneal(self, factor, epoch, time):
+        '''
+        Scales the thresholds and energy factors of the network nodes and the energy factors of the synapses from their
+        node_dict / synapse_dict values by the factors of the annealing schedules, refreshes the engine arrays and writes
+        the factors to the epoch file.
+        '''
+        if factor['threshold'] != self.anneal_factor['threshold'] or factor['node_ef'] != self.anneal_factor['node_ef']:
+            threshold = self.anneal_base['threshold'] * factor['threshold']
+            node_ef = self.anneal_base['node_ef'] * factor['node_ef']
+            for (node, node_threshold, energy_factor) in zip(self.network_node_objects, threshold.tolist(), node_ef.tolist()):
+                node.threshold = node_threshold
+                node.energy_factor = energy_factor
+                node.energy_factor_4x = 4.0 * energy_factor
+        if factor['synapse_ef'] != self.anneal_factor['synapse_ef']:
+            self.synapse_store.set_energy_factor(self.all_synapse_list, self.anneal_base['synapse_ef'] * factor['synapse_ef'])
+            for (k, energy_factor, prefactor, stdev) in zip(self.all_synapse_list, self.synapse_store.energy_factor.tolist(), self.synapse_store.prefactor.tolist(), self.synapse_store.stdev.tolist()):
+                self.synapse[k].energy_factor = energy_factor
+                self.synapse[k].prefactor = prefactor
+                self.synapse[k].stdev = stdev
+        for engine in [self.frozen_engine, self.lattice_engine]:
+            if engine is not None: engine.set_parameters()
+        self.anneal_factor = factor
+        self.anneal_list.append((epoch, time, factor))
+        self.epoch_file.write('\n%i, anneal, %i, %s' %(epoch, time, ', '.join(['%s x %g' %(key, factor[key]) for key in self.parm.anneal_key_list])))
+
+
+    def weight_distributions(self):
+        '''
+        Returns the scaled weights of the plastic synapses and the sums of the scaled weights and absolute weights of the
+        synapses of each network node, computed over the synapse store.  Weights are scaled by the synapse energy factors
+        before annealing, so the input and output distributions are comparable whatever the annealing schedules.
+        '''
+        scaled_weight = self.synapse_store.weight * np.sqrt(self.anneal_base['synapse_ef'])
+        nodes = len(self.node_list_dict['network'])
+        weight_sum = np.bincount(self.weight_sum_node, weights=scaled_weight[self.weight_sum_synapse], minlength=nodes)
+        weight_abs = np.bincount(self.weight_sum_node, weights=np.abs(scaled_weight)[self.weight_sum_synapse], minlength=nodes)
+        return (scaled_weight[self.plastic_synapse_array], weight_sum, weight_abs)
+
+
+    def network_sums(self, active):
+        '''
+        Sums the node and synapse statistics in the set active over the network.  Statistics outside the set are not
+        evaluated, so lazily computed node statistics are never resolved on steps where no output consumes them.
+        '''
+        if self.engine is not None: return self.engine.network_sums(active)
+        sums = {}
+
+#       gather the node attributes of the active statistics in one pass into a (node, attribute) array
+        attributes = [name for key in mt.statistic_list if key in active for name in mt.node_statistic_dict.get(key, [])]
+        if attributes:
+            table = np.array(list(map(operator.attrgetter(*attributes), self.network_node_objects)), dtype=float).reshape(-1, len(attributes))
+            column = dict(zip(attributes, table.T))
+            for key in ['energy', 'free_energy', 'entropy', 'dissipation', 'transport']:
+                if key in active: sums[key] = np.sum(column[key])
+            if 'quality' in active:
+                sums['quality_denom'] = np.sum(column['quality_denom'])
+                sums['quality_numer'] = np.sum(column['quality_numer'])
+            if 'state_change' in active: sums['state_change'] = np.sum(np.abs(column['state_change']))
+            if 'fluctuations' in active: sums['fluctuations'] = int(np.sum(column['fluctuation']))
+            if 'color' in active: sums['color'] = np.dot(self.network_polarity, column['state'])
+        if 'solved' in active: sums['solved'] = int(np.sum(self.bias_group.solve))
+        if 'synapse2' in active: sums['synapse2'] = np.dot(self.synapse_store.weight**2, self.plastic_synapse_mask)
+        if 'order' in active: sums['order'] = np.dot(self.synapse_store.order, self.order_param_synapse_mask)
+        return sums
+
+
+    def network_average(self, key, value):
+        '''
+        Normalizes a network sum of a statistic to its reported average (or percentage).
+        '''
+        if key in ['state_change', 'fluctuations']: return 100.0 * value / self.parm.network_nodes
+        if key == 'solved': return 100.0 * value / max(1, self.parm.logic_nodes)
+        if key == 'synapse2': return value / self.plastic_synapses
+        if key == 'order': return value / self.order_param_synapses
+        if key == 'entropy': return value
+        return value / self.parm.network_nodes
+
+
+    def network_quality(self, numer, denom):
+        if denom == 0.0: return 0.0
+        return numer / denom
 
 
     def print_network(self):
@@ -626,17 +1105,19 @@ class Network(object):
 
         if input('\nPrint Node Data (y / N)?') == 'y':
             print('\n*****Node Data******')
-            for t in range(len(self.node[0].history)):
+            history = [self.node[i].history.rows() for i in self.all_node_list]
+            for t in range(max([len(rows) for rows in history])):
                 print('\ntime=%5d\tNode Type\tConnections\tVoltage\t\tEnergy\t\tEntropy' %t)
-                for i in self.all_node_list:
-                    print('node=%5d\t%11s\t%5d\t\t%4.2f\t\t%4.2f\t\t%4.4f' %self.node[i].history[t])
+                for rows in history:
+                    if t < len(rows): print('node=%5d\t%11s\t%5d\t\t%4.2f\t\t%4.2f\t\t%4.4f' %rows[t].item())
 
         if input('\nPrint Synapse Data (y / N)?') == 'y':
             print('\n*****Synapse Data*****')
-            for t in range(len(self.synapse[0].history)):
+            history = [self.synapse[k].history.rows() for k in self.all_synapse_list]
+            for t in range(max([len(rows) for rows in history])):
                 print('\ntime=%5d\t\tType\t\tNode 0\t\tNode 1\t\tWeight\t\tPrefactor\tError' %t)
-                for k in self.all_synapse_list:
-                    print('Synapse%5d\t%9s\t\t%4.2f\t\t%4.2f\t\t%4.2f\t\t%6.3f\t\t%6.3f' %self.synapse[k].history[t])
+                for rows in history:
+                    if t < len(rows): print('Synapse%5d\t%9s\t\t%4.2f\t\t%4.2f\t\t%4.2f\t\t%6.3f\t\t%6.3f' %rows[t].item())
 
         for key in self.parm.node_class_list_dict['compound']:
             if self.node_list_dict[key] != []:
@@ -658,47 +1139,181 @@ class Network(object):
                             print('\nsynapse%5d\t\tType\t\tNode%5d\tNode%5d\tWeight\t\tPrefactor\t\tError\t\tSolved' %(k, self.synapse_key_map[k][1], self.synapse_key_map[k][0]))
                             for t in range(len(self.synapse[k].history)):
                                 (sh1, sh2, sh3, sh4, sh5, sh6, sh7) = self.synapse[k].history[t]
-                                if key == 'logic': sh8 = self.node[j].solution_history[t]
+                                if key == 'logic' and t < len(self.node[j].solution_history): sh8 = self.node[j].solution_history[t]
                                 else: sh8 = 'na'
                                 print('time=%5d\t%9s\t\t%4.2f\t\t%4.2f\t\t%4.2f\t\t%6.3f\t\t\t%6.3f\t\t%5s' %(t, sh2, sh3, sh4, sh5, sh6, sh7, sh8))
 
         if input('\nPrint Short History (y / N)?') == 'y':
             print('\n*****Short History******')
             print('\n\t\tAvg Node Energy\t\tAvg Synapse^2\t\t% Changed\t\t% Fluctuation\t\t% Solved\t\t\tTotal Entropy\t\tAvg Dissipation\t\tAvg Transport\t\tAvg Quality\t\tOrder Param')
-            for t in range(len(self.network_short_history)):
-                (nh1, nh2, nh3, nh4, nh5, nh6, nh7, nh8, nh9, nh10) = self.network_short_history[t]
+            for (t, row) in enumerate(self.network_short_history.array()):
+                (nh1, nh2, nh3, nh4, nh5, nh6, nh7, nh8, nh9, nh10) = row[:10]
                 print('epoch=%5d\t\t%4.3f\t\t\t%6.2f\t\t\t%4.3f\t\t\t%4.3f\t\t\t%4.3f\t\t\t%4.4f\t\t\t%4.3f\t\t\t%4.2f\t\t\t%4.2f\t\t\t%4.2f' %(t, nh1, nh2, nh3, nh4, nh5, nh6, nh7, nh8, nh9, nh10))
 
         if input('\nPrint Long History (y / N)?') == 'y':
             print('\n*****Long History*****')
             print('\n\t\tAvg Node Energy\t\tAvg Synapse^2\t\t% Changed\t\t% Fluctuation\t\t% Solved\t\t\tTotal Entropy\t\tAvg Dissipation\t\tAvg Transport\t\tAvg Quality\t\tOrder Param')
-            for t in range(len(self.network_long_history)):
-                (nh1, nh2, nh3, nh4, nh5, nh6, nh7, nh8, nh9, nh10) = self.network_long_history[t]
+            for (t, row) in enumerate(self.network_long_history.array()):
+                (nh1, nh2, nh3, nh4, nh5, nh6, nh7, nh8, nh9, nh10) = row[:10]
                 print('time=%5d\t\t%4.3f\t\t\t%6.2f\t\t\t%4.3f\t\t\t%4.3f\t\t\t%4.3f\t\t\t%4.4f\t\t\t%4.3f\t\t\t%4.2f\t\t\t%4.2f\t\t\t%4.2f' %(t, nh1, nh2, nh3, nh4, nh5, nh6, nh7, nh8, nh9, nh10))
 
 
+    def report_precision_drift(self, reference):
+        '''
+        Reports the drift of the epoch statistics and final synapse weights of this run against a float64 reference run made
+        from the same seed.
+        '''
+        if len(self.network_short_history) == 0: return
+        label_list = ['Avg Node Energy', 'Avg Synapse^2', '% Changed', '% Fluctuation', '% Solved', 'Total Entropy', 'Avg Dissipation', 'Avg Transport', 'Avg Quality', 'Order Param', 'Avg Color']
+        history = self.network_short_history.array()
+        reference_history = reference.network_short_history.array()
+        drift = np.abs(history - reference_history)
+        scale = np.maximum(np.abs(reference_history), np.finfo(np.float64).tiny)
+        drift_filename = self.data_dir + '\\precision_drift.txt'
+        drift_file = open(drift_filename, 'w')
+        drift_file.write('Thermodynamic Neural Network Precision Drift (%s vs float64 reference %s)\n' %(self.parm.precision, reference.parm.folder_name))
+        drift_file.write('\nStatistic, Max Abs Drift, Max Rel Drift, Final Abs Drift')
+        print('\n*****Precision Drift (%s vs float64)*****' %self.parm.precision)
+        print('Statistic\t\tMax Abs Drift\t\tMax Rel Drift\t\tFinal Abs Drift')
+        for m in range(len(label_list)):
+            line = (label_list[m], np.max(drift[:,m]), np.max(drift[:,m] / scale[:,m]), drift[-1,m])
+            drift_file.write('\n%s, %g, %g, %g' %line)
+            print('%-16s\t%10.3e\t\t%10.3e\t\t%10.3e' %line)
+        weight_drift = np.abs(self.synapse_store.weight.astype(float) - reference.synapse_store.weight)
+        line = (np.max(weight_drift), np.sqrt(np.mean(weight_drift**2)))
+        drift_file.write('\nSynapse Weight, Max Abs Drift %g, RMS Drift %g' %line)
+        print('Synapse Weight\t\tMax Abs Drift %10.3e\tRMS Drift %10.3e' %line)
+        drift_file.write('\nEND')
+        drift_file.close()
+        print('file "' + drift_filename + '" created to store precision drift')
+
+
     def kill_simulation(self):
         self.state_file.close()
         self.plot_file.close()
+        self.epoch_file.close()
         self.edge_file.close()
         if os.path.isdir(self.parm.folder_name): shutil.rmtree(self.parm.folder_name)
         print('simulation terminated - folders and files deleted')
         sys.exit()
 
 
+def load_checkpoint(checkpoint_filename):
+    '''
+    Loads a network from a checkpoint written by save_checkpoint (its output files are not open) - the network pickled
+    at the first checkpoint of the run with the state of the arrays of checkpoint_filename.  Checkpoints of replica
+    exchange runs cannot be loaded, since the exchange between the replica processes is not part of a checkpoint.
+    '''
+    with open(os.path.splitext(checkpoint_filename)[0] + '_network.pkl', 'rb') as network_file: net = pickle.load(network_file)
+    if net.parm.replica_ladder is not None:
+        print('\n**********   checkpoint error - execution terminated    ****************\n')
+        print('file "%s" is a checkpoint of a replica exchange run, which cannot be resumed or forked' %checkpoint_filename)
+        sys.exit()
+    with np.load(checkpoint_filename) as checkpoint_file: net.restore_state(dict(checkpoint_file))
+    return net
+
+
+def resume_network(checkpoint_filename):
+    '''
+    Loads a network from a checkpoint written by save_checkpoint and reopens its output files truncated to their length at
+    the checkpoint.  run_network continues the run from the epoch after the checkpoint.
+    '''
+    net = load_checkpoint(checkpoint_filename)
+    for name in net.output_file_list:
+        output_file = open(getattr(net, name + '_filename'), 'a')
+        output_file.truncate(net.file_position[name])
+        setattr(net, name + '_file', output_file)
+    print('network resumed from file "%s" at epoch %i (step %i)' %(checkpoint_filename, net.run_position['epoch'], net.run_position['time']))
+    return net
+
+
+def run_warm_start(net, run_suffix, replica=0):
+    '''
+    Trains the coarse lattice of a warm start (warm_start_factor in params.py) and upsamples it onto the network.  The
+    coarse lattice of replica replica of a replica exchange run draws from the random streams of the replica.
+    '''
+    coarse = Network(run_suffix=run_suffix, seed=net.rng.seed, coarse=net.parm.warm_start_factor)
+    coarse.rng.set_replica(replica)
+    coarse.run_network()
+    net.warm_start(coarse)
+
+
+def run_replica(replica, seed, conn):
+    '''
+    Builds replica replica of the network (seed fixes the topology shared by the replicas), warm starts it from its own
+    coarse lattice if warm_start_factor is set and runs it in a worker process of a replica exchange run.
+    '''
+    net = Network(run_suffix='-replica%i' %replica, seed=seed)
+    if net.parm.warm_start_factor is not None: run_warm_start(net, '-replica%i-coarse' %replica, replica)
+    net.set_replica(replica, conn)
+    net.run_network()
+
+
+def run_branch(net, branch, schedule, folder_name):
+    '''
+    Runs branch branch of a fork from a checkpoint in a worker process.
+    '''
+    net.set_branch(branch, schedule, folder_name)
+    net.run_network()
+    if net.parm.save_plots: rd.makeplots(net.parm.folder_name, net.plot_filename, net.edge_filename)
+
+
+def fork_network(checkpoint_filename):
+    '''
+    Forks the branches of branch_list in params.py from a checkpoint and runs them in worker processes.  The network is
+    loaded once and the workers are forked from it where the platform allows, so its arrays (the topology, engine
+    tables and the state at the checkpoint) are shared copy-on-write until a branch writes to them; elsewhere each
+    worker receives its own copy.  Only the eras after the era of the checkpoint can be changed.
+    '''
+    parm = pd.Parameters('-branch')
+    net = load_checkpoint(checkpoint_filename)
+    if parm.branch_list is None or any([era <= net.run_position['era'] for schedule in parm.branch_list for era in schedule]):
+        print('\n**********   branch error - execution terminated    ****************\n')
+        print('branch_list must change only eras after era %i of the checkpoint' %net.run_position['era'])
+        shutil.rmtree(parm.folder_name)
+        sys.exit()
+    shutil.copyfile('params_v21.py', parm.folder_name + '\\params_v21.py')
+    context = mp.get_context('fork' if 'fork' in mp.get_all_start_methods() else 'spawn')
+    process_list = []
+    for (branch, schedule) in enumerate(parm.branch_list):
+        process = context.Process(target=run_branch, args=(net, branch, schedule, parm.folder_name + '\\branch%i' %branch))
+        process.start()
+        process_list.append(process)
+    for process in process_list: process.join()
+    print('%i branches forked from file "%s" completed in folder %s' %(len(process_list), checkpoint_filename, parm.folder_name))
+
+
 if __name__ == '__main__':      ###########################################    MAIN PROGRAM     ###################################################
 
+    if '--branch' in sys.argv:                                                                                      # forks the branches of branch_list from a checkpoint file
+        fork_network(sys.argv[sys.argv.index('--branch') + 1])
+        sys.exit()
     print('\n****************************************  Initializing Simulation  **************************************************\n')
-    net = Network()                                                                                     # initiate the simulation
+    if '--resume' in sys.argv: net = resume_network(sys.argv[sys.argv.index('--resume') + 1])                       # continues the run of a checkpoint file
+    else: net = Network()                                                                                           # initiate the simulation
     print('\n******************************************  Beginning Simulation  ***************************************************\n')
     sim_time = -tm.time()
-    net.run_network()                                                                                               # runs the simulation
+    if net.parm.warm_start_factor is not None and net.run_position is None:                                         # trains the coarse lattice and upsamples it onto the network
+        print('\n*****************************************  Coarse Warm Start Simulation  *******************************************\n')
+        run_warm_start(net, '-coarse')
+    if net.parm.replica_ladder is not None and net.run_position is None:                                            # runs replicas 1 .. R-1 in worker processes and replica 0 here
+        exchange = rp.ReplicaExchange(net.parm.replica_ladder, net.rng.seed)
+        net.set_replica(0, exchange.start(run_replica))
+        net.run_network()
+        exchange.join()
+        exchange.report(net.data_dir + '\\replica_exchange.txt')
+    else: net.run_network()                                                                                         # runs the simulation
     sim_time += tm.time()
     hours = int(sim_time/3600)
     minutes = int((sim_time - hours *3600)/60)
     seconds = int((sim_time - hours * 3600 - minutes * 60))
     print('\n********************************************  Ending Simulation  ****************************************************\n')
     print('network simulation time = ' + str(hours) + 'h ' + str(minutes) + 'm ' + str(seconds) + 's' + '\n')
+    if net.parm.precision_check and net.parm.precision != 'float64':                                               # repeats the run in float64 and reports the drift
+        print('\n*****************************************  Float64 Reference Simulation  *******************************************\n')
+        reference = Network('float64', '-float64', net.rng.seed)
+        reference.run_network()
+        net.report_precision_drift(reference)
     if net.parm.print_records: net.print_network()                                                                  # prompts user to print output to the terminal                                                         
     out_time = -tm.time()
     if any([net.parm.show_video, net.parm.save_state_video, net.parm.save_change_video, net.parm.save_images]):     # calls rendering routine for video and images
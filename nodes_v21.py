@@ -1,18 +1,20 @@
 import numpy as np
 import copy as cp
 import math
+import rng_v21 as rn
+import metrics_v21 as mt
 
 
 class MakeNode(object):
     '''
     Class for creating node instances by type
     '''
-    def Factory(node_id, node_class, node_states, node_polarity, node_period, records, energy_factor, threshold):
+    def Factory(node_id, node_class, node_states, node_polarity, node_period, records, energy_factor, threshold, rng):
         '''
         Factory for initiating nodes
         '''
-        if node_class == 'discrete':         return Node(node_id, node_class, node_states, node_polarity, node_period, records, energy_factor, threshold)
-        if node_class == 'bias':             return Bias(node_id, node_class, node_states, node_polarity, node_period, records, energy_factor, threshold)
+        if node_class == 'discrete':         return Node(node_id, node_class, node_states, node_polarity, node_period, records, energy_factor, threshold, rng)
+        if node_class == 'bias':             return Bias(node_id, node_class, node_states, node_polarity, node_period, records, energy_factor, threshold, rng)
 
         assert False, 'Bad node creation: ' + node_class
 
@@ -24,11 +26,12 @@ class Node(object):
     Generic Node Class with methods used by all nodes
     '''
 
-    def __init__(self, node_id, node_class, node_states, node_polarity, node_period, records, energy_factor, threshold):
+    def __init__(self, node_id, node_class, node_states, node_polarity, node_period, records, energy_factor, threshold, rng):
         '''
         :param node_id: Unique number identifying the node
         :param node_type: A string specifying the type of node
         :param records: Number of time steps to retain in network, node and synapse histories
+        :param rng: RandomStreams object supplying the node random draws
         :return: no return value
         '''
 #       Initialize node state variables
@@ -40,6 +43,8 @@ class Node(object):
         self.records = records
         self.energy_factor = energy_factor
         self.threshold = threshold
+        self.rng = rng
+        self.schedule = None
         self.energy_factor = energy_factor
         self.energy_factor_4x = 4.0 * energy_factor
         self.fluctuation = True 
@@ -47,6 +52,10 @@ class Node(object):
         self.solve = False
         self.state_last = 0.0
         self.energy_last = 0.0
+        self.distribution = None
+        self.flow = None
+        self.free_energy = 0.0
+        self.entropy = 0.0
         self.dissipation = 1.0
         self.transport = 1.0
         self.quality_denom = 1.0
@@ -60,10 +69,11 @@ class Node(object):
                 self.node_type = 'x-nary'
 
 #       Initialize node history data structures
-        self.history = []
+        self.history = mt.History(mt.node_history_fields, records)
 
 #       Initialize edge data structures
         self.synapse_list = []
+        self.edge_list = self.synapse_list      # edges visited by update_state (synapse_list less the dormant synapses)
         self.voltage = {}
         self.charge = {}
         self.weight = {}
@@ -84,6 +94,17 @@ class Node(object):
         self.nwnc = {}
 
 
+    def __getstate__(self):
+        '''
+        Pickles the node without the synapse callbacks, so a checkpoint does not recurse through the network graph.  The
+        network reconnects them (Network.connect_callbacks).
+        '''
+        state = self.__dict__.copy()
+        for key in ['update_synapse_state', 'push_synapse_state', 'update_callback', 'push_callback']:
+            if key in state: state[key] = None
+        return state
+
+
     def add_synapse(self, synapse_id, weight_target, update_state_callback, push_state_callback):
         '''
         Adds synapses and initializes data structure for that synapse.
@@ -105,12 +126,72 @@ class Node(object):
     def receive_context(self, synapse_id, voltage, weight):
         '''
         Receives input from edges, stores input states, and updates compartment lists.
+        Nodes attached to a schedule (the active set of the 'active' scheduler) join it when their context changes.
         '''        
+        if self.schedule is not None and (voltage != self.voltage[synapse_id] or weight != self.weight[synapse_id]): self.schedule.add(self.node_id)
         self.weight[synapse_id] = weight
         self.voltage[synapse_id] = voltage
         self.charge[synapse_id] = voltage * weight
 
 
+    def edge_context(self, synapse_id):
+        '''
+        Returns the (voltage, weight) context received from an edge.
+        '''
+        return (self.voltage[synapse_id], self.weight[synapse_id])
+
+
+    def get_context(self):
+        '''
+        Returns the edge voltages and weights in synapse_list order.  Used by the vectorized engines.
+        '''
+        return ([self.voltage[i] for i in self.synapse_list], [self.weight[i] for i in self.synapse_list])
+
+
+    def get_compartments(self):
+        '''
+        Returns the edge compartment charges, weights and voltages in synapse_list order (rows pcpw, pcnw, ncpw, ncnw,
+        pwpc, nwpc, pwnc, nwnc, pvpw, pvnw, nvpw, nvnw).  Used by the vectorized engines.
+        '''
+        return [[compartment[i] for i in self.synapse_list] for compartment in self.compartment_list()]
+
+
+    def set_compartments(self, compartments):
+        '''
+        Stores edge compartments in the row layout of get_compartments.
+        '''
+        for (compartment, row) in zip(self.compartment_list(), compartments):
+            for (i, value) in zip(self.synapse_list, row): compartment[i] = float(value)
+
+
+    def get_edge_state(self):
+        '''
+        Returns the edge voltages, charges, weights and compartments in synapse_list order as a (15, connections) array
+        (rows voltage, charge, weight and the rows of get_compartments).  Used by checkpoints.
+        '''
+        return np.array([[edge[i] for i in self.synapse_list] for edge in [self.voltage, self.charge, self.weight] + self.compartment_list()], dtype=float).reshape(15, -1)
+
+
+    def set_edge_state(self, edge_state):
+        '''
+        Stores edge state in the row layout of get_edge_state.
+        '''
+        for (edge, row) in zip([self.voltage, self.charge, self.weight] + self.compartment_list(), edge_state.tolist()): edge.update(zip(self.synapse_list, row))
+
+
+    def set_dormant(self, dormant_set):
+        '''
+        Removes the synapses in dormant_set from the edges visited by update_state.  Dormant edges keep their stored
+        context and compartments and contribute nothing to the compartment sums until they are woken (empty set).
+        '''
+        if dormant_set: self.edge_list = [i for i in self.synapse_list if i not in dormant_set]
+        else: self.edge_list = self.synapse_list
+
+
+    def compartment_list(self):
+        return [self.pcpw, self.pcnw, self.ncpw, self.ncnw, self.pwpc, self.nwpc, self.pwnc, self.nwnc, self.pvpw, self.pvnw, self.nvpw, self.nvnw]
+
+
     def sample_state(self):
         '''
         Creates a sample of the node state given the current context (node, edge and compartment states plus recent inputs).
@@ -142,7 +223,7 @@ class Node(object):
         probability /= Zp
 
 #       sample a state from the distribution
-        seed = np.random.random()
+        seed = self.rng.uniform(rn.NODE, self.node_id)
         j = 0
         while seed > probability[j]:
             seed -= probability[j]
@@ -156,14 +237,12 @@ class Node(object):
         self.fluctuation = (abs(energy[j] - self.energy_last) > self.threshold)
         self.energy_last = energy[j]
 
-#       compute node statistics
-        self.free_energy = emin - np.log(Zp)
-        surprise_array = (energy - self.free_energy)
-        self.entropy = np.sum(probability * surprise_array) / np.log(total_states)
+#       defer node statistics until they are read
+        self.distribution = (energy, probability, emin, Zp, total_states)
 
 #       update node history        
-        self.history.append((self.node_id, self.node_type, self.connections, self.state, self.energy, self.entropy))
-        if len(self.history) > self.records: self.history.pop(0)
+        if self.records:
+            self.history.append((self.node_id, self.node_type, self.connections, self.state, self.energy, self.entropy))
 
 
     def update_state(self, weight_update):
@@ -182,10 +261,10 @@ class Node(object):
         nwnc = cp.copy(self.nwnc)
         
 #       reversibly update edge charges
-        pcpw_input_list = [i for i in self.synapse_list if self.charge[i] > 0.0 and self.weight[i] > 0.0]
-        pcnw_input_list = [i for i in self.synapse_list if self.charge[i] > 0.0 and self.weight[i] < 0.0]
-        ncpw_input_list = [i for i in self.synapse_list if self.charge[i] < 0.0 and self.weight[i] > 0.0]
-        ncnw_input_list = [i for i in self.synapse_list if self.charge[i] < 0.0 and self.weight[i] < 0.0]
+        pcpw_input_list = [i for i in self.edge_list if self.charge[i] > 0.0 and self.weight[i] > 0.0]
+        pcnw_input_list = [i for i in self.edge_list if self.charge[i] > 0.0 and self.weight[i] < 0.0]
+        ncpw_input_list = [i for i in self.edge_list if self.charge[i] < 0.0 and self.weight[i] > 0.0]
+        ncnw_input_list = [i for i in self.edge_list if self.charge[i] < 0.0 and self.weight[i] < 0.0]
         
         for i in pcpw_input_list: pcpw[i] = min(pcpw[i] + self.charge[i], self.weight[i])
         for i in pcnw_input_list: pcnw[i] = min(pcnw[i] + self.charge[i], -self.weight[i])
@@ -198,11 +277,11 @@ class Node(object):
         for i in ncnw_input_list: nwnc[i] = self.weight[i]
             
 #       compute compartment charges and weights
-        pcpw_list = [i for i in self.synapse_list if pcpw[i] > 0.0]
-        pcnw_list = [i for i in self.synapse_list if pcnw[i] > 0.0]
-        ncpw_list = [i for i in self.synapse_list if ncpw[i] < 0.0]
-        ncnw_list = [i for i in self.synapse_list if ncnw[i] < 0.0]
-        zc_list = [i for i in self.synapse_list if i not in (pcpw_list + pcnw_list + ncpw_list + ncnw_list)]
+        pcpw_list = [i for i in self.edge_list if pcpw[i] > 0.0]
+        pcnw_list = [i for i in self.edge_list if pcnw[i] > 0.0]
+        ncpw_list = [i for i in self.edge_list if ncpw[i] < 0.0]
+        ncnw_list = [i for i in self.edge_list if ncnw[i] < 0.0]
+        zc_list = [i for i in self.edge_list if i not in (pcpw_list + pcnw_list + ncpw_list + ncnw_list)]
         
         self.pcpw_sum = sum([pcpw[i] for i in pcpw_list])
         self.pcnw_sum = sum([pcnw[i] for i in pcnw_list])
@@ -219,10 +298,11 @@ class Node(object):
 
 #       Fluctuate => Make a reversible update to the edges state variables when there is a thermally significant fluctuation in node energy
         if self.fluctuation or not weight_update or self.state == 0.0:      
-            for i in self.synapse_list: self.push_synapse_state[i](self.node_id, self.state)
+            for i in self.edge_list: self.push_synapse_state[i](self.node_id, self.state)
 
 #       Equilibrate => Make irreversible updates to the edge state variables when there is a thermally insignificant fluctuation in node energy 
         else:
+            if self.schedule is not None: self.schedule.add(self.node_id)
        
 #           Irreversibly update edge charges, weights and voltages 
             self.pcpw = cp.copy(pcpw)
@@ -267,10 +347,7 @@ class Node(object):
                 else:
                     for i in pcpw_list + ncnw_list: self.push_synapse_state[i](self.node_id, self.state)
                 for i in pcnw_list + ncpw_list + zc_list: self.push_synapse_state[i](self.node_id, self.state)
-                self.dissipation =  self.energy_factor * ((self.pcpw_sum - self.nwnc_sum * self.state)**2 + (self.ncnw_sum - self.pwpc_sum * self.state)**2)
-                self.transport =  self.energy_factor * ((self.pcpw_sum + self.nwnc_sum * self.state)**2 + (self.ncnw_sum + self.pwpc_sum * self.state)**2) / 4
-                self.quality_denom = abs(self.pcpw_sum - self.nwnc_sum * self.state) + abs(self.ncnw_sum - self.pwpc_sum * self.state)
-                self.quality_numer = abs(self.pcpw_sum + self.nwnc_sum * self.state) + abs(self.ncnw_sum + self.pwpc_sum * self.state)
+                self.flow = (self.state, self.pcpw_sum, self.nwnc_sum, self.ncnw_sum, self.pwpc_sum)
                     
             if self.state > 0.0:
                 state_2 = self.state**2
@@ -292,25 +369,147 @@ class Node(object):
                 else:
                     for i in pcnw_list + ncpw_list: self.push_synapse_state[i](self.node_id, self.state)
                 for i in pcpw_list + ncnw_list + zc_list: self.push_synapse_state[i](self.node_id, self.state)
-                self.dissipation = self.energy_factor * ((self.pcnw_sum - self.pwnc_sum * self.state)**2 + (self.ncpw_sum - self.nwpc_sum * self.state)**2)
-                self.transport = self.energy_factor * ((self.pcnw_sum + self.pwnc_sum * self.state)**2 + (self.ncpw_sum + self.nwpc_sum * self.state)**2) / 4
-                self.quality_denom = abs(self.pcnw_sum - self.pwnc_sum * self.state) + abs(self.ncpw_sum - self.nwpc_sum * self.state)
-                self.quality_numer = abs(self.pcnw_sum + self.pwnc_sum * self.state) + abs(self.ncpw_sum + self.nwpc_sum * self.state)
-                
+                self.flow = (self.state, self.pcnw_sum, self.pwnc_sum, self.ncpw_sum, self.nwpc_sum)
+
+
+#   Node statistics are evaluated lazily - sample_state and update_state store their inputs and the statistics are
+#   computed the first time they are read, so steps on which no output consumes them do not pay for them.
+
+    def evaluate_distribution(self):
+        '''
+        Computes the free energy and entropy of the distribution of the last state sample.
+        '''
+        (energy, probability, emin, Zp, total_states) = self.distribution
+        self.distribution = None
+        self._free_energy = emin - np.log(Zp)
+        surprise_array = (energy - self._free_energy)
+        self._entropy = np.sum(probability * surprise_array) / np.log(total_states)
+
+    def evaluate_flow(self):
+        '''
+        Computes the dissipation, transport and quality terms of the last irreversible update.
+        '''
+        (state, a_sum, a_w_sum, b_sum, b_w_sum) = self.flow
+        self.flow = None
+        self._dissipation = self.energy_factor * ((a_sum - a_w_sum * state)**2 + (b_sum - b_w_sum * state)**2)
+        self._transport = self.energy_factor * ((a_sum + a_w_sum * state)**2 + (b_sum + b_w_sum * state)**2) / 4
+        self._quality_denom = abs(a_sum - a_w_sum * state) + abs(b_sum - b_w_sum * state)
+        self._quality_numer = abs(a_sum + a_w_sum * state) + abs(b_sum + b_w_sum * state)
+
+    def get_free_energy(self):
+        if self.distribution is not None: self.evaluate_distribution()
+        return self._free_energy
+
+    def set_free_energy(self, value):
+        if self.distribution is not None: self.evaluate_distribution()
+        self._free_energy = value
+
+    def get_entropy(self):
+        if self.distribution is not None: self.evaluate_distribution()
+        return self._entropy
+
+    def set_entropy(self, value):
+        if self.distribution is not None: self.evaluate_distribution()
+        self._entropy = value
+
+    def get_dissipation(self):
+        if self.flow is not None: self.evaluate_flow()
+        return self._dissipation
+
+    def set_dissipation(self, value):
+        if self.flow is not None: self.evaluate_flow()
+        self._dissipation = value
+
+    def get_transport(self):
+        if self.flow is not None: self.evaluate_flow()
+        return self._transport
+
+    def set_transport(self, value):
+        if self.flow is not None: self.evaluate_flow()
+        self._transport = value
+
+    def get_quality_denom(self):
+        if self.flow is not None: self.evaluate_flow()
+        return self._quality_denom
+
+    def set_quality_denom(self, value):
+        if self.flow is not None: self.evaluate_flow()
+        self._quality_denom = value
+
+    def get_quality_numer(self):
+        if self.flow is not None: self.evaluate_flow()
+        return self._quality_numer
+
+    def set_quality_numer(self, value):
+        if self.flow is not None: self.evaluate_flow()
+        self._quality_numer = value
+
+    free_energy = property(get_free_energy, set_free_energy)
+    entropy = property(get_entropy, set_entropy)
+    dissipation = property(get_dissipation, set_dissipation)
+    transport = property(get_transport, set_transport)
+    quality_denom = property(get_quality_denom, set_quality_denom)
+    quality_numer = property(get_quality_numer, set_quality_numer)
+
 
 class Bias(Node):   #       *************************     BIAS Node Class     **************************************
     '''
     BIAS node class to create potentials and charge to inject into the network.
+    Once the network is built the bias nodes are attached to a BiasGroup, which holds their state and edge context in
+    arrays and updates them together; state, fluctuation, energy and solve then read the group arrays.
     '''    
-    def __init__(self, node_id, node_class, node_states, node_polarity, node_period, records, energy_factor, threshold):
-        Node.__init__(self, node_id, node_class, node_states, node_polarity, node_period, records, energy_factor, threshold)
+    def __init__(self, node_id, node_class, node_states, node_polarity, node_period, records, energy_factor, threshold, rng):
+        self.group = None
+        Node.__init__(self, node_id, node_class, node_states, node_polarity, node_period, records, energy_factor, threshold, rng)
         self.node_type = 'bias'
         self.state = self.polarity
         self.state_change = 0.0
         self.fluctuation = False
-        self.solution_history = []
+        self.energy = 0.0
+        self.state_array = np.array([-1.0, 1.0])        # states sampled in 'reflect' mode
+        self.solution_history = mt.History(bool, records)
+
+    def get_state(self):
+        if self.group is None: return self._state
+        return float(self.group.state[self.row])
+
+    def set_state(self, value):
+        if self.group is None: self._state = value
+        else: self.group.state[self.row] = value
+
+    def get_fluctuation(self):
+        if self.group is None: return self._fluctuation
+        return bool(self.group.fluctuation[self.row])
+
+    def set_fluctuation(self, value):
+        if self.group is None: self._fluctuation = value
+        else: self.group.fluctuation[self.row] = value
+
+    def get_energy(self):
+        if self.group is None: return self._energy
+        return float(self.group.energy[self.row])
+
+    def set_energy(self, value):
+        if self.group is None: self._energy = value
+        else: self.group.energy[self.row] = value
+
+    def get_solve(self):
+        if self.group is None: return self._solve
+        return bool(self.group.solve[self.row])
+
+    def set_solve(self, value):
+        if self.group is None: self._solve = value
+        else: self.group.solve[self.row] = value
+
+    state = property(get_state, set_state)
+    fluctuation = property(get_fluctuation, set_fluctuation)
+    energy = property(get_energy, set_energy)
+    solve = property(get_solve, set_solve)
 
     def receive_context(self, synapse_id, voltage, weight):
+        if self.group is not None:
+            self.group.receive_context(self.row, self.column[synapse_id], voltage, weight)
+            return
         self.weight[synapse_id] = weight
         self.voltage[synapse_id] = voltage
         self.charge[synapse_id] = voltage * weight
@@ -323,21 +522,21 @@ class Bias(Node):   #       *************************     BIAS Node Class     **
         if 2 * ((time-1) % period) < period: self.state = self.polarity
         else: self.state = -self.polarity
         if mode == 'off': self.state = 0.0
-        if mode == 'noise': self.state = np.random.choice([-1.0,1.0])
+        if mode == 'noise': self.state = -1.0 if self.rng.uniform(rn.BIAS, self.node_id) < 0.5 else 1.0
         if mode == 'reflect':
-            energy = sum([(self.charge[i] + self.state_array * self.weight[i])**2 for i in self.synapse_list])
+            energy = np.array([sum([(self.charge[i] + state * self.weight[i])**2 for i in self.synapse_list]) for state in self.state_array])
             emin = np.min(energy)
             probability = np.exp((emin - energy))
             Zp = np.sum(probability)        
             probability /= Zp
-            seed = np.random.random()
+            seed = self.rng.uniform(rn.BIAS, self.node_id)
             j = 0
-            while seed > probability[j]:
+            while j < len(probability) - 1 and seed > probability[j]:
                 seed -= probability[j]
                 j += 1
             self.state = self.state_array[j]
         if mode == 'predict':
-            if any([self.state * self.voltage[i] > 0.0] for i in self.synapse_list): self.state = 0.0         
+            if any([self.state * self.voltage[i] > 0.0 for i in self.synapse_list]): self.state = 0.0         
 
 #       update edges
         if (self.state != self.state_last) or self.fluctuation:
@@ -360,22 +559,149 @@ class Bias(Node):   #       *************************     BIAS Node Class     **
         self.entropy = 0.0
 
 #       update history
-        self.history.append((self.node_id, self.node_type, self.connections, self.state, self.energy, self.entropy))
-        if len(self.history) > self.records: self.history.pop(0)
-        self.solution_history.append(self.solve)
-        if len(self.solution_history) > self.records: self.solution_history.pop(0)
-        
-  
+        if self.records:
+            self.history.append((self.node_id, self.node_type, self.connections, self.state, self.energy, self.entropy))
+            self.solution_history.append(self.solve)
+
+
+class BiasGroup(object):   #       *************************     BIAS Group Class     **************************************
+    '''
+    The bias nodes of the network updated together.  Edge context is held in (bias, connection) arrays padded to the
+    largest number of connections, the periodic drive is computed per step from the periods of the era, and the modes,
+    energies and solve flags are evaluated with array operations.  Only bias nodes whose state changed or that received
+    new context call their synapses.
+    '''
+    def __init__(self, node_list, rng, records):
+        '''
+        :param node_list: list of Bias node objects (the synapses must already be attached)
+        :param rng: RandomStreams object supplying the bias random draws
+        :param records: Number of time steps to retain in node histories
+        '''
+        self.node_list = node_list
+        self.rng = rng
+        self.records = records
+        self.node_id = np.array([node.node_id for node in node_list], dtype=np.int64)
+        self.bias = len(node_list)
+        self.connections = np.array([node.connections for node in node_list], dtype=float)
+        width = max([1] + [node.connections for node in node_list])
+        self.valid = np.zeros((self.bias, width), dtype=bool)
+        self.voltage = np.zeros((self.bias, width))
+        self.weight = np.zeros((self.bias, width))
+        self.charge = np.zeros((self.bias, width))
+        self.target = np.zeros((self.bias, width))
+        self.update_callback = []
+        self.push_callback = []
+        for (row, node) in enumerate(node_list):
+            n = node.connections
+            self.valid[row, :n] = True
+            self.voltage[row, :n] = [node.voltage[i] for i in node.synapse_list]
+            self.weight[row, :n] = [node.weight[i] for i in node.synapse_list]
+            self.charge[row, :n] = [node.charge[i] for i in node.synapse_list]
+            self.target[row, :n] = [node.target[i] for i in node.synapse_list]
+            self.update_callback.append([node.update_synapse_state[i] for i in node.synapse_list])
+            self.push_callback.append([node.push_synapse_state[i] for i in node.synapse_list])
+        self.polarity = np.array([node.polarity for node in node_list], dtype=float)
+        self.period_list = [node.period for node in node_list]
+        self.state = np.array([node.state for node in node_list], dtype=float)
+        self.fluctuation = np.array([node.fluctuation for node in node_list], dtype=bool)
+        self.energy = np.array([node.energy for node in node_list], dtype=float)
+        self.solve = np.array([node.solve for node in node_list], dtype=bool)
+        self.state_array = np.array([-1.0, 1.0])
+        self.period_era = None
+        self.era_period = None
+
+#       attach the nodes - their statistics do not change after this point
+        for (row, node) in enumerate(node_list):
+            node.group = self
+            node.row = row
+            node.column = dict([(i, c) for (c, i) in enumerate(node.synapse_list)])
+            node.dissipation = node.transport = node.quality_denom = node.quality_numer = node.entropy = 0.0
+
+
+    def receive_context(self, row, column, voltage, weight):
+        self.weight[row, column] = weight
+        self.voltage[row, column] = voltage
+        self.charge[row, column] = voltage * weight
+        self.fluctuation[row] = True
+
+
+    def period(self, era):
+        return np.array([period[min(len(period)-1, era)] for period in self.period_list])
+
+
+    def drive(self, time, era):
+        '''
+        Returns the periodic drive of the bias nodes at a time step, with the periods of the era set by set_era.
+        '''
+        period = self.era_period if era == self.period_era else self.period(era)
+        return np.where(2 * ((time-1) % period) < period, self.polarity, -self.polarity)
 
 
+    def snapshot(self):
+        '''
+        Returns copies of the arrays of bias node state and edge context (for a checkpoint).
+        '''
+        return dict([(key, getattr(self, key).copy()) for key in ['state', 'fluctuation', 'energy', 'solve', 'voltage', 'weight', 'charge']])
 
 
+    def restore(self, snapshot):
+        '''
+        Writes back bias node state returned by snapshot.
+        '''
+        for key in snapshot: getattr(self, key)[:] = snapshot[key]
 
 
+    def set_era(self, era):
+        '''
+        Gathers the periods of the bias nodes in an era.  The drive is computed per step from the periods, since a table
+        of it would grow with the era (and the least common multiple of the periods is usually larger still).
+        '''
+        self.era_period = self.period(era)
+        self.period_era = era
 
 
+    def update_state(self, time, era, weight_update, mode):
+        '''
+        Updates the states of all bias nodes (as Bias.update_state) and delivers them to the synapses of the nodes that
+        changed state or received new context.
+        '''
+#       compute node states
+        state_last = self.state
+        if mode == 'off': state = np.zeros(self.bias)
+        elif mode == 'noise': state = np.where(self.rng.uniform_array(rn.BIAS, self.node_id) < 0.5, -1.0, 1.0)
+        else: state = np.array(self.drive(time, era), dtype=float)
+        if mode == 'reflect':
+            energy = np.sum(np.where(self.valid[:, :, np.newaxis], (self.charge[:, :, np.newaxis] + self.state_array * self.weight[:, :, np.newaxis])**2, 0.0), axis=1)
+            probability = np.exp(np.min(energy, axis=1, keepdims=True) - energy)
+            probability /= np.sum(probability, axis=1, keepdims=True)
+            seed = self.rng.uniform_array(rn.BIAS, self.node_id)
+            j = np.minimum(np.sum(np.cumsum(probability, axis=1) < seed.reshape(-1, 1), axis=1), len(self.state_array) - 1)
+            state = self.state_array[j]
+        if mode == 'predict': state = np.where(np.any(self.valid & (state.reshape(-1, 1) * self.voltage > 0.0), axis=1), 0.0, state)
+        self.state = state
 
+#       update edges
+        changed = np.nonzero((state != state_last) | self.fluctuation)[0].tolist()
+        if weight_update:
+            w2_avg = np.sum(self.weight**2, axis=1) / np.maximum(self.connections, 1.0)
+            weight_error = self.target - self.weight
+            for row in changed:
+                for (c, callback) in enumerate(self.update_callback[row]): callback(int(self.node_id[row]), float(state[row]), float(weight_error[row, c]), float(w2_avg[row]))
+        else:
+            for row in changed:
+                for callback in self.push_callback[row]: callback(int(self.node_id[row]), float(state[row]))
+        self.fluctuation[changed] = False
 
-        
 
+    def evaluate_state(self):
+        '''
+        Evaluates the energies and solve flags of all bias nodes (as Bias.evaluate_state).
+        '''
+        self.energy = np.sum(np.where(self.valid, (self.charge + self.state.reshape(-1, 1) * self.weight)**2, 0.0), axis=1)
+        self.solve = np.all(~self.valid | (self.state.reshape(-1, 1) * self.voltage < 0.0), axis=1)
 
+#       update history
+        if self.records:
+            for node in self.node_list:
+                node.history.append((node.node_id, node.node_type, node.connections, node.state, node.energy, node.entropy))
+                node.solution_history.append(node.solve)
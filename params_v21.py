@@ -4,9 +4,10 @@ import sys
 import math
 import time as tm
 import os
+import metrics_v21 as mt
 
 class Parameters(object):
-    def __init__(self):
+    def __init__(self, run_suffix='', coarse=1):
 
 # filename qualifier suffix
         qualifier_string = ''
@@ -20,9 +21,19 @@ class Parameters(object):
         self.save_plots = True
         self.delete_state_file = True
         self.delete_plot_file = True
+        self.metric_cadence = {'energy': 1, 'free_energy': 1, 'synapse2': 1, 'state_change': 1, 'fluctuations': 1, 'solved': 1,
+                               'entropy': 1, 'dissipation': 1, 'transport': 1, 'quality': 1, 'order': 1, 'color': 1}   # steps between evaluations of each plotted statistic / 0 never evaluates it
+        self.history_spill_rows = 1000000       # rows of the network long / short histories held in memory before they spill to a memory-mapped file
+        self.plot_cadence = 1                   # steps between rows written to the plot file / 0 writes no rows (epoch summaries use every evaluated step)
 
 # network type list and component class dictionaries
         self.network_type_list = ['neighbor', 'random', 'gaussian', 'exponential'] 
+        self.scheduler_list = ['sweep', 'active']
+        self.precision_list = ['float64', 'float32']
+        self.anneal_key_list = ['threshold', 'node_ef', 'synapse_ef']
+        self.anneal_type_list = ['linear', 'geometric']
+        self.upsample_list = ['nearest', 'interpolate']
+        self.branch_key_list = ['epochs', 'weight_update', 'logic_mode', 'stop_solved', 'stop_plateau', 'stop_seconds']
         self.node_class_list_dict = {}
         self.node_class_list_dict['ordered'] = ['bias', 'discrete']
         self.node_class_list_dict['network'] = ['discrete']
@@ -43,6 +54,23 @@ class Parameters(object):
         self.era[7]  =  {'epochs': 0,   'weight_update': True, 'logic_mode': 'driven'}
         self.era[8]  =  {'epochs': 0,  'weight_update': True, 'logic_mode': 'off'}
         self.epochs = sum([self.era[i]['epochs'] for i in self.era])
+        self.seed = None                        # integer seed of the random streams / None draws a new seed (stored in the results folder)
+
+# network engine parameters
+        self.precision = 'float64'              # storage precision of the synapse store and engine edge arrays - 'float64' / 'float32' (sums stay float64)
+        self.precision_check = False            # if True and precision != 'float64' the run is repeated in float64 from the same seed and the drift is reported
+        self.frozen_engine = False              # if True eras with 'weight_update': False run on the vectorized inference engine (node histories are not recorded)
+        self.lattice_engine = False             # if True 'neighbor' networks run on the periodic lattice engine in color order - the same dynamics as a sweep in color order, so trajectories differ from the python sweep (node histories are not recorded)
+        self.scheduler = 'sweep'                # 'sweep' updates every network node each step / 'active' updates nodes with new context plus a background refresh
+        self.refresh_rate = 0.1                 # probability per step that a quiescent node is resampled by the 'active' scheduler
+        self.dormant_threshold = 0.0            # plastic synapses with |weight| below the threshold are skipped by node updates between revisits / 0.0 disables pruning
+        self.dormant_cadence = 10               # steps between revisits of dormant synapses (all synapses update on a revisit step)
+        self.replica_ladder = None              # node_ef scales of replicas run in parallel with replica exchange (e.g. [1.0, 0.8, 0.64, 0.5]) / None runs a single network
+        self.exchange_cadence = 1               # epochs between replica exchange attempts
+        self.warm_start_factor = None           # edge reduction of a coarse lattice trained first as the initial condition of a 'neighbor' network (e.g. 2) / None starts from random weights
+        self.warm_start_upsample = 'nearest'    # upsampling of the coarse weights per edge direction - 'nearest' / 'interpolate'
+        self.branch_list = None                 # era changes of branches forked from a checkpoint (e.g. [{2: {'epochs': 20, 'logic_mode': 'off'}}, {2: {'epochs': 20, 'logic_mode': 'noise', 'weight_update': False}}]) / None
+        self.checkpoint_seconds = 0             # wall-clock seconds between checkpoints written at the end of an epoch (resume with python network_v21.py --resume <file>) / 0 writes none
 
 # network architecture parameters
         self.dimension = 2
@@ -120,7 +148,38 @@ class Parameters(object):
                 if 'bound' not in self.synapse_dict[class1][class2]: self.synapse_dict[class1][class2]['bound'] = 1000
                 if 'size_mass' not in self.synapse_dict[class1][class2]: self.synapse_dict[class1][class2]['size_mass'] = 0
                 if 'change_mass' not in self.synapse_dict[class1][class2]: self.synapse_dict[class1][class2]['change_mass'] = 0
-
+                if 'depth' not in self.synapse_dict[class1][class2]: self.synapse_dict[class1][class2]['depth'] = 0
+
+        # set era stopping defaults if not already specified (None never stops the era early)
+        for era in self.era:
+            if 'stop_solved' not in self.era[era]: self.era[era]['stop_solved'] = None
+            if 'stop_plateau' not in self.era[era]: self.era[era]['stop_plateau'] = None
+            if 'stop_seconds' not in self.era[era]: self.era[era]['stop_seconds'] = None
+
+        # set era annealing defaults if not already specified (None keeps the node_dict / synapse_dict values)
+        for era in self.era:
+            if 'anneal' not in self.era[era]: self.era[era]['anneal'] = {}
+            for key in self.anneal_key_list:
+                if key not in self.era[era]['anneal']: self.era[era]['anneal'][key] = None
+
+
+# scale the lattice down by coarse in each dimension for a coarse warm-start run (bias nodes keep their number, their separations shrink)
+        if coarse > 1:
+            fine_nodes = sum([self.node_dict[key][m]['quantity'] for key in self.node_dict for m in self.node_dict[key]])
+            fine_edge = int(round(fine_nodes**(1/self.dimension)))
+            bias_nodes = sum([self.node_dict[key][m]['quantity'] for key in self.node_class_list_dict['logic'] for m in self.node_dict[key]])
+            network_nodes = fine_nodes - bias_nodes
+            coarse_network_nodes = (fine_edge // coarse)**self.dimension - bias_nodes
+            if fine_edge % coarse != 0 or coarse_network_nodes <= 0 or network_nodes <= 0:
+                print('\n**********   warm start error - execution terminated    ****************\n')
+                sys.exit() 
+            class_list = [(key, m) for key in self.node_class_list_dict['network'] for m in self.node_dict[key]]
+            for (key, m) in class_list: self.node_dict[key][m]['quantity'] = self.node_dict[key][m]['quantity'] * coarse_network_nodes // network_nodes
+            (key, m) = max(class_list, key=lambda km: self.node_dict[km[0]][km[1]]['quantity'])
+            self.node_dict[key][m]['quantity'] += coarse_network_nodes - sum([self.node_dict[key][m]['quantity'] for (key, m) in class_list])
+            self.bias_node_placement_separation = max(1, self.bias_node_placement_separation // coarse)
+            self.bias_node_link_separation = max(1, self.bias_node_link_separation // coarse)
+            self.warm_start_factor = None
                 
 # nodes counts by class / type
         self.all_nodes = sum([self.node_dict[key][m]['quantity'] for key in self.node_dict for m in self.node_dict[key]])
@@ -141,10 +200,46 @@ class Parameters(object):
         if self.network not in self.network_type_list:
             print('\n**********   network type error - execution terminated    ****************\n')
             sys.exit() 
+        if self.scheduler not in self.scheduler_list:
+            print('\n**********   scheduler error - execution terminated    ****************\n')
+            sys.exit() 
+        if self.dormant_cadence < 1 or self.dormant_threshold < 0.0:
+            print('\n**********   dormant synapse error - execution terminated    ****************\n')
+            sys.exit() 
+        if self.precision not in self.precision_list:
+            print('\n**********   precision error - execution terminated    ****************\n')
+            sys.exit() 
+        if sorted(self.metric_cadence) != sorted(mt.statistic_list):
+            print('\n**********   metric cadence error - execution terminated    ****************\n')
+            sys.exit() 
+        if any([self.era[era]['stop_plateau'] is not None and any([key not in self.metric_cadence for key in self.era[era]['stop_plateau'][0]]) for era in self.era]):
+            print('\n**********   era stop error - execution terminated    ****************\n')
+            sys.exit() 
+        if any([key not in self.anneal_key_list or not self.valid_schedule(self.era[era]['anneal'][key]) for era in self.era for key in self.era[era]['anneal']]):
+            print('\n**********   anneal schedule error - execution terminated    ****************\n')
+            sys.exit() 
+        if self.replica_ladder is not None and (len(self.replica_ladder) < 2 or min(self.replica_ladder) <= 0.0) or self.exchange_cadence < 1:
+            print('\n**********   replica exchange error - execution terminated    ****************\n')
+            sys.exit() 
+        if self.checkpoint_seconds < 0:
+            print('\n**********   checkpoint error - execution terminated    ****************\n')
+            sys.exit() 
+        if self.branch_list is not None and (len(self.branch_list) < 1 or any([era not in self.era or any([key not in self.branch_key_list for key in schedule[era]]) for schedule in self.branch_list for era in schedule])):
+            print('\n**********   branch error - execution terminated    ****************\n')
+            sys.exit() 
+        if self.history_spill_rows < 0:
+            print('\n**********   history spill error - execution terminated    ****************\n')
+            sys.exit() 
+        if self.plot_cadence < 0:
+            print('\n**********   plot cadence error - execution terminated    ****************\n')
+            sys.exit() 
         self.edge = int(round(self.all_nodes**(1/self.dimension)))
         if self.edge**self.dimension != self.all_nodes:
             print('\n**********   node quantity error - execution terminated    ****************\n')
             sys.exit()
+        if self.warm_start_factor is not None and (self.network != 'neighbor' or self.warm_start_factor < 2 or self.edge % self.warm_start_factor != 0 or self.warm_start_upsample not in self.upsample_list):
+            print('\n**********   warm start error - execution terminated    ****************\n')
+            sys.exit()
             
 # Build node placement parameters for network build
         if self.dimension == 2:
@@ -206,7 +301,7 @@ class Parameters(object):
         synapse_energy_string = str(self.synapse_dict['discrete']['discrete']['synapse_ef']) + 'Sf'        
         time_string = tm.strftime('%Y%h%d-%H%M%S')
         self.folder_name = 'simulations' + '\\' + network_string + '-' + network_node_string + '-' + logic_node_string + '-' + threshold_string + '-'
-        self.folder_name += length_string + '-' + node_energy_string + '-' + synapse_energy_string +  '-' + time_string + qualifier_string
+        self.folder_name += length_string + '-' + node_energy_string + '-' + synapse_energy_string +  '-' + time_string + qualifier_string + run_suffix
         os.mkdir(self.folder_name)
         print('directory ' + self.folder_name + ' created to store simulation output')
 
@@ -219,6 +314,9 @@ class Parameters(object):
         :param self.save_video: saves state and state-change videos to disk
         :param self.save_images: saves every nth state image as png file, 0 means don't save
         :param self.save_plots: saves summary plots of the network statistics 
+        :param self.metric_cadence: dictionary of the number of steps between evaluations of each plotted network statistic (the keys of statistic_list in metrics.py), 0 means the statistic is never evaluated (written as nan).  Epoch averages are taken over the evaluated steps
+        :param self.history_spill_rows: number of rows of the network long (per step) and short (per epoch) histories held in memory.  Longer histories spill to memory-mapped files long_history.dat / short_history.dat in the data folder (float64 rows of the columns in history_statistic_list in metrics.py)
+        :param self.plot_cadence: number of steps between rows of statistics written to the plot file, 0 writes no rows.  The epoch summaries (mean, standard deviation, min, max and 95% interval of the mean over the evaluated steps, the interval taken from the means of batches of consecutive steps) are written to the epoch file whatever the cadence
 
         Network type list and component class dictionaries
         :param self.network_type_list = ['neighbor', 'random', 'gaussian', 'exponential'] 
@@ -228,6 +326,12 @@ class Parameters(object):
         :param self.node_class_list_dict['logic'] = ['bias']
         :param self.node_class_list_dict['compound'] = ['network', 'logic']
         :param self.node_label_dict = {'network':'Network', 'logic':'Logic'}
+        :param self.scheduler_list = ['sweep', 'active']
+        :param self.precision_list = ['float64', 'float32']
+        :param self.anneal_key_list = ['threshold', 'node_ef', 'synapse_ef']
+        :param self.anneal_type_list = ['linear', 'geometric']
+        :param self.upsample_list = ['nearest', 'interpolate']
+        :param self.branch_key_list = ['epochs', 'weight_update', 'logic_mode', 'stop_solved', 'stop_plateau', 'stop_seconds']
 
         Network Execution Parameters
         :param temperature: network thermal bath temperature
@@ -236,8 +340,27 @@ class Parameters(object):
         :param period: Length of one period if the simulation includes driven (e.g. logic) nodes that change state periodically.  period <= 1 is equivalent to no period
         :param learn_time: Length of time at the beginning of the simulation where the synapse weights are allowed to adapt.  For later times the synapses have fixed weights.
         :param records: Number of time steps to retain in network, node and synapse histories
+        :param seed: Integer seed of the counter-based random streams keyed by node / synapse id and step.  None draws a new seed, which is stored in data\\seed.txt
         :param reconnect: boolean specifying whether the network should evolve weak connections - True / False means that the network should / should not make reconnections
 
+        Network Engine Parameters
+        :param precision: A string specifying the storage precision of the synapse weights, order parameters and weight errors in the synapse store and of the edge voltages, weights and compartments in the arrays of frozen_engine and lattice_engine - 'float64' or 'float32'.  Sums over edges, node statistics and synapse parameters stay float64.  The python node updates hold edge context in python floats, so 'float32' halves the memory traffic of the engines and store but does not change the node objects
+        :param precision_check: boolean specifying whether to repeat the run in float64 from the same seed, on the same engines, and report the drift of the epoch statistics and of the final synapse weights
+        :param frozen_engine: boolean specifying whether eras without weight updates run on the vectorized inference engine in engine.py.  The engine updates non-adjacent nodes together (a sweep in color order) and only propagates charges and samples states.  Not used when synapses have a transmission delay (depth > 0)
+        :param lattice_engine: boolean specifying whether a 'neighbor' network runs on the lattice engine in engine.py for all eras.  Edge states are stored in arrays over the lattice and exchanged between neighbors by array shifts; non-adjacent nodes update together (a sweep in color order).  A python sweep visiting the nodes in the same color order reproduces the engine exactly (tests/test_engine_v21.py).  The node order of the python sweep, where each node sees the updates of the nodes before it in the same step, gives a different trajectory from the same seed but the same behavior - e.g. on 20 x 20 driven runs both orders sit in a quiet phase (synapse^2 ~0.005, dissipation ~0.3) until a transition at a seed dependent epoch (1 to 17 over five seeds of either order), after which synapse^2 is ~0.1 - 1.5 and dissipation ~60 - 850.  Compare the orders over several seeds, not run by run.  Takes precedence over frozen_engine and scheduler
+        :param scheduler: A string specifying which network nodes update each step - 'sweep' (all nodes) or 'active' (nodes that received new edge context or made an irreversible update since their last update, plus a background refresh)
+        :param refresh_rate: probability per step that a node without new context is resampled by the 'active' scheduler.  The refresh keeps quiescent nodes sampling their stationary distribution
+        :param dormant_threshold: plastic synapses with |weight| below the threshold become dormant - their edges are skipped by the node updates (no charge, no push, no weight update) until the next revisit.  0.0 disables pruning
+        :param dormant_cadence: number of steps between revisits of dormant synapses.  On a revisit step every synapse updates and the dormant set is rebuilt from the updated weights, so synapses driven back above the threshold are reactivated
+        :param replica_ladder: None, or a list of node_ef scale factors of replicas of the network run in worker processes (replica.py).  Every exchange_cadence epochs adjacent steps of the ladder attempt a Metropolis swap on the total node energies; a swap exchanges the scales of two replicas, so adjacent scales should differ by about 1 / sqrt(network nodes) for swaps to be accepted.  Each replica writes its own results folder (suffix -replica<r>, replica 0 keeps the folder name) and the swap acceptance rates are written to replica_exchange.txt in the data folder of replica 0
+        :param exchange_cadence: number of epochs between replica exchange attempts
+        :param warm_start_factor: None, or an integer dividing the lattice edge of a 'neighbor' network.  A coarse lattice with the edge reduced by the factor (same stencil and node classes, the same number of bias nodes with their separations reduced by the factor) is trained through the eras first, and its node states and plastic synapse weights are upsampled onto the network as its initial condition (results folder suffix -coarse).  With replica_ladder every replica trains its own coarse lattice with its random streams (suffix -replica<r>-coarse)
+        :param warm_start_upsample: A string specifying how a fine edge takes the weight of the coarse edges with the same direction - 'nearest' (the coarse edge at the coarse node containing the fine node) or 'interpolate' (the multilinear interpolation of the coarse edges around the fine node)
+        :param checkpoint_seconds: wall-clock seconds between checkpoints, 0 writes none.  At the end of the first epoch past the interval the state of the run (random streams, synapse store, delays, node and edge state, bias group, histories) and its position are written as arrays to data\\checkpoint.npz, through a temporary file renamed over the previous checkpoint; the network structure is pickled once to data\\checkpoint_network.pkl.  python network_v21.py --resume <checkpoint.npz file> continues the run from the epoch after the checkpoint, truncating the output files to their length at the checkpoint.  Checkpoints of replica exchange runs (replica_ladder) cannot be resumed or forked
+        :param branch_list: None, or a list of branch schedules, each a dictionary {era: {key: value}} of changes to the era dictionaries (keys in branch_key_list).  python network_v21.py --branch <checkpoint file> forks one branch per schedule from the checkpoint in worker processes sharing the network loaded once (copy-on-write).  Each branch continues the run with the eras after the era of the checkpoint changed by its schedule and its random streams re-keyed, and writes its results to folder branch<b> of the results folder created by the invocation
+        :param run_suffix: A string appended to the results folder name to distinguish runs made by one invocation
+        :param coarse: integer reduction of the lattice edge applied to the parameter file (used by the coarse run of a warm start)
+
         Network Architecture Parameters
         :param dimension: Dimension of the network grid
         :param network: A string specifying the kind of network connectivity - 'neighbor', 'random', 'gaussian', 'exponential'
@@ -257,6 +380,18 @@ class Parameters(object):
         Synapse Description Parameters
         :param size_mass: a real specifying the mass associated with weight growth (causes weight decay)
         :param change_mass: a real specifying the mass associated with weight change (sets a learning rate - higher is slower)
+        :param depth: an integer specifying the transmission delay of the synapse in time steps (0 delivers node states immediately).  Delays are held in the ring array of class DelayStore in synapse.py
+
+        Era Description Parameters
+        :param epochs: number of epochs in the era
+        :param weight_update: boolean specifying whether synapse weights adapt during the era
+        :param logic_mode: A string specifying the operation of the logic (bias) nodes - 'driven', 'off', 'noise', 'reflect', 'predict'
+        :param stop_solved: optional (percent, epochs) - the era stops once the epoch % Solved is at least percent for epochs consecutive epochs
+        :param stop_plateau: optional (statistic list, tolerance, epochs) - the era stops once the epoch averages of the statistics change by less than the relative tolerance for epochs consecutive epochs
+        :param stop_seconds: optional wall-clock budget of the era in seconds, checked at the end of each epoch
+        The reason, epoch and step of an early stop are printed and written to the epoch file
+        :param anneal: optional dictionary of schedules keyed by 'threshold', 'node_ef' (network nodes) and 'synapse_ef' (all synapses) scaling the node_dict / synapse_dict values.  A schedule is None (unscaled), a positive factor held for the era (piecewise over the eras) or ('linear' / 'geometric', start factor, end factor) interpolated from the first to the last epoch of the era
+        The scale factors change at epoch boundaries and are written to the epoch file
 
         Network Descriptors
         :param node_class_list_dict: a dictionary of node type lists grouping nodes into categories keyed as 'ordered', 'network', 'logic', 'compound'
@@ -268,6 +403,15 @@ class Parameters(object):
         '''
 
 
+    def valid_schedule(self, schedule):
+        '''
+        Returns True if schedule is an annealing schedule of an era - None, a positive factor or (type, start, end) with positive factors.
+        '''
+        if schedule is None: return True
+        if isinstance(schedule, (int, float)): return schedule > 0
+        return len(schedule) == 3 and schedule[0] in self.anneal_type_list and schedule[1] > 0 and schedule[2] > 0
+
+
 
 
 
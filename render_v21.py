@@ -165,6 +165,24 @@ def display(folder_name, filename, show_video, save_state_video, save_change_vid
     cv2.destroyAllWindows()
 
 
+def show_lattice(folder_name, state_image, polarity, network_image, delay_between_frames=1):
+    '''
+    Function to display a frame of a 2D lattice simulation directly from the lattice engine state array (no state file parsing)
+    '''
+    if state_image.ndim != 2: return
+    network_bgr_high = np.array([1.0, 1.0, 1.0])
+    network_bgr_low = np.array([0.0, 0.0, 0.0])
+    logic_bgr = np.array([0.1, 1.0, 1.0])
+    state = np.clip(polarity * state_image, -1.0, 1.0)[:, :, np.newaxis]
+    color = (network_bgr_high + network_bgr_low) / 2 + (network_bgr_high - network_bgr_low) / 2 * state
+    color = np.where(network_image[:, :, np.newaxis], color, logic_bgr)
+    image = (255 * color).astype(np.uint8)
+    node_width = max(1, 800 // max(state_image.shape))
+    image = cv2.resize(image, (node_width * state_image.shape[1], node_width * state_image.shape[0]), interpolation=cv2.INTER_NEAREST)
+    cv2.imshow(folder_name, image)
+    cv2.waitKey(delay_between_frames)
+
+
 def makeplots(folder_name, plot_filename, edge_filename):
     '''
     Function to save plots from simulation statistics in stored in 'plot_filename'
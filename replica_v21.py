@@ -0,0 +1,139 @@
+'''
+Replica exchange (parallel tempering) for the Thermodynamic Neural Network.
+R replicas of one network (built from one seed, so they share the topology) run in worker processes with their node
+energy factors scaled by the steps of a ladder.  The node energy factor sets the energy scale of the boltzmann
+distributions of the node states, so a smaller scale is a hotter replica.  Every few epochs the replicas report their
+total node energy and adjacent steps of the ladder attempt a Metropolis swap.  An accepted swap exchanges the scales
+(temperatures) of the two replicas, which moves the same configurations between temperatures as exchanging the node and
+edge states would, without copying any state.
+'''
+import numpy as np
+import math
+import multiprocessing as mp
+import threading
+
+
+class ReplicaLink(object):
+    '''
+    Replica end of the pipe to the exchange coordinator.
+    '''
+    def __init__(self, replica, conn):
+        '''
+        :param replica: replica index
+        :param conn: connection to the coordinator
+        '''
+        self.replica = replica
+        self.conn = conn
+
+
+    def exchange(self, epoch, time, energy, factor):
+        '''
+        Reports the total node energy of the replica and its node energy factor scale and returns its scale after the swap
+        attempts of the round.
+        '''
+        self.conn.send(('exchange', epoch, time, energy, factor))
+        return self.conn.recv()
+
+
+    def close(self):
+        self.conn.send(('done',))
+        self.conn.close()
+
+
+class ReplicaExchange(object):
+    '''
+    Coordinator of the replicas.  Replica r starts at step r of the ladder.  In each round the replicas still running
+    report their energies, and the pairs of adjacent ladder steps (even pairs and odd pairs in alternate rounds) held by
+    two of them attempt a swap with probability min(1, exp((f_a - f_b) (E_a / f_a - E_b / f_b))) where f is the scale
+    and E the total node energy of a replica.
+    '''
+    def __init__(self, ladder, seed):
+        '''
+        :param ladder: node energy factor scales of the replicas (replica_ladder in params.py)
+        :param seed: seed of the network, shared by the replicas
+        '''
+        self.ladder = list(ladder)
+        self.replicas = len(self.ladder)
+        self.seed = seed
+        self.position = list(range(self.replicas))
+        self.attempts = np.zeros(self.replicas - 1, dtype=np.int64)
+        self.accepted = np.zeros(self.replicas - 1, dtype=np.int64)
+        self.rounds = 0
+        self.generator = np.random.default_rng([seed, self.replicas])
+        self.process_list = []
+        self.thread = None
+
+
+    def start(self, target):
+        '''
+        Starts replicas 1 .. R-1 as worker processes calling target(replica, seed, conn) and the coordinator thread.
+        Returns the connection of replica 0, which runs in the calling process.
+        '''
+        conn_list = []
+        for r in range(self.replicas):
+            (conn, worker_conn) = mp.Pipe()
+            conn_list.append(conn)
+            if r == 0: replica_conn = worker_conn
+            else:
+                process = mp.Process(target=target, args=(r, self.seed, worker_conn))
+                process.start()
+                self.process_list.append(process)
+        self.thread = threading.Thread(target=self.coordinate, args=(conn_list,), daemon=True)
+        self.thread.start()
+        return replica_conn
+
+
+    def coordinate(self, conn_list):
+        '''
+        Runs rounds of swap attempts until every replica is done (a replica that exits without reporting is dropped).
+        '''
+        running = dict(enumerate(conn_list))
+        while running:
+            energy = {}
+            for r in list(running):
+                try: message = running[r].recv()
+                except EOFError: message = ('done',)
+                if message[0] == 'done': del running[r]
+                else: energy[r] = message[3]
+            if energy: self.swap(energy)
+            for r in energy: running[r].send(self.ladder[self.position[r]])
+
+
+    def swap(self, energy):
+        '''
+        Attempts the swaps of a round given the total node energies of the reporting replicas.
+        '''
+        holder = dict([(self.position[r], r) for r in energy])
+        for i in range(self.rounds % 2, self.replicas - 1, 2):
+            if i not in holder or i + 1 not in holder: continue
+            (a, b) = (holder[i], holder[i + 1])
+            (fa, fb) = (self.ladder[i], self.ladder[i + 1])
+            delta = (fa - fb) * (energy[a] / fa - energy[b] / fb)
+            self.attempts[i] += 1
+            if delta >= 0.0 or self.generator.random() < math.exp(delta):
+                self.accepted[i] += 1
+                (self.position[a], self.position[b]) = (i + 1, i)
+        self.rounds += 1
+
+
+    def join(self):
+        self.thread.join()
+        for process in self.process_list: process.join()
+
+
+    def acceptance(self):
+        '''
+        Returns the swap acceptance rate of each pair of adjacent ladder steps (nan for pairs never attempted).
+        '''
+        return np.where(self.attempts > 0, self.accepted / np.maximum(self.attempts, 1), np.nan)
+
+
+    def report(self, filename):
+        '''
+        Prints the swap acceptance rates and writes them to filename.
+        '''
+        lines = ['Ladder Step, Scale, Next Scale, Attempts, Accepted, Acceptance']
+        for (i, rate) in enumerate(self.acceptance().tolist()):
+            lines.append('%i, %g, %g, %i, %i, %s' %(i, self.ladder[i], self.ladder[i + 1], self.attempts[i], self.accepted[i], rate))
+        print('\nreplica exchange - %i rounds\n' %self.rounds + '\n'.join(lines))
+        with open(filename, 'w') as exchange_file: exchange_file.write('Thermodynamic Neural Network Replica Exchange File\n' + '\n'.join(lines) + '\n')
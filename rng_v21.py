@@ -0,0 +1,119 @@
+'''
+Counter-based random streams for the Thermodynamic Neural Network.
+Every draw is keyed by (stream, key, step, draw) where key is a node or synapse id, so the value a node or synapse
+receives does not depend on the order in which the network is updated.  Rows of draws are produced by the Philox
+counter-based generator with counter (0, step, stream, draw), which lets serial, batched and parallel engines
+reproduce each other from the same seed.
+'''
+import numpy as np
+
+
+# stream identifiers
+NODE = 0                # node state sampling (uniform) keyed by node id
+BIAS = 1                # bias node drive noise (uniform) keyed by node id
+SYNAPSE_NORMAL = 2      # synapse weight noise (normal) keyed by synapse id
+SYNAPSE_UNIFORM = 3     # synapse weight noise (uniform) keyed by synapse id
+WEIGHT_NORMAL = 4       # initial synapse weights (normal) keyed by synapse id
+WEIGHT_UNIFORM = 5      # initial synapse weights (uniform) keyed by synapse id
+BUILD = 6               # sequential draws made while building the network
+SCHEDULE = 7            # background refresh of the active-set scheduler (uniform) keyed by node id
+
+
+class RandomStreams(object):
+    '''
+    Seeded random streams keyed by node or synapse id and simulation step.
+    '''
+    def __init__(self, seed):
+        '''
+        :param seed: integer seed of the streams, None draws a fresh seed from the operating system
+        '''
+        if seed is None: seed = int(np.random.SeedSequence().entropy % 2**63)
+        self.seed = int(seed)
+        self.key = np.random.SeedSequence(self.seed).generate_state(2, np.uint64)
+        self.size = {}
+        self.step = 0
+        self.uniform_table = {}
+        self.normal_table = {}
+        self.build = np.random.Generator(np.random.Philox(key=self.key, counter=self.counter(0, BUILD, 0)))
+
+
+    def set_replica(self, replica):
+        '''
+        Re-keys the simulation streams for a replica of the network so replicas built from one seed (one topology) draw
+        independent noise.  Replica 0 keeps the streams of the seed.
+        '''
+        if replica > 0: self.key = np.random.SeedSequence([self.seed, replica]).generate_state(2, np.uint64)
+        self.set_step(self.step)
+
+
+    def set_branch(self, branch):
+        '''
+        Re-keys the simulation streams for a branch forked from a checkpoint, so the branches of one checkpoint draw
+        independent noise from the step of the checkpoint on.
+        '''
+        self.key = np.random.SeedSequence([int(word) for word in self.key] + [branch]).generate_state(2, np.uint64)
+        self.set_step(self.step)
+
+
+    def counter(self, step, stream, draw):
+        return np.array([0, step, stream, draw], dtype=np.uint64)
+
+
+    def generator(self, stream, draw):
+        return np.random.Generator(np.random.Philox(key=self.key, counter=self.counter(self.step, stream, draw)))
+
+
+    def add_stream(self, stream, size):
+        '''
+        Declares the number of keys (nodes or synapses) drawn from a stream.
+        '''
+        self.size[stream] = size
+
+
+    def set_step(self, step):
+        '''
+        Advances the streams to a simulation step, discarding the rows of the previous step.
+        '''
+        self.step = step
+        self.uniform_table = {}
+        self.normal_table = {}
+
+
+    def uniform_row(self, stream, draw=0):
+        '''
+        Uniform [0, 1) draws of all keys of a stream for the current step.
+        '''
+        if (stream, draw) not in self.uniform_table:
+            self.uniform_table[(stream, draw)] = self.generator(stream, draw).random(self.size[stream])
+        return self.uniform_table[(stream, draw)]
+
+
+    def normal_row(self, stream, draw=0):
+        '''
+        Standard normal draws of all keys of a stream for the current step.
+        '''
+        if (stream, draw) not in self.normal_table:
+            self.normal_table[(stream, draw)] = self.generator(stream, draw).standard_normal(self.size[stream])
+        return self.normal_table[(stream, draw)]
+
+
+    def uniform(self, stream, key, draw=0):
+        return float(self.uniform_row(stream, draw)[key])
+
+
+    def normal(self, stream, key, draw=0):
+        return float(self.normal_row(stream, draw)[key])
+
+
+    def uniform_array(self, stream, keys, draw=0):
+        '''
+        Bulk uniform draws for an array of keys.
+        '''
+        return self.uniform_row(stream, draw)[keys]
+
+
+    def normal_array(self, stream, keys, draw=0):
+        '''
+        Bulk standard normal draws for an array of keys.
+        '''
+        return self.normal_row(stream, draw)[keys]
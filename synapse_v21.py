@@ -2,6 +2,8 @@ import numpy as np
 import scipy.special as sps
 import math
 import sys
+import rng_v21 as rn
+import metrics_v21 as mt
 
 
 class MakeSynapse(object):   # *******************************  Make Synapse Object *********************************************
@@ -9,25 +11,154 @@ class MakeSynapse(object):   # *******************************  Make Synapse Obj
     Class for initiating synapses
     '''
 
-    def Factory(synapse_id, weight_type, energy_factor, time_depth, weight_bound, weight_target, weight_noise, size_mass, change_mass, records):
+    def Factory(synapse_id, weight_type, energy_factor, time_depth, weight_bound, weight_target, weight_noise, size_mass, change_mass, records, rng, store):
         '''
         Factory for Synapse Object creation
         '''
-        if weight_type == 'real1':  return Real1(synapse_id, energy_factor, time_depth, weight_bound, weight_target, weight_noise, size_mass, change_mass, records)
-        if weight_type == 'real2':  return Real2(synapse_id, energy_factor, time_depth, weight_bound, weight_target, weight_noise, size_mass, change_mass, records)
-        if weight_type == 'fixed':  return Fixed(synapse_id, energy_factor, time_depth, weight_bound, weight_target, weight_noise, size_mass, change_mass, records)
+        if weight_type == 'real1':  return Real1(synapse_id, energy_factor, time_depth, weight_bound, weight_target, weight_noise, size_mass, change_mass, records, rng, store)
+        if weight_type == 'real2':  return Real2(synapse_id, energy_factor, time_depth, weight_bound, weight_target, weight_noise, size_mass, change_mass, records, rng, store)
+        if weight_type == 'fixed':  return Fixed(synapse_id, energy_factor, time_depth, weight_bound, weight_target, weight_noise, size_mass, change_mass, records, rng, store)
 
         assert False, "Bad synapse creation: " + weight_type
 
     Factory = staticmethod(Factory)
 
 
+class DelayStore(object):   # *******************************  Delay Store Object *********************************************
+    '''
+    Transmission delays of the synapses with time_depth > 0 held in one ring array of shape (synapse, endpoint, slot),
+    the input of step t in slot t % slots.  The output of endpoint e of synapse k is the input written time_depth steps
+    earlier, and an endpoint that is not pushed on a step holds its last input.  Each endpoint keeps the step of its
+    last input instead of the held input being copied forward every step: a read for a step after the last input
+    returns that input, and the slots of the steps skipped before a new input are filled when it is written (only the
+    steps still within time_depth).  A message costs one write and one read, plus the fill after a pause of the
+    endpoint, and nothing is done per step for the endpoints that are not pushed.
+    '''
+    def __init__(self, depth_list):
+        '''
+        :param depth_list: time_depth of every synapse indexed by synapse id
+        '''
+        self.depth = np.array(depth_list, dtype=np.int64)
+        self.slots = int(np.max(self.depth, initial=0)) + 1
+        self.buffer = np.zeros((len(self.depth), 2, self.slots))
+        self.written = np.full((len(self.depth), 2), -1, dtype=np.int64)      # step of the last input of each endpoint (-1 before the first)
+        self.step = 0
+
+
+    def advance(self):
+        '''
+        Moves to the next time step.
+        '''
+        self.step += 1
+
+
+    def transmit(self, synapse_id, endpoint, input_state):
+        '''
+        Writes the input of an endpoint of a synapse and returns its delayed output.
+        '''
+        step = self.step
+        depth = self.depth.item(synapse_id)
+        last = self.written.item(synapse_id, endpoint)
+        row = self.buffer[synapse_id, endpoint]
+        if last < step - 1:
+            held = row[last % self.slots]
+            for skipped in range(max(last + 1, step - depth), step): row[skipped % self.slots] = held
+        row[step % self.slots] = input_state
+        self.written[synapse_id, endpoint] = step
+        return row.item((step - depth) % self.slots)
+
+
+    def read(self, synapse_ids, endpoints):
+        '''
+        Bulk read of the delayed outputs of arrays of synapse ids and endpoints.
+        '''
+        delayed = self.step - self.depth[synapse_ids]
+        return self.buffer[synapse_ids, endpoints, np.minimum(self.written[synapse_ids, endpoints], delayed) % self.slots]
+
+
+    def snapshot(self):
+        '''
+        Returns copies of the ring array and the steps of the last inputs with the current step (for a checkpoint).
+        '''
+        return {'buffer': self.buffer.copy(), 'written': self.written.copy(), 'step': np.array(self.step)}
+
+
+    def restore(self, snapshot):
+        '''
+        Writes back delays returned by snapshot.
+        '''
+        self.buffer[:] = snapshot['buffer']
+        self.written[:] = snapshot['written']
+        self.step = int(snapshot['step'])
+
+
+class SynapseStore(object):   # *******************************  Synapse Store Object *********************************************
+    '''
+    Struct of arrays holding the weights, order parameters, weight errors, parameters, endpoint node ids and type codes of
+    all synapses indexed by synapse id.  Synapse objects are views on their row, so network aggregates, snapshots and
+    engines read and write the synapses with single array operations.  Weights, order parameters and weight errors are
+    stored in the given precision; parameters are float64.
+    '''
+    type_list = ['real1', 'real2', 'fixed']
+
+    def __init__(self, size, precision='float64'):
+        '''
+        :param size: number of synapses
+        :param precision: storage precision of the synapse state arrays ('float64' / 'float32')
+        '''
+        self.weight = np.zeros(size, dtype=precision)
+        self.order = np.zeros(size, dtype=precision)
+        self.weight_error = np.zeros(size, dtype=precision)
+        self.energy_factor = np.zeros(size)
+        self.prefactor = np.zeros(size)
+        self.stdev = np.zeros(size)
+        self.bound_low = np.zeros(size)
+        self.bound_high = np.zeros(size)
+        self.node = np.zeros((size, 2), dtype=np.int64)
+        self.type_code = np.zeros(size, dtype=np.int8)
+
+
+    def mask(self, synapse_ids):
+        '''
+        Returns a 0 / 1 array over the store selecting synapse_ids, for sums over a subset of synapses taken as dot
+        products without gathering the subset.
+        '''
+        mask = np.zeros(len(self.weight))
+        mask[synapse_ids] = 1.0
+        return mask
+
+
+    def set_energy_factor(self, synapse_ids, energy_factor):
+        '''
+        Sets the energy factors of synapse_ids and updates their prefactors and weight noise, keeping their size and change
+        masses.
+        '''
+        self.prefactor[synapse_ids] += energy_factor - self.energy_factor[synapse_ids]
+        self.energy_factor[synapse_ids] = energy_factor
+        self.stdev[synapse_ids] = 1.0 / np.sqrt(2.0 * self.prefactor[synapse_ids])
+
+
+    def snapshot(self):
+        '''
+        Returns copies of the arrays of synapse state that change during a simulation (the energy factors, prefactors and
+        weight noise change when they are annealed).
+        '''
+        return dict([(key, getattr(self, key).copy()) for key in ['weight', 'order', 'weight_error', 'energy_factor', 'prefactor', 'stdev']])
+
+
+    def restore(self, snapshot):
+        '''
+        Writes back synapse state returned by snapshot.
+        '''
+        for key in snapshot: getattr(self, key)[:] = snapshot[key]
+
+
 class Synapse(object):   # *******************************  Synapse Object *********************************************
     '''
     Generic synapse class implementing methods used by all synapse classes
     '''
 
-    def __init__(self, synapse_id, energy_factor, time_depth, weight_bound, weight_target, weight_noise, size_mass, change_mass, records):
+    def __init__(self, synapse_id, energy_factor, time_depth, weight_bound, weight_target, weight_noise, size_mass, change_mass, records, rng, store):
         '''
         Initiate a Synapse
         '''
@@ -41,12 +172,50 @@ class Synapse(object):   # *******************************  Synapse Object *****
         self.change_mass = change_mass
         self.energy_factor = 2.0 * energy_factor  # 2.0 reflects node error formula (assuming strong decision states)
         self.prefactor = self.energy_factor + size_mass + change_mass
-        self.stdev = 1.0 / np.math.sqrt(2.0 * self.prefactor)
+        self.stdev = 1.0 / math.sqrt(2.0 * self.prefactor)
+        self.store = store
+        for key in ['energy_factor', 'prefactor', 'stdev', 'bound_low', 'bound_high']: getattr(store, key)[synapse_id] = getattr(self, key)
         self.records = records
-        self.order = 0.0
+        self.rng = rng
+        self.draw_step = -1
+        self.draw_count = [0, 0]
         self.correlation = 0.0
-        self.history = []
-        
+        self.history = mt.History(mt.synapse_history_fields, records)
+        self.delay = None
+
+    def get_weight(self):
+        return self.store.weight.item(self.synapse_id)
+
+    def set_weight(self, value):
+        self.store.weight[self.synapse_id] = value
+
+    def get_order(self):
+        return self.store.order.item(self.synapse_id)
+
+    def set_order(self, value):
+        self.store.order[self.synapse_id] = value
+
+    def get_weight_error(self):
+        return self.store.weight_error.item(self.synapse_id)
+
+    def set_weight_error(self, value):
+        self.store.weight_error[self.synapse_id] = value
+
+    weight = property(get_weight, set_weight)
+    order = property(get_order, set_order)
+    weight_error = property(get_weight_error, set_weight_error)
+
+
+    def __getstate__(self):
+        '''
+        Pickles the synapse without the node callbacks, so a checkpoint does not recurse through the network graph.  The
+        network reconnects them (Network.connect_callbacks).
+        '''
+        state = self.__dict__.copy()
+        state['send_context'] = None
+        if 'send' in state: state['send'] = None
+        return state
+
 
     def add_nodes(self, node_id_1, node_id_1_callback, node_id_2, node_id_2_callback):
         '''
@@ -54,10 +223,35 @@ class Synapse(object):   # *******************************  Synapse Object *****
         Called by the network object when adding a nodes to a synapse.
         '''
         self.node_list = [node_id_1, node_id_2]
+        self.endpoint = {node_id_1:0, node_id_2:1}
         self.node_pair = {node_id_1:node_id_2, node_id_2:node_id_1}
         self.send_context = {node_id_1:node_id_2_callback, node_id_2:node_id_1_callback}
         self.output_state = {node_id_1:0.0, node_id_2:0.0}
-        self.input_queue = {node_id_1:self.time_depth*[0.0], node_id_2:self.time_depth*[0.0]}
+        self.store.node[self.synapse_id] = self.node_list
+
+
+    def add_self_node(self, node_id, node_id_callback):
+        '''
+        Attaches both ends of a recurrent synapse to one node (node_list [node_id, node_id], endpoint 1).
+        The node is connected to push_self_state / update_self_state, which skip the two-endpoint bookkeeping.
+        '''
+        self.add_nodes(node_id, node_id_callback, node_id, node_id_callback)
+        self.send = node_id_callback
+
+
+    def set_delay(self, delay_store):
+        '''
+        Routes the node outputs of a synapse with time_depth > 0 through the ring array of a DelayStore.
+        '''
+        self.delay = delay_store
+
+
+    def transmit(self, node_id, input_state):
+        '''
+        Returns the output of the synapse for an input from node_id (delayed by time_depth steps).
+        '''
+        if self.delay is None: return input_state
+        return self.delay.transmit(self.synapse_id, self.endpoint[node_id], input_state)
 
 
     def push_state(self, node_id, input_state):
@@ -65,8 +259,7 @@ class Synapse(object):   # *******************************  Synapse Object *****
         Pushes node outputs through the synapse without weight update and delivers them to the connected node as input.
         Called by node objects when they relax or update state.
         '''
-        self.input_queue[node_id].append(input_state)
-        self.output_state[node_id] = self.input_queue[node_id].pop(0)
+        self.output_state[node_id] = input_state if self.delay is None else self.transmit(node_id, input_state)
         self.order = -input_state * self.output_state[self.node_pair[node_id]]
         self.send_context[node_id](self.synapse_id, self.output_state[node_id], self.weight)
 
@@ -76,23 +269,65 @@ class Synapse(object):   # *******************************  Synapse Object *****
         Pushes node outputs through the synapse with weight update and delivers them to the connected node as input.
         Called by node objects when they update state.
         '''           
-        self.input_queue[node_id].append(input_state)
-        self.output_state[node_id] = self.input_queue[node_id].pop(0)
+        self.output_state[node_id] = input_state if self.delay is None else self.transmit(node_id, input_state)
         self.order = -input_state * self.output_state[self.node_pair[node_id]]
         self.weight_error = input_weight_error
+        self.draw = self.next_draw(node_id)
         self.delta = math.sqrt(1.0 + 1.0 / (2.0 * self.prefactor * weight2_avg))
         self.update_weight()
-        self.history.append((self.synapse_id, self.weight_type, self.output_state[self.node_list[0]], self.output_state[self.node_list[1]], self.weight, self.prefactor, self.weight_error))
-        if len(self.history) > self.records: self.history.pop(0)
+        if self.records:
+            self.history.append((self.synapse_id, self.weight_type, self.output_state[self.node_list[0]], self.output_state[self.node_list[1]], self.weight, self.prefactor, self.weight_error))
         self.send_context[node_id](self.synapse_id, self.output_state[node_id], self.weight)
 
 
+    def push_self_state(self, node_id, input_state):
+        '''
+        push_state of a recurrent synapse - the node output is delivered back to the same node.
+        '''
+        output_state = self.output_state[node_id] = input_state if self.delay is None else self.transmit(node_id, input_state)
+        self.order = -input_state * output_state
+        self.send(self.synapse_id, output_state, self.weight)
+
+
+    def update_self_state(self, node_id, input_state, input_weight_error, weight2_avg):
+        '''
+        update_state of a recurrent synapse - draws from the rows of endpoint 1 as next_draw.
+        '''
+        output_state = self.output_state[node_id] = input_state if self.delay is None else self.transmit(node_id, input_state)
+        self.order = -input_state * output_state
+        self.weight_error = input_weight_error
+        if self.draw_step != self.rng.step:
+            self.draw_step = self.rng.step
+            self.draw_count = [0, 0]
+        self.draw_count[1] += 1
+        self.draw = 2 * self.draw_count[1] - 1
+        self.delta = math.sqrt(1.0 + 1.0 / (2.0 * self.prefactor * weight2_avg))
+        self.update_weight()
+        if self.records:
+            self.history.append((self.synapse_id, self.weight_type, output_state, output_state, self.weight, self.prefactor, self.weight_error))
+        self.send(self.synapse_id, output_state, self.weight)
+
+
+    def next_draw(self, node_id):
+        '''
+        Selects the row of the random streams used by a weight update from node_id.  Each endpoint draws from its own
+        rows so the draws do not depend on which node updates first; repeated updates within a step use further rows.
+        '''
+        if self.draw_step != self.rng.step:
+            self.draw_step = self.rng.step
+            self.draw_count = [0, 0]
+        e = self.endpoint[node_id]
+        self.draw_count[e] += 1
+        return 2 * (self.draw_count[e] - 1) + e
+
+
 class Real1(Synapse):   ##################################    REAL1 Synapse Class   ############################################
 
-    def __init__(self, synapse_id, energy_factor, time_depth, weight_bound, weight_target, weight_noise, size_mass, change_mass, records):
-        Synapse.__init__(self, synapse_id, energy_factor, time_depth, weight_bound, weight_target, weight_noise, size_mass, change_mass, records)
+    def __init__(self, synapse_id, energy_factor, time_depth, weight_bound, weight_target, weight_noise, size_mass, change_mass, records, rng, store):
+        Synapse.__init__(self, synapse_id, energy_factor, time_depth, weight_bound, weight_target, weight_noise, size_mass, change_mass, records, rng, store)
         self.weight_type = 'real1'
-        self.weight = np.random.randn() * self.stdev
+        store.type_code[synapse_id] = store.type_list.index(self.weight_type)
+        self.weight = self.rng.normal(rn.WEIGHT_NORMAL, synapse_id) * self.stdev
         
     def update_weight(self):
         '''
@@ -100,46 +335,165 @@ class Real1(Synapse):   ##################################    REAL1 Synapse Clas
         Weight values are drawn from a gaussian but cutoff beyond [self.bound_low, self.bound_high]
         '''
         
-        # compute weight update
-        self.weight += (self.energy_factor * self.weight_error - self.size_mass * self.weight) / self.prefactor
+        # compute weight update (on a local copy of the weight held in the store)
+        weight = self.weight
+        weight += (self.energy_factor * self.weight_error - self.size_mass * weight) / self.prefactor
         if self.weight_noise:
-            self.weight /= self.delta
-            self.weight += np.random.randn() * self.stdev
-        self.weight = max(self.bound_low, min(self.bound_high, self.weight))
+            weight /= self.delta
+            weight += self.rng.normal(rn.SYNAPSE_NORMAL, self.synapse_id, self.draw) * self.stdev
+        self.weight = max(self.bound_low, min(self.bound_high, weight))
+
+
+def real1_weights(weight, weight_error, weight2_avg, noise, energy_factor, size_mass, prefactor, stdev, bound_low, bound_high, weight_noise):
+    '''
+    Vectorized Real1.update_weight over arrays of synapses (noise holds standard normal draws, used where weight_noise).
+    '''
+    with np.errstate(divide='ignore'):
+        delta = np.sqrt(1.0 + 1.0 / (2.0 * prefactor * weight2_avg))
+    weight = weight + (energy_factor * weight_error - size_mass * weight) / prefactor
+    weight = np.where(weight_noise, weight / delta + noise * stdev, weight)
+    return np.clip(weight, bound_low, bound_high)
+
+
+class Real1Batch(object):   ##################################    REAL1 Batch Class   ############################################
+    '''
+    Real1 parameters of a list of synapses gathered into arrays, for weight updates of many synapses in one call.
+    '''
+    def __init__(self, synapse_list, rng):
+        '''
+        :param synapse_list: list of Real1 synapse objects (entries may repeat, e.g. one entry per half-edge)
+        :param rng: RandomStreams object supplying the synapse random draws
+        '''
+        self.rng = rng
+        self.synapse_id = np.array([s.synapse_id for s in synapse_list], dtype=np.int64)
+        self.energy_factor = np.array([s.energy_factor for s in synapse_list], dtype=float)
+        self.size_mass = np.array([s.size_mass for s in synapse_list], dtype=float)
+        self.prefactor = np.array([s.prefactor for s in synapse_list], dtype=float)
+        self.stdev = np.array([s.stdev for s in synapse_list], dtype=float)
+        self.bound_low = np.array([s.bound_low for s in synapse_list], dtype=float)
+        self.bound_high = np.array([s.bound_high for s in synapse_list], dtype=float)
+        self.weight_noise = np.array([bool(s.weight_noise) for s in synapse_list], dtype=bool)
+
+
+    def set_parameters(self, store):
+        '''
+        Gathers the energy factors, prefactors and weight noise of the synapses from the SynapseStore (changed by annealing).
+        '''
+        self.energy_factor = store.energy_factor[self.synapse_id]
+        self.prefactor = store.prefactor[self.synapse_id]
+        self.stdev = store.stdev[self.synapse_id]
+
+
+    def update_weights(self, index, weight, weight_error, weight2_avg, draw):
+        '''
+        Returns the updated weights of the entries index given their weights, weight errors, weight normalizations and
+        random stream rows (draw, as chosen by next_draw).  Gaussian noise is drawn in bulk, one stream row at a time.
+        '''
+        noise = np.zeros(len(index))
+        noisy = self.weight_noise[index]
+        for r in np.unique(draw[noisy]).tolist():
+            select = noisy & (draw == r)
+            noise[select] = self.rng.normal_row(rn.SYNAPSE_NORMAL, r)[self.synapse_id[index[select]]]
+        return real1_weights(weight, weight_error, weight2_avg, noise, self.energy_factor[index], self.size_mass[index], self.prefactor[index], self.stdev[index],
+                             self.bound_low[index], self.bound_high[index], noisy)
 
 
 class Real2(Synapse):   ##################################    REAL2 Synapse Class   ############################################
 
-    def __init__(self, synapse_id, energy_factor, time_depth, weight_bound, weight_target, weight_noise, size_mass, change_mass, records):
-        Synapse.__init__(self, synapse_id, energy_factor, time_depth, weight_bound, weight_target, weight_noise, size_mass, change_mass, records)
+    def __init__(self, synapse_id, energy_factor, time_depth, weight_bound, weight_target, weight_noise, size_mass, change_mass, records, rng, store):
+        Synapse.__init__(self, synapse_id, energy_factor, time_depth, weight_bound, weight_target, weight_noise, size_mass, change_mass, records, rng, store)
         self.weight_type = 'real2'
-        self.factor = np.math.sqrt(self.prefactor)
-        R = np.random.random()
-        self.weight = sps.erfcinv((1.0-R) * sps.erfc(factor * self.bound_low) + R * sps.erfc(factor * self.bound_high))
+        store.type_code[synapse_id] = store.type_list.index(self.weight_type)
+        low = self.bound_low / self.stdev
+        high = self.bound_high / self.stdev
+        z = self.rng.normal(rn.WEIGHT_NORMAL, synapse_id)
+        if not low <= z <= high: z = float(truncated_normal(self.rng.uniform(rn.WEIGHT_UNIFORM, synapse_id), low, high))
+        self.weight = z * self.stdev
 
     def update_weight(self):
         '''
         Function for executing the update of real valued synapses.
-        Weight values are drawn from a gaussian limited to the domain [self.bound_low, self.bound_high]
+        Weight values are drawn from a gaussian limited to the domain [self.bound_low, self.bound_high]: the normal draw
+        is kept when it falls inside the domain, otherwise the noise is drawn from the truncated gaussian by inverse cdf.
         '''
 
-        # compute weight update
-        self.weight += (self.energy_factor * self.weight_error  - self.size_mass * self.weight)/self.prefactor
+        # compute weight update (on a local copy of the weight held in the store)
+        weight = self.weight
+        weight += (self.energy_factor * self.weight_error  - self.size_mass * weight)/self.prefactor
         if self.weight_noise:
-            self.weight /= self.delta
-            R = np.random.random()
-            self.noise = sps.erfcinv((1.0-R) * sps.erfc(self.factor*(self.bound_low - self.weight)) + R * sps.erfc(self.factor*(self.bound_high - self.weight))) / self.factor
-            self.weight += self.noise
-        self.weight = max(self.bound_low, min(self.bound_high, self.weight))
+            weight /= self.delta
+            low = (self.bound_low - weight) / self.stdev
+            high = (self.bound_high - weight) / self.stdev
+            z = self.rng.normal(rn.SYNAPSE_NORMAL, self.synapse_id, self.draw)
+            if not low <= z <= high: z = float(truncated_normal(self.rng.uniform(rn.SYNAPSE_UNIFORM, self.synapse_id, self.draw), low, high))
+            self.noise = z * self.stdev
+            weight += self.noise
+        self.weight = max(self.bound_low, min(self.bound_high, weight))
+
+
+def truncated_normal(uniform, low, high):
+    '''
+    Inverse cdf samples of a standard normal truncated to [low, high] from uniform draws (scalars or arrays).  Intervals
+    above zero are mirrored below it, so the cdf values are taken in the lower tail where they keep full precision.
+    '''
+    flip = np.asarray(low) > 0.0
+    a = np.where(flip, -np.asarray(high), low)
+    b = np.where(flip, -np.asarray(low), high)
+    pa = sps.ndtr(a)
+    x = np.clip(sps.ndtri(pa + uniform * (sps.ndtr(b) - pa)), a, b)
+    return np.where(flip, -x, x)
+
+
+class Real2Batch(Real1Batch):   ##################################    REAL2 Batch Class   ############################################
+    '''
+    Real2 parameters of a list of synapses gathered into arrays, for weight updates of many synapses in one call.
+    '''
+    def update_weights(self, index, weight, weight_error, weight2_avg, draw):
+        '''
+        Returns the updated weights of the entries index (vectorized Real2.update_weight).  The normal draws of the
+        entries are kept where they fall inside the weight bounds; the remaining entries, rare unless the bounds are
+        within a few standard deviations, are drawn from the truncated gaussian with their uniform draws.
+        '''
+        prefactor = self.prefactor[index]
+        stdev = self.stdev[index]
+        bound_low = self.bound_low[index]
+        bound_high = self.bound_high[index]
+        noisy = self.weight_noise[index]
+        with np.errstate(divide='ignore'):
+            delta = np.sqrt(1.0 + 1.0 / (2.0 * prefactor * weight2_avg))
+        weight = weight + (self.energy_factor[index] * weight_error - self.size_mass[index] * weight) / prefactor
+        weight = np.where(noisy, weight / delta, weight)
+        low = (bound_low - weight) / stdev
+        high = (bound_high - weight) / stdev
+        z = np.zeros(len(index))
+        for r in np.unique(draw[noisy]).tolist():
+            select = noisy & (draw == r)
+            z[select] = self.rng.normal_row(rn.SYNAPSE_NORMAL, r)[self.synapse_id[index[select]]]
+        tail = noisy & ((z < low) | (z > high))
+        for r in np.unique(draw[tail]).tolist():
+            select = tail & (draw == r)
+            z[select] = truncated_normal(self.rng.uniform_row(rn.SYNAPSE_UNIFORM, r)[self.synapse_id[index[select]]], low[select], high[select])
+        return np.clip(weight + z * stdev, bound_low, bound_high)
 
 
 class Fixed(Synapse):   ##################################    FIXED Synapse Class   ############################################
 
-    def __init__(self, synapse_id, energy_factor, time_depth, weight_bound, weight_target, weight_noise, size_mass, change_mass, records):
-        Synapse.__init__(self, synapse_id, energy_factor, time_depth, weight_bound, weight_target, weight_noise, size_mass, change_mass, records)
+    def __init__(self, synapse_id, energy_factor, time_depth, weight_bound, weight_target, weight_noise, size_mass, change_mass, records, rng, store):
+        Synapse.__init__(self, synapse_id, energy_factor, time_depth, weight_bound, weight_target, weight_noise, size_mass, change_mass, records, rng, store)
         self.weight_type = 'fixed'
+        store.type_code[synapse_id] = store.type_list.index(self.weight_type)
         self.weight = self.weight_target
 
+    def update_state(self, node_id, input_state, input_weight_error, weight2_avg):
+        '''
+        Fixed weights do not adapt - the node output is delivered as in push_state (no weight normalization, random
+        draw, history or weight update).
+        '''
+        self.push_state(node_id, input_state)
+
+    def update_self_state(self, node_id, input_state, input_weight_error, weight2_avg):
+        self.push_self_state(node_id, input_state)
+
     def update_weight(self):
         '''
         Dummy update function for fixed weights
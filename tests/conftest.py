@@ -0,0 +1,50 @@
+import importlib.util
+import os
+import re
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path: sys.path.insert(0, ROOT)
+
+import network_v21 as nw
+
+
+def load_params(folder, settings):
+    '''writes a copy of params_v21.py to folder with the assignments self.<target> = ... replaced by settings {target: source} and imports it'''
+    with open(os.path.join(ROOT, 'params_v21.py')) as f: source = f.read()
+    for (target, value) in settings.items():
+        (source, n) = re.subn(r'^(\s*self\.' + re.escape(target) + r'\s*=\s*).*$', lambda match: match.group(1) + value, source, count=1, flags=re.M)
+        assert n == 1, target
+    path = os.path.join(folder, 'params_v21.py')
+    with open(path, 'w') as f: f.write(source)
+    spec = importlib.util.spec_from_file_location('params_v21', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture
+def network(tmp_path, monkeypatch):
+    '''returns make(settings, **kwargs) building a Network in tmp_path from params_v21.py with settings applied'''
+    monkeypatch.chdir(tmp_path)
+    def make(settings, **kwargs):
+        module = load_params(str(tmp_path), settings)
+        monkeypatch.setitem(sys.modules, 'params_v21', module)
+        monkeypatch.setattr(nw, 'pd', module)
+        return nw.Network(**kwargs)
+    return make
+
+
+def small_lattice(nodes=96, bias=4, epochs=1, time=5, seed=1, recur=0):
+    '''settings for a small driven 'neighbor' lattice of nodes discrete nodes plus bias bias nodes'''
+    settings = {"node_dict['discrete'][2]": "{'quantity': %d,     'states': 10,   'connections': 16,     'recur': %d}" % (nodes, recur),
+                "era[1]": "{'epochs': %d,   'weight_update': True, 'logic_mode': 'driven'}" % epochs,
+                'time': str(time),
+                'seed': str(seed),
+                'bias_node_placement_separation': '2',
+                'bias_node_link_separation': '1'}
+    for m in range(bias // 2):
+        settings["node_dict['bias'][%d]" % m] = "{'quantity': 2,     'complement':True,     'connections': 4,    'period': [%d],   'part': '%s'}" % ([132, 70, 211, 105][m % 4], ['even', 'odd'][m % 2])
+    return settings
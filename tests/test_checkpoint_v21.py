@@ -0,0 +1,47 @@
+import numpy as np
+
+import network_v21 as nw
+from conftest import small_lattice
+
+
+class Interrupted(Exception):
+    pass
+
+
+def run_result(net):
+    '''final node states, synapse weights and the rows of the epoch file after its header (date and time of the run)'''
+    with open(net.epoch_filename) as epoch_file: epoch_rows = epoch_file.read().splitlines()[3:]
+    return (np.array([net.node[i].state for i in net.all_node_list]), net.synapse_store.weight.copy(), epoch_rows)
+
+
+def test_resume_from_checkpoint_matches_uninterrupted_run(network, monkeypatch):
+    settings = small_lattice(epochs=3, time=5)
+    settings['era[0]'] = "{'epochs': 1,  'weight_update': True, 'logic_mode': 'off'}"
+    net = network(settings, run_suffix='-straight')
+    net.run_network()
+    net.epoch_file.close()
+    (state, weight, epoch_rows) = run_result(net)
+
+#   checkpoint after every epoch and stop the run after the checkpoint of the second epoch (in era 1)
+    settings['checkpoint_seconds'] = '1e-9'
+    net = network(settings, run_suffix='-interrupted')
+    save_checkpoint = nw.Network.save_checkpoint
+    def save_and_stop(self, position):
+        save_checkpoint(self, position)
+        if position['epoch'] == 2: raise Interrupted
+    monkeypatch.setattr(nw.Network, 'save_checkpoint', save_and_stop)
+    try: net.run_network()
+    except Interrupted: pass
+    else: raise AssertionError('the run was not interrupted')
+    for name in net.output_file_list: getattr(net, name + '_file').close()
+    monkeypatch.setattr(nw.Network, 'save_checkpoint', save_checkpoint)
+
+    net = nw.resume_network(net.data_dir + '\\checkpoint.npz')
+    assert (net.run_position['era'], net.run_position['epoch']) == (1, 2)
+    net.run_network()
+    net.epoch_file.close()
+    (resumed_state, resumed_weight, resumed_epoch_rows) = run_result(net)
+    assert np.array_equal(resumed_state, state)
+    assert np.array_equal(resumed_weight, weight)
+    assert resumed_epoch_rows == epoch_rows
+    assert sum([row.startswith('4, ') for row in epoch_rows]) == len(nw.mt.statistic_list)
@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+
+import engine_v21 as eg
+from conftest import small_lattice
+
+
+def color_order(net):
+    '''orders the network nodes of net by the color classes of the lattice engine'''
+    node_list = net.node_list_dict['network']
+    node_set = set(node_list)
+    neighbor_list = dict([(i, [net.synapse[k].node_pair[i] for k in net.node[i].synapse_list if net.synapse[k].node_pair[i] in node_set and net.synapse[k].node_pair[i] != i]) for i in node_list])
+    return [i for c in eg.color_classes(node_list, neighbor_list) for i in c]
+
+
+def sweep_in_color_order(net):
+    '''makes the python sweep of net visit the nodes in color order from the first era on (the initial sweep keeps the node order)'''
+    set_era = net.bias_group.set_era
+    order = color_order(net)
+    def reorder(era):
+        net.node_list_dict['network'][:] = order
+        set_era(era)
+    net.bias_group.set_era = reorder
+
+
+@pytest.mark.parametrize('recur', [0, 1])
+def test_lattice_engine_matches_color_ordered_sweep(network, recur):
+    result = {}
+    for mode in ['sweep', 'engine']:
+        net = network(small_lattice(epochs=2, time=5, recur=recur), run_suffix='-' + mode)
+        if mode == 'engine': net.parm.lattice_engine = True
+        else: sweep_in_color_order(net)
+        net.run_network()
+        assert (net.lattice_engine is not None) == (mode == 'engine')
+        result[mode] = (np.array([net.node[i].state for i in net.all_node_list]), net.synapse_store.weight.copy())
+    (state, weight) = result['sweep']
+    assert np.array_equal(result['engine'][0], state)
+    assert np.allclose(result['engine'][1], weight, rtol=0.0, atol=1e-12)
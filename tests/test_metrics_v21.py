@@ -0,0 +1,46 @@
+import math
+
+import numpy as np
+
+import metrics_v21 as mt
+
+
+def test_online_statistic_unit_weights():
+    values = np.random.default_rng(3).normal(size=50)
+    statistic = mt.OnlineStatistic()
+    for value in values: statistic.add(value)
+    assert math.isclose(statistic.mean, values.mean())
+    assert math.isclose(statistic.stdev(), values.std(ddof=1))
+    assert (statistic.minimum, statistic.maximum) == (values.min(), values.max())
+
+
+def test_online_statistic_zero_weight_values():
+    statistic = mt.OnlineStatistic()
+    for value in [1.0, 2.0, 3.0]: statistic.add(value)
+    assert math.isclose(statistic.stdev(), 1.0)
+    statistic.add(100.0, 0.0)
+    assert statistic.count == 4
+    assert math.isclose(statistic.mean, 2.0)
+    assert math.isclose(statistic.stdev(), 1.0)
+    assert statistic.maximum == 3.0
+
+
+def test_online_statistic_weights():
+    '''integer weights give the statistics of the values repeated weight times'''
+    (values, weights) = ([0.5, 2.0, -1.0, 4.0], [1.0, 3.0, 2.0, 1.0])
+    statistic = mt.OnlineStatistic()
+    for (value, weight) in zip(values, weights): statistic.add(value, weight)
+    repeated = np.repeat(values, np.array(weights, dtype=int))
+    assert math.isclose(statistic.mean, repeated.mean())
+    n = statistic.effective_count()
+    assert math.isclose(n, 49.0 / 15.0)
+    assert math.isclose(statistic.stdev(), repeated.std() * math.sqrt(n / (n - 1.0)))
+
+
+def test_online_statistic_interval():
+    values = np.arange(12, dtype=float)
+    statistic = mt.OnlineStatistic(batch=3)
+    for value in values: statistic.add(value)
+    batch_means = values.reshape(4, 3).mean(axis=1)
+    assert math.isclose(statistic.interval(), 1.96 * batch_means.std(ddof=1) / 2.0)
+    assert math.isnan(mt.OnlineStatistic(batch=3).interval())
@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+
+import rng_v21 as rn
+import synapse_v21 as sd
+
+
+def test_delay_store_returns_input_depth_steps_earlier():
+    '''
+    Against a record of the input of every endpoint on every step (an endpoint that is not written holds its last
+    input, 0 before the first): transmit and read return the input of step - depth, for depth 0, over many wraps of
+    the ring, with endpoints skipping single steps and pausing for longer than the largest depth.
+    '''
+    depth_list = [0, 1, 3, 5, 5]
+    store = sd.DelayStore(depth_list)
+    random = np.random.default_rng(11)
+    (steps, endpoints) = (60, [(k, e) for k in range(len(depth_list)) for e in (0, 1)])
+    inputs = {key: [0.0] for key in endpoints}                  # inputs[key][t] is the input of endpoint key on step t
+    for step in range(1, steps + 1):
+        store.advance()
+        for (k, e) in endpoints:
+            paused = k == 4 and e == 0 and 20 <= step < 40
+            if paused or random.random() < 0.4: inputs[(k, e)].append(inputs[(k, e)][-1])
+            else:
+                value = float(random.normal())
+                inputs[(k, e)].append(value)
+                assert store.transmit(k, e, value) == inputs[(k, e)][max(0, step - depth_list[k])]
+        synapse_ids = np.array([k for (k, e) in endpoints])
+        endpoint_ids = np.array([e for (k, e) in endpoints])
+        expected = [inputs[(k, e)][max(0, step - depth_list[k])] for (k, e) in endpoints]
+        assert store.read(synapse_ids, endpoint_ids).tolist() == expected
+
+
+@pytest.mark.parametrize(('low', 'high'), [(-1.0, 1.0), (0.5, 3.0), (-3.0, -0.5), (-0.2, np.inf), (6.0, 7.0), (-7.0, -6.0),
+                                           (10.0, np.inf), (-np.inf, -10.0), (29.0, 30.0), (-30.0, -29.0), (37.0, 38.0), (-38.0, -37.0)])
+def test_truncated_normal_matches_scipy(low, high):
+    '''sample mean and standard deviation of truncated_normal against scipy.stats.truncnorm, including intervals deep in either tail'''
+    stats = pytest.importorskip('scipy.stats')
+    x = sd.truncated_normal(np.random.default_rng(5).random(100000), low, high)
+    assert np.all((low <= x) & (x <= high))
+    (mean, std) = stats.truncnorm.stats(low, high, moments='mv')
+    std = np.sqrt(std)
+    assert abs(x.mean() - mean) < 5.0 * std / np.sqrt(len(x))
+    assert abs(x.std() - std) < 0.02 * std
+
+
+def test_real2_batch_matches_real2_update_weight():
+    '''
+    Real2Batch.update_weights against Real2.update_weight one synapse at a time, with weight bounds of 0.5 to 3
+    standard deviations and weight errors large enough to push the weights far outside them (truncation intervals
+    deep in either tail), with and without weight noise, over several steps and stream rows.
+    '''
+    (n, random) = (400, np.random.default_rng(17))
+    store = sd.SynapseStore(n)
+    rng = rn.RandomStreams(3)
+    for stream in [rn.SYNAPSE_NORMAL, rn.SYNAPSE_UNIFORM, rn.WEIGHT_NORMAL, rn.WEIGHT_UNIFORM]: rng.add_stream(stream, n)
+    synapse_list = []
+    for k in range(n):
+        energy_factor = random.uniform(0.5, 20.0)
+        stdev = 1.0 / np.sqrt(2.0 * (2.0 * energy_factor + 1.0))
+        synapse_list.append(sd.Real2(k, energy_factor, 0, random.uniform(0.5, 3.0) * stdev, 0.0, k % 5 > 0, 1.0, 0.0, 0, rng, store))
+    batch = sd.Real2Batch(synapse_list, rng)
+    index = np.arange(n)
+    tail = 0
+    for step in range(1, 6):
+        rng.set_step(step)
+        weight = store.weight.copy()
+        weight_error = random.normal(size=n) * random.choice([0.1, 1.0, 30.0], size=n)
+        weight2_avg = random.uniform(0.01, 1.0, size=n)
+        draw = random.integers(0, 4, size=n)
+        expected = []
+        for (k, synapse) in enumerate(synapse_list):
+            (synapse.weight_error, synapse.draw) = (weight_error[k], int(draw[k]))
+            synapse.delta = np.sqrt(1.0 + 1.0 / (2.0 * synapse.prefactor * weight2_avg[k]))
+            synapse.update_weight()
+            expected.append(synapse.weight)
+            store.weight[k] = weight[k]
+        moved = weight + (batch.energy_factor * weight_error - batch.size_mass * weight) / batch.prefactor
+        tail += np.sum(batch.weight_noise & ((moved > batch.bound_high + 4.0 * batch.stdev) | (moved < batch.bound_low - 4.0 * batch.stdev)))
+        assert np.allclose(batch.update_weights(index, weight, weight_error, weight2_avg, draw), expected, rtol=0.0, atol=1e-12)
+        store.weight[:] = expected
+    assert tail > 200